@@ -0,0 +1,212 @@
+"""
+Shared route tables for the HTTP device emulators.
+
+Routes are declared in a table (list of dicts, usually a JSON file next to the server) and
+compiled once into: exact-match dicts, a prefix trie and an ordered list of substring/regex
+fallbacks. The table order is the priority order (first match wins, like the old if/elif
+chains); a fallback only has to be tried if it comes *before* the best exact/prefix hit.
+
+Route fields:
+    method     "GET" / "POST" / ...
+    exact | prefix | contains | regex   the pattern (exactly one of them)
+    on         "path" (parsed path, default) or "raw" (request target incl. query)
+    query      optional query parameter that must be present
+    status, reason, ctype, headers, body   static response (precomputed to bytes)
+    body_from  take the body from the context dict (e.g. a generated firmware image)
+    call       name of a handler method instead of a static response: fn(route, path, qs, body)
+    name       endpoint name in the emulator stats (default: method + pattern, see Route.label)
+Bodies are text with ${NAME} placeholders filled from the context at compile time.
+"""
+import json
+import re
+import string
+import time
+import urllib.parse as up
+from typing import Dict, List, Optional, Tuple
+
+
+class Response:
+    """Static response: status line args plus precomputed header block and body bytes."""
+    __slots__ = ("code", "reason", "head", "body", "framed")
+
+    def __init__(self, code: int, reason: Optional[str] = None, headers=(), body: bytes = b""):
+        self.code = code
+        self.reason = reason
+        self.head = b"".join(f"{k}: {v}\r\n".encode("latin-1") for k, v in headers)
+        self.body = body
+        self.framed = any(k.lower() == "content-length" for k, _ in headers)
+
+
+NOT_FOUND = Response(404, None, (), b"Not Found")
+
+
+class Route:
+    __slots__ = ("order", "method", "kind", "pattern", "on", "query", "response", "call", "rx", "name")
+
+    def __init__(self, order: int, spec: dict, context: dict):
+        self.order = order
+        self.method = spec.get("method", "GET").upper()
+        kinds = [k for k in ("exact", "prefix", "contains", "regex") if k in spec]
+        if len(kinds) != 1:
+            raise ValueError(f"route {order}: need exactly one of exact/prefix/contains/regex: {spec}")
+        self.kind = kinds[0]
+        self.pattern = spec[self.kind]
+        self.on = spec.get("on", "path")
+        self.query = spec.get("query")
+        self.rx = re.compile(self.pattern) if self.kind == "regex" else None
+        self.call = spec.get("call")
+        self.response = None if self.call else _static(spec, context)
+        self.name = spec.get("name") or self.label()
+
+    def label(self) -> str:
+        pat = {"exact": "{}", "prefix": "{}*", "contains": "*{}*", "regex": "~{}"}[self.kind].format(self.pattern)
+        return f"{self.method} {pat}" + (f"?{self.query}" if self.query else "")
+
+    def matches_fallback(self, path: str, raw: str) -> bool:
+        s = raw if self.on == "raw" else path
+        return self.pattern in s if self.kind == "contains" else self.rx.search(s) is not None
+
+
+def _static(spec: dict, context: dict) -> Response:
+    if "body_from" in spec:
+        body = context[spec["body_from"]]
+    else:
+        body = string.Template(spec.get("body", "")).safe_substitute(context).encode()
+    headers = list(spec.get("headers", {}).items())
+    if "ctype" in spec:
+        headers.append(("Content-Type", spec["ctype"]))
+    if spec.get("length", "ctype" in spec):
+        headers.append(("Content-Length", str(len(body))))
+    return Response(int(spec.get("status", 200)), spec.get("reason", "OK" if "ctype" in spec else None),
+                    headers, body)
+
+
+class RouteTable:
+    """Compiled dispatch for one emulator."""
+
+    def __init__(self, specs: List[dict], context: Optional[dict] = None, default: Response = NOT_FOUND):
+        context = {k: v for k, v in (context or {}).items()}
+        self.routes = [Route(i, sp, context) for i, sp in enumerate(specs)]
+        self.default = default
+        self.exact: Dict[Tuple[str, str, str], List[Route]] = {}
+        self.trie: Dict[Tuple[str, str], dict] = {}
+        self.fallback: Dict[str, List[Route]] = {}
+        self.need_path = set()
+        for r in self.routes:
+            if r.on == "path":
+                self.need_path.add(r.method)
+            if r.kind == "exact":
+                self.exact.setdefault((r.method, r.on, r.pattern), []).append(r)
+            elif r.kind == "prefix":
+                node = self.trie.setdefault((r.method, r.on), {})
+                for ch in r.pattern:
+                    node = node.setdefault(ch, {})
+                node.setdefault(None, []).append(r)
+            else:
+                self.fallback.setdefault(r.method, []).append(r)
+
+    def resolve(self, method: str, raw: str) -> Tuple[Optional[Route], str, dict]:
+        """Returns (route or None, parsed path, query dict) for a request target."""
+        if method in self.need_path:
+            parsed = up.urlparse(raw)
+            path, qs = parsed.path, dict(up.parse_qsl(parsed.query, keep_blank_values=True))
+        else:
+            path, qs = raw, {}
+
+        best = None
+        for on, s in (("path", path), ("raw", raw)):
+            for r in self.exact.get((method, on, s), ()):
+                if (best is None or r.order < best.order) and (r.query is None or r.query in qs):
+                    best = r
+                    break
+            node = self.trie.get((method, on))
+            if node is not None:
+                for ch in s:
+                    hits = node.get(None)
+                    if hits:
+                        for r in hits:
+                            if (best is None or r.order < best.order) and (r.query is None or r.query in qs):
+                                best = r
+                    node = node.get(ch)
+                    if node is None:
+                        break
+                else:
+                    for r in node.get(None, ()):
+                        if (best is None or r.order < best.order) and (r.query is None or r.query in qs):
+                            best = r
+
+        # substring/regex routes only win if they are listed before the exact/prefix hit
+        for r in self.fallback.get(method, ()):
+            if best is not None and r.order > best.order:
+                break
+            if (r.query is None or r.query in qs) and r.matches_fallback(path, raw):
+                return r, path, qs
+        return best, path, qs
+
+
+def load_routes(path: str, context: Optional[dict] = None) -> RouteTable:
+    with open(path, "r", encoding="utf-8") as f:
+        return RouteTable(json.load(f), context)
+
+
+class RoutedHandler:
+    """
+    Mixin for BaseHTTPRequestHandler subclasses: set `routes` to a RouteTable.
+    POST bodies are read before dispatch (as the old handlers did). Tracks whether the
+    current response is framed (Content-Length) in self._framed for keep-alive handlers.
+    With `stats` set to an emu_stats.EndpointStats every dispatch is recorded under the
+    route name (unmatched requests as "<METHOD> <unmatched>") with status code and latency.
+    """
+    routes: RouteTable = None
+    stats = None
+
+    def send_response(self, code, message=None):
+        self._framed = False
+        self._code = code
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == "content-length":
+            self._framed = True
+        super().send_header(keyword, value)
+
+    def send_static(self, resp: Response):
+        self.send_response(resp.code, resp.reason)
+        if resp.head and self.request_version != "HTTP/0.9":
+            self._headers_buffer.append(resp.head)
+        self._framed = resp.framed
+        self.end_headers()
+        if resp.body:
+            self.wfile.write(resp.body)
+
+    def read_request_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length > 0 else b""
+
+    def dispatch(self, method: str):
+        if self.stats is None:
+            return self._dispatch(method)
+        t0 = time.perf_counter()
+        self._code = 0
+        self._route = None
+        try:
+            return self._dispatch(method)
+        finally:
+            name = self._route.name if self._route is not None else f"{method} <unmatched>"
+            self.stats.record(name, self._code, time.perf_counter() - t0)
+
+    def _dispatch(self, method: str):
+        body = self.read_request_body() if method == "POST" else b""
+        route, path, qs = self.routes.resolve(method, self.path)
+        self._route = route
+        if route is None:
+            return self.send_static(self.routes.default)
+        if route.call:
+            return getattr(self, route.call)(route, path, qs, body)
+        return self.send_static(route.response)
+
+    def do_GET(self):
+        return self.dispatch("GET")
+
+    def do_POST(self):
+        return self.dispatch("POST")
@@ -0,0 +1,179 @@
+"""
+Per-endpoint instrumentation for the device emulators: hit counts, response codes and a
+handler latency histogram per endpoint. Endpoint names come from the emulator (route table
+entries, CoAP resources, telnet phases), never from raw request data, so cardinality stays bounded.
+
+Every emulator registers an EndpointStats under its name; serve() exposes all registered ones
+of the process as one JSON document:
+    unix socket  EMU_STATS_SOCKET (default /tmp/emu_stats.sock): connect, read JSON until EOF
+    HTTP         EMU_STATS_PORT (optional, on EMU_STATS_ADDR, default 127.0.0.1): GET /
+Inside a container: `python3 /app/emu_stats.py` prints the document (used by the attack runner
+via docker exec, so the snapshots never cross the monitored bridge).
+"""
+import bisect
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+# histogram upper bounds in microseconds; the last bucket is everything above
+BUCKETS_US = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000,
+              500000, 1000000, 2500000, 5000000, 10000000)
+
+SOCKET_PATH = os.environ.get("EMU_STATS_SOCKET", "/tmp/emu_stats.sock")
+HTTP_PORT = int(os.environ.get("EMU_STATS_PORT", "0"))
+HTTP_ADDR = os.environ.get("EMU_STATS_ADDR", "127.0.0.1")
+
+REGISTRY = {}
+_served = threading.Lock()
+_started = False
+
+
+class EndpointStats:
+    """
+    One lock for the whole table; an update is a dict lookup plus three increments under it.
+    Records are [hits, {code: n}, [bucket counts], latency sum in us, max us].
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.t0 = time.time()
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        REGISTRY[service] = self
+
+    def record(self, endpoint, code, seconds):
+        us = int(seconds * 1e6)
+        b = bisect.bisect_left(BUCKETS_US, us)
+        with self.lock:
+            rec = self.endpoints.get(endpoint)
+            if rec is None:
+                rec = self.endpoints[endpoint] = [0, {}, [0] * (len(BUCKETS_US) + 1), 0, 0]
+            rec[0] += 1
+            rec[1][code] = rec[1].get(code, 0) + 1
+            rec[2][b] += 1
+            rec[3] += us
+            if us > rec[4]:
+                rec[4] = us
+
+    def snapshot(self):
+        with self.lock:
+            eps = {ep: (r[0], dict(r[1]), list(r[2]), r[3], r[4]) for ep, r in self.endpoints.items()}
+        out = {}
+        for ep, (hits, codes, buckets, total, mx) in sorted(eps.items()):
+            out[ep] = {
+                "hits": hits,
+                "codes": {str(k): v for k, v in sorted(codes.items(), key=lambda kv: str(kv[0]))},
+                "buckets": buckets,
+                "mean_us": total // hits if hits else 0,
+                "max_us": mx,
+                "p50_us": percentile(buckets, 0.50),
+                "p99_us": percentile(buckets, 0.99),
+            }
+        return {"uptime_s": round(time.time() - self.t0, 1), "endpoints": out}
+
+
+def percentile(buckets, q):
+    """Upper bound of the bucket holding the q-quantile (-1 for the overflow bucket)."""
+    n = sum(buckets)
+    if n == 0:
+        return 0
+    want = q * n
+    acc = 0
+    for i, c in enumerate(buckets):
+        acc += c
+        if acc >= want:
+            return BUCKETS_US[i] if i < len(BUCKETS_US) else -1
+    return -1
+
+
+def document():
+    return {"time": time.time(), "buckets_us": list(BUCKETS_US),
+            "services": {name: st.snapshot() for name, st in list(REGISTRY.items())}}
+
+
+def _listen_unix(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(path)
+    srv.listen(16)
+    return srv
+
+
+def _listen_tcp(addr, port):
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind((addr, port))
+    srv.listen(16)
+    return srv
+
+
+def _accept_loop(srv, http):
+    while True:
+        conn, _ = srv.accept()
+        try:
+            body = json.dumps(document()).encode()
+            if http:
+                conn.settimeout(2)
+                conn.recv(4096)
+                body = (b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n"
+                        b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            conn.sendall(body)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+def serve(socket_path=None, http_port=None, http_addr=None):
+    """Start the stats listeners once per process (further calls are no-ops)."""
+    global _started
+    with _served:
+        if _started:
+            return
+        _started = True
+    path = SOCKET_PATH if socket_path is None else socket_path
+    port = HTTP_PORT if http_port is None else http_port
+    listeners = []
+    if path:
+        try:
+            listeners.append((_listen_unix(path), False))
+        except OSError as e:
+            print(f"[EMU STATS] no unix socket {path}: {e}", flush=True)
+    if port:
+        addr = http_addr or HTTP_ADDR
+        try:
+            listeners.append((_listen_tcp(addr, port), True))
+        except OSError as e:
+            print(f"[EMU STATS] no HTTP listener on {addr}:{port}: {e}", flush=True)
+    for srv, http in listeners:
+        threading.Thread(target=_accept_loop, args=(srv, http), name="emu-stats", daemon=True).start()
+
+
+def fetch(path=SOCKET_PATH, timeout=2.0):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(path)
+        chunks = []
+        while True:
+            data = s.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        s.close()
+    return json.loads(b"".join(chunks))
+
+
+if __name__ == "__main__":
+    try:
+        print(json.dumps(fetch(sys.argv[1] if len(sys.argv) > 1 else SOCKET_PATH)))
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
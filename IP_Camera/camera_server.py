@@ -1,7 +1,21 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 import base64
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# emu_routes.py: next to this file in the image, ../Emulator_Common in the repo
+sys.path.insert(1, os.path.join(HERE, "..", "Emulator_Common"))
+from emu_routes import RoutedHandler, load_routes
+import emu_stats
 
 DEFAULT_REALM = 'IoT Camera'
+PORT = int(os.environ.get("CAMERA_PORT", "80"))
+# Sekunden, die ein Client für eine Anfrage (bzw. Leerlauf zwischen Keep-Alive-Anfragen) hat
+REQUEST_TIMEOUT = float(os.environ.get("CAMERA_TIMEOUT", "10"))
+# 1 = altes Verhalten: ein Thread, HTTP/1.0, Verbindung nach jeder Antwort schließen
+LEGACY = os.environ.get("CAMERA_LEGACY", "0") == "1"
+ROUTES = os.environ.get("CAMERA_ROUTES", os.path.join(HERE, "camera_routes.json"))
 
 def parse_basic_auth(header: str):
     if not header:
@@ -18,8 +32,10 @@ def parse_basic_auth(header: str):
         pass
     return None, None
 
-class CameraHandler(BaseHTTPRequestHandler):
+class CameraHandler(RoutedHandler, BaseHTTPRequestHandler):
     server_version = "InsecureCam/1.0"
+    routes = load_routes(ROUTES)
+    stats = emu_stats.EndpointStats("camera")
 
     def _send_auth_401(self, message=b"Authentication required"):
         self.send_response(401, "Unauthorized")
@@ -35,56 +51,55 @@ class CameraHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(body)
 
-    def _read_body(self) -> bytes:
-        length = int(self.headers.get('Content-Length', 0))
-        return self.rfile.read(length) if length > 0 else b""
-
-    def do_GET(self):
-        if self.path.startswith("/system.ini"):
-            fake_conf = (
-                "[Network]\n"
-                "user=admin\n"
-                "password=admin\n"
-                "rtsp_port=554\n"
-                "onvif_enabled=1\n"
-            ).encode()
-            return self._ok(fake_conf, "text/plain")
-
-        if self.path in ("/", "/admin", "/index.html"):
-            user, pw = parse_basic_auth(self.headers.get('Authorization'))
-            if user is None:
-                return self._send_auth_401(b"Authentication required")
-            if (user, pw) == ("admin", "admin"):
-                return self._ok(b"Welcome, admin! (protected camera page)")
-            return self._send_auth_401(b"Authentication failed")
-
-
-        self.send_response(404)
-        self.end_headers()
-        self.wfile.write(b"Not Found")
-
-    def do_POST(self):
-        path = self.path
-        body = self._read_body()
-
-        if path == "/res.php":
-            return self._ok(b"<ok>alarm processed</ok>", "text/xml")
-
-        if path == "/cgi-bin/mft/wireless_mft":
-            return self._ok(b'{"status":"applied"}', "application/json")
-
-        if path == "/onvif/device_service":
-            return self._ok(b"<s:Envelope><s:Body><tds:CreateUsersResponse>OK</tds:CreateUsersResponse></s:Body></s:Envelope>", "application/soap+xml")
-
-        self.send_response(404)
-        self.end_headers()
-        self.wfile.write(b"Not Found")
+    def admin_page(self, route, path, qs, body):
+        user, pw = parse_basic_auth(self.headers.get('Authorization'))
+        if user is None:
+            return self._send_auth_401(b"Authentication required")
+        if (user, pw) == ("admin", "admin"):
+            return self._ok(b"Welcome, admin! (protected camera page)")
+        return self._send_auth_401(b"Authentication failed")
 
     def log_message(self, fmt, *args):
         return
 
-def run():
-    HTTPServer(('', 80), CameraHandler).serve_forever()
+class KeepAliveCameraHandler(CameraHandler):
+    """
+    Gleiche Routen und Antworten wie CameraHandler, aber HTTP/1.1 mit persistenten Verbindungen
+    und Timeout. Antworten ohne Content-Length (401/404) sind nicht gerahmt: dort wird
+    "Connection: close" ergänzt und die Verbindung danach geschlossen.
+    HTTP/1.0-Anfragen bekommen exakt die Bytes des alten Servers (inkl. Statuszeile).
+    """
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
+    # Header und Body sind zwei Writes: ohne TCP_NODELAY wartet der Body auf das (verzögerte) ACK, ~40 ms je Antwort
+    disable_nagle_algorithm = True
+
+    def parse_request(self):
+        ok = super().parse_request()
+        if ok and self.request_version == "HTTP/1.0":
+            self.protocol_version = "HTTP/1.0"
+            self.close_connection = True
+        return ok
+
+    def end_headers(self):
+        if not self._framed and not self.close_connection:
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+
+class CameraServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_server(port=PORT, legacy=LEGACY, addr=''):
+    if legacy:
+        return HTTPServer((addr, port), CameraHandler)
+    return CameraServer((addr, port), KeepAliveCameraHandler)
+
+def run(port=PORT, legacy=LEGACY):
+    emu_stats.serve()
+    make_server(port, legacy).serve_forever()
 
 if __name__ == "__main__":
     run()
@@ -1,10 +1,460 @@
-import socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind(("", 5683))
-while True:
-    data, addr = sock.recvfrom(1024)
-    if not data:
-        continue
-    mid = data[2:4] 
-    response = bytes([0x60, 0x45]) + mid + b'\xffOK'
-    sock.sendto(response, addr)
+"""
+CoAP device emulator (RFC 7252) on 5683/udp, asyncio, no deps.
+- resource tree (/sensor/temp, /sensor/hum, /status, ...) with token echo
+- deduplication cache keyed by (endpoint, MID), bounded and expiring (EXCHANGE_LIFETIME)
+- piggybacked and separate responses (empty ACK first, then CON with retransmission)
+- Observe (RFC 7641) notifications, Block2/Block1 block-wise transfer (RFC 7959)
+"""
+import asyncio, os, random, struct, sys, time
+from collections import Counter, OrderedDict
+
+# emu_stats.py: next to this file in the image, ../Emulator_Common in the repo
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Emulator_Common"))
+import emu_stats
+
+PORT = int(os.environ.get("COAP_PORT", "5683"))
+EXCHANGE_LIFETIME = float(os.environ.get("COAP_EXCHANGE_LIFETIME", "247"))
+DEDUP_MAX = int(os.environ.get("COAP_DEDUP_MAX", "100000"))
+MAX_OBSERVERS = int(os.environ.get("COAP_MAX_OBSERVERS", "10000"))
+OBSERVE_INTERVAL = float(os.environ.get("COAP_OBSERVE_INTERVAL", "5"))
+STATS_INTERVAL = float(os.environ.get("COAP_STATS_INTERVAL", "60"))
+BLOCK1_MAX = 64 * 1024
+ACK_TIMEOUT, MAX_RETRANSMIT = 2.0, 4
+
+CON, NON, ACK, RST = 0, 1, 2, 3
+GET, POST, PUT, DELETE = 1, 2, 3, 4
+# response codes as class<<5 | detail
+CONTENT, CHANGED, CREATED, CONTINUE = 0x45, 0x44, 0x41, 0x5F
+BAD_REQUEST, BAD_OPTION, NOT_FOUND, NOT_ALLOWED, INCOMPLETE, TOO_LARGE = 0x80, 0x82, 0x84, 0x85, 0x88, 0x8D
+
+OPT_OBSERVE, OPT_URI_PATH, OPT_CFORMAT, OPT_URI_QUERY = 6, 11, 12, 15
+OPT_BLOCK2, OPT_BLOCK1, OPT_SIZE2, OPT_SIZE1, OPT_MAX_AGE = 23, 27, 28, 60, 14
+KNOWN_CRITICAL = {1, 3, 5, 7, 11, 15, 17, 23, 27, 35, 39}
+TEXT, LINK_FORMAT, OCTETS, JSON = 0, 40, 42, 50
+METHOD_NAMES = {GET: "GET", POST: "POST", PUT: "PUT", DELETE: "DELETE"}
+
+
+class CoapError(Exception):
+    pass
+
+
+def _uint(v):
+    return v.to_bytes((v.bit_length() + 7) // 8, "big") if v else b""
+
+
+def parse(data):
+    """-> (type, code, mid, token, {opt: [values]}, payload); raises CoapError on format errors."""
+    if len(data) < 4:
+        raise CoapError("short")
+    b0, code, mid = data[0], data[1], (data[2] << 8) | data[3]
+    if b0 >> 6 != 1:
+        raise CoapError("version")
+    tkl = b0 & 0x0F
+    if tkl > 8 or 4 + tkl > len(data):
+        raise CoapError("token")
+    token = data[4:4 + tkl]
+    i, n, num, opts = 4 + tkl, len(data), 0, {}
+    while i < n:
+        if data[i] == 0xFF:
+            if i + 1 == n:
+                raise CoapError("empty payload")
+            return b0 >> 4 & 3, code, mid, token, opts, data[i + 1:]
+        d, ln = data[i] >> 4, data[i] & 0x0F
+        i += 1
+        for which in (0, 1):
+            v = d if which == 0 else ln
+            if v == 13:
+                v, i = data[i] + 13, i + 1
+            elif v == 14:
+                v, i = ((data[i] << 8) | data[i + 1]) + 269, i + 2
+            elif v == 15:
+                raise CoapError("option nibble 15")
+            if which == 0:
+                d = v
+            else:
+                ln = v
+        num += d
+        if i + ln > n:
+            raise CoapError("option length")
+        opts.setdefault(num, []).append(data[i:i + ln])
+        i += ln
+    return b0 >> 4 & 3, code, mid, token, opts, b""
+
+
+def _ext(v):
+    if v < 13:
+        return v, b""
+    if v < 269:
+        return 13, bytes((v - 13,))
+    return 14, struct.pack("!H", v - 269)
+
+
+def build(typ, code, mid, token, opts=(), payload=b""):
+    """opts: iterable of (number, bytes) in any order."""
+    out = bytearray((0x40 | typ << 4 | len(token), code, mid >> 8 & 0xFF, mid & 0xFF))
+    out += token
+    prev = 0
+    for num, val in sorted(opts, key=lambda o: o[0]):
+        d, dx = _ext(num - prev)
+        ln, lx = _ext(len(val))
+        out.append(d << 4 | ln)
+        out += dx + lx + val
+        prev = num
+    if payload:
+        out.append(0xFF)
+        out += payload
+    return bytes(out)
+
+
+def block_opt(num, more, szx):
+    return _uint(num << 4 | (8 if more else 0) | szx)
+
+
+def parse_block(raw):
+    v = int.from_bytes(raw, "big")
+    return v >> 4, bool(v & 8), v & 7
+
+
+class Resource:
+    methods = (GET,)
+    observable = False
+    separate = 0.0   # seconds before a separate response (0 = piggybacked)
+    cformat = TEXT
+
+    def __init__(self):
+        self.observers = OrderedDict()   # (addr, token) -> registration time
+        self.seq = 0
+
+    def get(self, query):
+        return CONTENT, b""
+
+    def post(self, payload, query):
+        return NOT_ALLOWED, b""
+
+    def put(self, payload, query):
+        # resolved at call time so subclasses that override post() answer PUT the same way
+        return self.post(payload, query)
+
+
+class Static(Resource):
+    def __init__(self, body, cformat=TEXT, methods=(GET,)):
+        super().__init__()
+        self.body, self.cformat, self.methods = body, cformat, methods
+
+    def get(self, query):
+        return CONTENT, self.body
+
+    def post(self, payload, query):
+        return CHANGED, self.body
+
+
+class Sensor(Resource):
+    observable = True
+
+    def __init__(self, base, spread, unit):
+        super().__init__()
+        self.base, self.spread, self.unit = base, spread, unit
+        self.value = base
+
+    def tick(self, rng):
+        self.value = round(min(self.base + self.spread, max(self.base - self.spread,
+                                                             self.value + rng.uniform(-0.3, 0.3))), 1)
+
+    def get(self, query):
+        return CONTENT, f"{self.value}{self.unit}".encode()
+
+
+class Slow(Sensor):
+    separate = 0.3
+
+
+class Config(Resource):
+    """Accepts (block-wise) uploads; GET returns the last one."""
+    methods = (GET, POST, PUT)
+    cformat = OCTETS
+
+    def __init__(self):
+        super().__init__()
+        self.data = b"{}"
+
+    def get(self, query):
+        return CONTENT, self.data
+
+    def post(self, payload, query):
+        self.data = payload
+        return CHANGED, b""
+
+    put = post
+
+
+def resource_tree():
+    firmware = bytes(random.Random(7).getrandbits(8) for _ in range(8192))
+    tree = {
+        "": Static(b"OK", methods=(GET, POST, PUT)),          # old server answered everything with 2.05 "OK"
+        "status": Static(b'{"status":"online","uptime":0}', JSON),
+        "sensor/temp": Sensor(21.5, 3.0, ""),
+        "sensor/hum": Sensor(45.0, 10.0, ""),
+        "sensor/slow": Slow(1013.0, 5.0, ""),
+        "config": Config(),
+        "firmware": Static(firmware, OCTETS),
+    }
+    links = ",".join(f"</{p}>" + (";obs" if r.observable else "") + (";ct=%d" % r.cformat)
+                     for p, r in tree.items() if p)
+    tree[".well-known/core"] = Static(links.encode(), LINK_FORMAT)
+    return tree
+
+
+class CoapServer(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.tree = resource_tree()
+        self.dedup = OrderedDict()     # (addr, mid) -> (expiry, response bytes or None while pending)
+        self.pending = {}              # (addr, mid) of our CONs -> [packet, tries, next send, timeout]
+        self.notif = {}                # (addr, mid) of notifications -> (resource, observer key)
+        self.block1 = {}               # (addr, path) -> bytearray
+        self.stats = Counter()
+        self.ep = emu_stats.EndpointStats("coap")   # per resource: response code, handler latency
+        self.mid = random.randint(0, 0xFFFF)
+        self.rng = random.Random()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def next_mid(self):
+        self.mid = (self.mid + 1) & 0xFFFF
+        return self.mid
+
+    def send(self, pkt, addr):
+        self.stats["tx"] += 1
+        self.transport.sendto(pkt, addr)
+
+    # --- receive path -----------------------------------------------------------------
+    def datagram_received(self, data, addr):
+        self.stats["rx"] += 1
+        try:
+            typ, code, mid, token, opts, payload = parse(data)
+        except (CoapError, IndexError):
+            self.stats["format_errors"] += 1
+            if len(data) >= 4 and data[0] >> 6 == 1 and (data[0] >> 4 & 3) == CON:
+                self.send(build(RST, 0, (data[2] << 8) | data[3], b""), addr)
+            return
+
+        if typ in (ACK, RST):
+            self._on_ack(typ, mid, addr)
+            return
+        if code == 0:                                    # CoAP ping
+            if typ == CON:
+                self.send(build(RST, 0, mid, b""), addr)
+            return
+
+        key = (addr, mid)
+        hit = self.dedup.get(key)
+        if hit is not None:
+            self.stats["duplicates"] += 1
+            if typ == CON and hit[1] is not None:
+                self.send(hit[1], addr)
+            return
+        self._remember(key, None)
+
+        t0 = time.perf_counter()
+        resp = self._handle(typ, code, mid, token, opts, payload, addr)
+        path = "/".join(v.decode("utf-8", "replace") for v in opts.get(OPT_URI_PATH, ()))
+        name = f"{METHOD_NAMES.get(code, code)} " + (f"/{path}" if path in self.tree else "<unknown>")
+        rcode = f"{resp[1] >> 5}.{resp[1] & 31:02d}" if resp is not None and len(resp) > 1 else "none"
+        self.ep.record(name, rcode, time.perf_counter() - t0)
+        if resp is not None:
+            self._remember(key, resp)
+            self.send(resp, addr)
+
+    def _remember(self, key, resp):
+        self.dedup[key] = (time.monotonic() + EXCHANGE_LIFETIME, resp)
+        self.dedup.move_to_end(key)
+        while len(self.dedup) > DEDUP_MAX:
+            self.dedup.popitem(last=False)
+            self.stats["dedup_evicted"] += 1
+
+    def _on_ack(self, typ, mid, addr):
+        self.pending.pop((addr, mid), None)
+        obs = self.notif.pop((addr, mid), None)
+        if typ == RST and obs is not None:               # client rejected a notification -> deregister
+            res, okey = obs
+            res.observers.pop(okey, None)
+            self.stats["observe_cancelled"] += 1
+
+    def _reply_type(self, typ):
+        return ACK if typ == CON else NON
+
+    def _handle(self, typ, code, mid, token, opts, payload, addr):
+        rtyp = self._reply_type(typ)
+        rmid = mid if typ == CON else self.next_mid()
+        for num in opts:
+            if num & 1 and num not in KNOWN_CRITICAL:
+                self.stats["bad_option"] += 1
+                return build(rtyp, BAD_OPTION, rmid, token)
+
+        path = "/".join(v.decode("utf-8", "replace") for v in opts.get(OPT_URI_PATH, ()))
+        query = [v.decode("utf-8", "replace") for v in opts.get(OPT_URI_QUERY, ())]
+        res = self.tree.get(path)
+        if res is None:
+            self.stats["req:unknown"] += 1
+            return build(rtyp, NOT_FOUND, rmid, token)
+        self.stats[f"req:/{path}"] += 1
+        if code not in res.methods:
+            return build(rtyp, NOT_ALLOWED, rmid, token)
+
+        extra = []
+        if code in (POST, PUT):
+            if OPT_BLOCK1 in opts:
+                num, more, szx = parse_block(opts[OPT_BLOCK1][0])
+                bkey = (addr, path)
+                buf = self.block1.get(bkey)
+                if num == 0:
+                    if len(self.block1) >= 1024:           # abandoned uploads
+                        self.block1.clear()
+                    buf = self.block1[bkey] = bytearray()
+                if buf is None or len(buf) != num << (szx + 4):
+                    self.block1.pop(bkey, None)
+                    return build(rtyp, INCOMPLETE, rmid, token)
+                buf += payload
+                if len(buf) > BLOCK1_MAX:
+                    self.block1.pop(bkey, None)
+                    return build(rtyp, TOO_LARGE, rmid, token, [(OPT_SIZE1, _uint(BLOCK1_MAX))])
+                if more:
+                    return build(rtyp, CONTINUE, rmid, token, [(OPT_BLOCK1, block_opt(num, True, szx))])
+                payload = bytes(self.block1.pop(bkey))
+                extra.append((OPT_BLOCK1, block_opt(num, False, szx)))
+                self.stats["block1_uploads"] += 1
+            status, body = res.post(payload, query) if code == POST else res.put(payload, query)
+        elif code == GET:
+            status, body = res.get(query)
+            if res.observable and OPT_OBSERVE in opts:
+                obs = int.from_bytes(opts[OPT_OBSERVE][0], "big")
+                okey = (addr, token)
+                if obs == 0 and (okey in res.observers or self._observer_count() < MAX_OBSERVERS):
+                    res.observers[okey] = time.monotonic()
+                    extra.append((OPT_OBSERVE, _uint(res.seq & 0xFFFFFF)))
+                    self.stats["observe_registered"] += 1
+                elif obs == 1:
+                    res.observers.pop(okey, None)
+        else:
+            return build(rtyp, NOT_ALLOWED, rmid, token)
+
+        opts_out = extra + [(OPT_CFORMAT, _uint(res.cformat))]
+        if code == GET:
+            szx = 6
+            num = 0
+            if OPT_BLOCK2 in opts:
+                num, _, szx = parse_block(opts[OPT_BLOCK2][0])
+                szx = min(szx, 6)
+            size = 1 << (szx + 4)
+            if len(body) > size or num:
+                chunk = body[num * size:(num + 1) * size]
+                more = (num + 1) * size < len(body)
+                opts_out.append((OPT_BLOCK2, block_opt(num, more, szx)))
+                if num == 0:
+                    opts_out.append((OPT_SIZE2, _uint(len(body))))
+                body = chunk
+                self.stats["block2_blocks"] += 1
+
+        if res.separate and typ == CON:
+            # empty ACK now, the real response later as its own CON exchange
+            asyncio.get_running_loop().call_later(res.separate, self._separate, addr, token, status, opts_out, body)
+            self.stats["separate"] += 1
+            return build(ACK, 0, mid, b"")
+        return build(rtyp, status, rmid, token, opts_out, body)
+
+    # --- separate responses, observe notifications, retransmission ------------------
+    def _separate(self, addr, token, status, opts, body):
+        mid = self.next_mid()
+        self._send_con(build(CON, status, mid, token, opts, body), addr, mid)
+
+    def _send_con(self, pkt, addr, mid):
+        timeout = ACK_TIMEOUT * self.rng.uniform(1.0, 1.5)
+        self.pending[(addr, mid)] = [pkt, 0, time.monotonic() + timeout, timeout]
+        self.send(pkt, addr)
+
+    def _observer_count(self):
+        return sum(len(r.observers) for r in self.tree.values())
+
+    def notify(self):
+        for res in self.tree.values():
+            if not res.observable:
+                continue
+            res.tick(self.rng)
+            if not res.observers:
+                continue
+            res.seq += 1
+            status, body = res.get([])
+            for addr, token in list(res.observers):
+                mid = self.next_mid()
+                # every 8th notification as CON to find out whether the client is still there
+                typ = CON if res.seq % 8 == 0 else NON
+                pkt = build(typ, status, mid, token, [(OPT_OBSERVE, _uint(res.seq & 0xFFFFFF)),
+                                                      (OPT_CFORMAT, _uint(res.cformat)),
+                                                      (OPT_MAX_AGE, _uint(int(OBSERVE_INTERVAL * 2)))], body)
+                self.notif[(addr, mid)] = (res, (addr, token))
+                if typ == CON:
+                    self._send_con(pkt, addr, mid)
+                else:
+                    self.send(pkt, addr)
+                self.stats["notifications"] += 1
+
+    def housekeeping(self):
+        now = time.monotonic()
+        for key, (pkt, tries, nxt, timeout) in list(self.pending.items()):
+            if now < nxt:
+                continue
+            if tries >= MAX_RETRANSMIT:
+                del self.pending[key]
+                obs = self.notif.pop(key, None)
+                if obs is not None:                       # unreachable observer
+                    obs[0].observers.pop(obs[1], None)
+                self.stats["con_timeouts"] += 1
+                continue
+            timeout *= 2
+            self.pending[key] = [pkt, tries + 1, now + timeout, timeout]
+            self.send(pkt, key[0])
+            self.stats["retransmits"] += 1
+        while self.dedup:
+            key, (exp, _) = next(iter(self.dedup.items()))
+            if exp > now:
+                break
+            self.dedup.popitem(last=False)
+        if len(self.notif) > 4 * MAX_OBSERVERS:
+            self.notif.clear()
+
+    def summary(self):
+        keys = sorted(k for k in self.stats if not k.startswith("req:"))
+        reqs = " ".join(f"{k[4:]}={v}" for k, v in sorted(self.stats.items()) if k.startswith("req:"))
+        return (" ".join(f"{k}={self.stats[k]}" for k in keys) +
+                f" dedup={len(self.dedup)} observers={self._observer_count()} [{reqs}]")
+
+
+async def start(port=PORT, addr="0.0.0.0"):
+    loop = asyncio.get_running_loop()
+    transport, srv = await loop.create_datagram_endpoint(CoapServer, local_addr=(addr, port))
+    print(f"[COAP] CoAP server on {addr}:{port}/udp ({', '.join('/' + p for p in srv.tree)})", flush=True)
+    return transport, srv
+
+async def run(transport, srv):
+    next_obs = next_stats = time.monotonic()
+    try:
+        while True:
+            await asyncio.sleep(0.25)
+            now = time.monotonic()
+            srv.housekeeping()
+            if now >= next_obs:
+                next_obs = now + OBSERVE_INTERVAL
+                srv.notify()
+            if STATS_INTERVAL > 0 and now >= next_stats + STATS_INTERVAL:
+                next_stats = now
+                print(f"[COAP] stats {srv.summary()}", flush=True)
+    finally:
+        transport.close()
+
+async def main():
+    emu_stats.serve()
+    await run(*await start())
+
+if __name__ == "__main__":
+    asyncio.run(main())
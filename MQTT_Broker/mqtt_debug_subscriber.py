@@ -1,4 +1,4 @@
-import os, sys, time
+import os, sys, time, json, queue, threading
 from datetime import datetime
 import paho.mqtt.client as mqtt
 
@@ -9,43 +9,180 @@ TOPICS = [
     ("ACME/device/+/exec/server", 0),
 ]
 LOGFILE = "/tmp/mqtt_debug_exec.log"
+EXECFILE = "/tmp/mqtt_exec_simulated"
+STATSFILE = os.getenv("MQTT_DEBUG_STATS", "/tmp/mqtt_debug_stats.json")
+
+# background writer: bounded queue, batched writes, size-based rotation
+QUEUE_MAX = int(os.getenv("MQTT_DEBUG_QUEUE", "100000"))
+BATCH_MAX = int(os.getenv("MQTT_DEBUG_BATCH", "2000"))
+FLUSH_INTERVAL = float(os.getenv("MQTT_DEBUG_FLUSH", "0.2"))
+LOG_MAX_BYTES = int(os.getenv("MQTT_DEBUG_LOG_MAX", str(64 << 20)))
+LOG_BACKUPS = int(os.getenv("MQTT_DEBUG_LOG_BACKUPS", "3"))
+STDOUT = os.getenv("MQTT_DEBUG_STDOUT", "1") == "1"
+STATS_INTERVAL = float(os.getenv("MQTT_DEBUG_STATS_INTERVAL", "10"))
+# >1: that many clients share the subscription ($share/<group>/topic), the broker load-balances
+SHARED_CLIENTS = int(os.getenv("MQTT_SHARED_CLIENTS", "1"))
+SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP", "debug")
+
+
+class RotatingFile:
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.path, self.max_bytes, self.backups = path, max_bytes, backups
+        self.f = None
+        self.size = 0
+
+    def _open(self):
+        self.f = open(self.path, "a", encoding="utf-8")
+        self.size = self.f.tell()
+
+    def write(self, text):
+        if self.f is None:
+            self._open()
+        if self.max_bytes and self.size + len(text) > self.max_bytes and self.size:
+            self.rotate()
+        self.f.write(text)
+        self.size += len(text)
+
+    def rotate(self):
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+
+class BatchWriter:
+    """Takes (timestamp, topic, payload) items off the MQTT threads; formats and writes them in batches."""
+
+    def __init__(self):
+        self.q = queue.Queue(maxsize=QUEUE_MAX)
+        self.files = {"log": RotatingFile(LOGFILE), "exec": RotatingFile(EXECFILE)}
+        self.lock = threading.Lock()
+        self.received = self.processed = self.dropped = 0
+        self.t0 = time.time()
+        threading.Thread(target=self._run, name="debug-writer", daemon=True).start()
+
+    def put(self, item):
+        try:
+            self.q.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def message(self, topic, payload):
+        # called on paho's loop thread: count, enqueue, nothing else
+        with self.lock:
+            self.received += 1
+            if not self.put((time.time(), topic, payload)):
+                self.dropped += 1
+
+    def _format(self, ts, topic, payload, out, execs):
+        stamp = datetime.utcfromtimestamp(ts).isoformat()
+        if topic is None:
+            out.append(f"{stamp}Z {payload}\n")
+            return 0
+        try:
+            text = payload.decode("utf-8", errors="ignore")
+        except Exception:
+            text = "<binary>"
+        out.append(f"{stamp}Z [msg] topic={topic} payload={text!r}\n")
+        if text.lower().startswith("debug "):
+            cmd = text[6:].strip()
+            out.append(f"{stamp}Z [exec-sim] would run: {cmd!r}\n")
+            execs.append(cmd + "\n")
+        return 1
+
+    def _run(self):
+        next_stats = time.time() + STATS_INTERVAL
+        while True:
+            try:
+                items = [self.q.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < BATCH_MAX:
+                try:
+                    items.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            out, execs, msgs = [], [], 0
+            for ts, topic, payload in items:
+                msgs += self._format(ts, topic, payload, out, execs)
+            try:
+                if out:
+                    text = "".join(out)
+                    self.files["log"].write(text)
+                    if STDOUT:
+                        sys.stdout.write(text); sys.stdout.flush()
+                if execs:
+                    self.files["exec"].write("".join(execs))
+                for f in self.files.values():
+                    f.flush()
+            except Exception:
+                pass
+            if msgs:
+                with self.lock:
+                    self.processed += msgs
+            if STATS_INTERVAL > 0 and time.time() >= next_stats:
+                next_stats = time.time() + STATS_INTERVAL
+                self.write_stats()
+
+    def snapshot(self):
+        with self.lock:
+            return {"received": self.received, "processed": self.processed, "dropped": self.dropped,
+                    "queued": self.q.qsize(), "clients": SHARED_CLIENTS,
+                    "uptime_s": round(time.time() - self.t0, 1)}
+
+    def write_stats(self):
+        snap = self.snapshot()
+        log("[stats] " + " ".join(f"{k}={v}" for k, v in snap.items()))
+        try:
+            tmp = STATSFILE + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(snap, f)
+            os.replace(tmp, STATSFILE)
+        except Exception:
+            pass
+
+
+WRITER = BatchWriter()
+
 
 def log(msg: str):
-    line = f"{datetime.utcnow().isoformat()}Z {msg}\n"
-    sys.stdout.write(line); sys.stdout.flush()
-    try:
-        with open(LOGFILE, "a") as f:
-            f.write(line)
-    except Exception:
-        pass
+    WRITER.put((time.time(), None, msg))
 
 def on_connect(client, userdata, flags, rc, props=None):
-    log(f"[connect] rc={rc}")
+    log(f"[connect] {userdata} rc={rc}")
     for t, qos in TOPICS:
-        client.subscribe(t, qos=qos)
-        log(f"[subscribe] {t} qos={qos}")
+        topic = f"$share/{SHARE_GROUP}/{t}" if SHARED_CLIENTS > 1 else t
+        client.subscribe(topic, qos=qos)
+        log(f"[subscribe] {topic} qos={qos}")
 
 def on_message(client, userdata, msg):
-    try:
-        payload = msg.payload.decode("utf-8", errors="ignore")
-    except Exception:
-        payload = "<binary>"
-    log(f"[msg] topic={msg.topic} payload={payload!r}")
-    if payload.lower().startswith("debug "):
-        cmd = payload[6:].strip()
-        log(f"[exec-sim] would run: {cmd!r}")
-        try:
-            with open("/tmp/mqtt_exec_simulated", "a") as f:
-                f.write(cmd + "\n")
-        except Exception:
-            pass
+    WRITER.message(msg.topic, msg.payload)
 
-def main():
-    client = mqtt.Client(client_id="debug-listener", clean_session=True, protocol=mqtt.MQTTv311)
+def make_client(client_id):
+    client = mqtt.Client(client_id=client_id, clean_session=True, protocol=mqtt.MQTTv311, userdata=client_id)
     client.on_connect = on_connect
     client.on_message = on_message
     client.connect(BROKER_HOST, BROKER_PORT, keepalive=30)
-    client.loop_forever()
+    return client
+
+def main():
+    if SHARED_CLIENTS <= 1:
+        make_client("debug-listener").loop_forever()
+        return
+    clients = [make_client(f"debug-listener-{i}") for i in range(SHARED_CLIENTS)]
+    for c in clients[1:]:
+        c.loop_start()
+    clients[0].loop_forever()
 
 if __name__ == "__main__":
     main()
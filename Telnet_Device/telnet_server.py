@@ -1,4 +1,9 @@
-import socket, threading
+import asyncio, os, resource, sys, time
+from collections import Counter
+
+# emu_stats.py: next to this file in the image, ../Emulator_Common in the repo
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Emulator_Common"))
+import emu_stats
 
 BANNER = b"Welcome to SAMPLE Telnet Device\r\n"
 LOGIN_PROMPT = b"login: "
@@ -6,72 +11,220 @@ PASS_PROMPT  = b"Password: "
 OK_MSG       = b"\r\nLogin successful.\r\n$ "
 FAIL_MSG     = b"\r\nLogin incorrect\r\n"
 
-def recv_line(conn, maxlen=128, timeout=10):
-    conn.settimeout(timeout)
-    buf = b""
-    while len(buf) < maxlen:
-        try:
-            b = conn.recv(1)
-            if not b:
-                break
-            if b == b"\xff":
-                conn.recv(2)
+PORTS = [int(p) for p in os.environ.get("TELNET_PORTS", "23,2323").split(",") if p]
+IDLE_TIMEOUT = float(os.environ.get("TELNET_IDLE", "10"))          # login phase, per line
+SHELL_TIMEOUT = float(os.environ.get("TELNET_SHELL_IDLE", "120"))  # after login, per line
+MAX_SESSIONS = int(os.environ.get("TELNET_MAX_SESSIONS", "10000"))
+STATS_INTERVAL = float(os.environ.get("TELNET_STATS_INTERVAL", "60"))
+MAX_SB = 1024   # pending subnegotiation bytes (IAC SB ... without IAC SE) before the session is dropped
+
+# telnet commands (RFC 854)
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+
+
+class LineReader:
+    """
+    Buffered line parser for a telnet stream: strips IAC sequences (answering option
+    requests with a refusal once per option), handles CR LF / CR NUL / LF / CR and
+    cuts overlong lines at maxlen like the old recv_line(). Like recv_line(), a timeout or
+    EOF returns the partial line (b"" once the peer has closed); `timeouts` / `eof` tell why.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.buf = bytearray()
+        self.raw = b""
+        self.pos = 0
+        self.skip_lf = False
+        self.refused = set()
+        self.timeouts = 0
+        self.eof = False
+
+    async def _fill(self, timeout):
+        data = await asyncio.wait_for(self.reader.read(4096), timeout)
+        if not data:
+            raise EOFError
+        self.raw = self.raw[self.pos:] + data if self.pos < len(self.raw) else data
+        self.pos = 0
+
+    def _negotiate(self, verb, opt):
+        # refuse everything, but only once per (verb, option) so two refusing peers cannot loop
+        if (verb, opt) in self.refused:
+            return
+        self.refused.add((verb, opt))
+        reply = WONT if verb == DO else DONT if verb == WILL else None
+        if reply is not None:
+            self.writer.write(bytes((IAC, reply, opt)))
+
+    async def readline(self, maxlen=128, timeout=IDLE_TIMEOUT):
+        buf = self.buf
+        while True:
+            raw, i, n = self.raw, self.pos, len(self.raw)
+            while i < n:
+                b = raw[i]
+                if b == IAC:
+                    if i + 1 >= n:
+                        break  # need more bytes
+                    cmd = raw[i + 1]
+                    if cmd == IAC:
+                        i += 2
+                        self.skip_lf = False
+                        buf.append(IAC)
+                    elif cmd in (DO, DONT, WILL, WONT):
+                        if i + 2 >= n:
+                            break
+                        self._negotiate(cmd, raw[i + 2])
+                        i += 3
+                    elif cmd == SB:
+                        end = raw.find(bytes((IAC, SE)), i + 2)
+                        if end < 0:
+                            if n - i > MAX_SB:
+                                self.raw, self.pos = b"", 0
+                                raise ConnectionAbortedError("subnegotiation without IAC SE")
+                            break
+                        i = end + 2
+                    else:
+                        i += 2
+                    continue
+                if self.skip_lf:
+                    self.skip_lf = False
+                    if b in (10, 0):
+                        i += 1
+                        continue
+                if b in (10, 13):
+                    self.skip_lf = b == 13
+                    self.pos = i + 1
+                    line = bytes(buf).strip()
+                    buf.clear()
+                    return line
+                buf.append(b)
+                i += 1
+                if len(buf) >= maxlen:
+                    self.pos = i
+                    line = bytes(buf).strip()
+                    buf.clear()
+                    return line
+            self.pos = i
+            try:
+                if self.eof:
+                    raise EOFError
+                await self._fill(timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+            except (EOFError, ConnectionError, OSError):
+                self.eof = True
+            else:
                 continue
-            if b in (b"\n", b"\r"):
-                conn.settimeout(0.01)
-                try:
-                    nxt = conn.recv(1)
-                    if nxt not in (b"\n", b"\r"):
-                        pass
-                except Exception:
-                    pass
-                conn.settimeout(timeout)
-                break
-            buf += b
-        except Exception:
-            break
-    return buf.strip()
-
-def handle_client(conn, addr):
+            line = bytes(buf).strip()
+            buf.clear()
+            return line
+
+
+class TelnetDevice:
+    def __init__(self):
+        self.active = 0
+        self.stats = Counter()
+        self.attempts = Counter()   # login attempts per source IP
+        self.success = Counter()
+        # endpoints: "login" (ok/fail, time from connect to verdict), "shell cmd" (echo latency),
+        # "session" (end reason, session duration)
+        self.ep = emu_stats.EndpointStats("telnet")
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info("peername") or ("?", 0)
+        t0 = time.perf_counter()
+        if self.active >= MAX_SESSIONS:
+            self.stats["rejected"] += 1
+            self.ep.record("session", "rejected", 0.0)
+            writer.transport.abort()
+            return
+        end = "closed"
+        self.active += 1
+        self.stats["sessions"] += 1
+        self.stats["peak"] = max(self.stats["peak"], self.active)
+        lines = LineReader(reader, writer)
+        try:
+            writer.write(BANNER + LOGIN_PROMPT)
+            user = await lines.readline()
+
+            writer.write(PASS_PROMPT)
+            pw = await lines.readline()
+
+            self.attempts[peer[0]] += 1
+            if user == b"root" and pw == b"admin":
+                self.success[peer[0]] += 1
+                self.ep.record("login", "ok", time.perf_counter() - t0)
+                writer.write(OK_MSG)
+                while True:
+                    writer.write(b"$ ")
+                    line = await lines.readline(maxlen=256, timeout=SHELL_TIMEOUT)
+                    if not line:
+                        break
+                    if line.lower() in (b"exit", b"logout", b"quit"):
+                        break
+                    t1 = time.perf_counter()
+                    writer.write(b"\r\n" + line + b"\r\n")
+                    await writer.drain()
+                    self.ep.record("shell cmd", "echo", time.perf_counter() - t1)
+            else:
+                self.ep.record("login", "fail", time.perf_counter() - t0)
+                writer.write(FAIL_MSG)
+                await writer.drain()
+        except ConnectionAbortedError:
+            self.stats["sb_overflow"] += 1
+            end = "sb_overflow"
+            writer.transport.abort()
+        except (ConnectionError, OSError):
+            end = "eof"
+        finally:
+            if lines.timeouts:
+                self.stats["idle_timeouts"] += 1
+                if end == "closed":
+                    end = "idle_timeout"
+            if lines.eof and end == "closed":
+                end = "eof"
+            self.ep.record("session", end, time.perf_counter() - t0)
+            self.active -= 1
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    def summary(self):
+        top = ", ".join(f"{ip}={n}" for ip, n in self.attempts.most_common(5))
+        return (f"active={self.active} " + " ".join(f"{k}={v}" for k, v in sorted(self.stats.items())) +
+                f" logins={sum(self.attempts.values())} ok={sum(self.success.values())} top=[{top}]")
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            print(f"[TELNET DEVICE] stats {self.summary()}", flush=True)
+
+
+def raise_nofile():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
     try:
-        conn.sendall(BANNER)
-        conn.sendall(LOGIN_PROMPT)
-        user = recv_line(conn)
-
-        conn.sendall(PASS_PROMPT)
-        pw = recv_line(conn)
-
-        if user == b"root" and pw == b"admin":
-            conn.sendall(OK_MSG)
-            while True:
-                conn.sendall(b"$ ")
-                line = recv_line(conn, maxlen=256, timeout=120)
-                if not line:
-                    break
-                if line.lower() in (b"exit", b"logout", b"quit"):
-                    break
-                conn.sendall(b"\r\n" + line + b"\r\n")
-        else:
-            conn.sendall(FAIL_MSG)
-    except Exception:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (want, hard))
+    except (ValueError, OSError):
         pass
-    finally:
-        try:
-            conn.shutdown(socket.SHUT_RDWR)
-        except Exception:
-            pass
-        conn.close()
-
-def serve(port):
-    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    srv.bind(("", port))
-    srv.listen(64)
-    print(f"[TELNET DEVICE] Telnet server listening on :{port}")
-    while True:
-        c, a = srv.accept()
-        threading.Thread(target=handle_client, args=(c, a), daemon=True).start()
+
+
+async def start(dev, ports=PORTS, addr=""):
+    servers = []
+    for port in ports:
+        servers.append(await asyncio.start_server(dev.handle, addr or None, port, backlog=4096, reuse_address=True))
+        print(f"[TELNET DEVICE] Telnet server listening on {addr}:{port}")
+    if STATS_INTERVAL > 0:
+        asyncio.get_running_loop().create_task(dev.report())
+    return servers
+
+async def main():
+    raise_nofile()
+    emu_stats.serve()
+    servers = await start(TelnetDevice())
+    await asyncio.gather(*(s.serve_forever() for s in servers))
 
 if __name__ == "__main__":
-    threading.Thread(target=serve, args=(23,), daemon=True).start()
-    serve(2323)
+    asyncio.run(main())
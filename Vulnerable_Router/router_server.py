@@ -1,5 +1,13 @@
 from http.server import BaseHTTPRequestHandler, HTTPServer
-import ssl, threading, socket, urllib.parse as up, json, os
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+import ssl, threading, socket, selectors, time, os, sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# emu_routes.py: next to this file in the image, ../Emulator_Common in the repo
+sys.path.insert(1, os.path.join(HERE, "..", "Emulator_Common"))
+from emu_routes import RoutedHandler, load_routes
+import emu_stats
 
 def get_self_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -14,6 +22,18 @@ def get_self_ip():
 
 SELF_IP = get_self_ip()
 
+# firmware image for bulk download traffic (ba_noise --bandwidth)
+FIRMWARE = os.urandom(int(os.environ.get("FIRMWARE_SIZE", str(8 << 20))))
+
+# one selector loop + bounded worker pool for all services (ROUTER_LEGACY=1: old thread per service)
+LEGACY = os.environ.get("ROUTER_LEGACY", "0") == "1"
+WORKERS = int(os.environ.get("ROUTER_WORKERS", "64"))
+CONN_TIMEOUT = float(os.environ.get("ROUTER_TIMEOUT", "10"))
+STATS_INTERVAL = float(os.environ.get("ROUTER_STATS_INTERVAL", "60"))
+# M-SEARCH answers per source and second (token bucket), burst
+SSDP_RATE = float(os.environ.get("SSDP_RATE", "5"))
+SSDP_BURST = float(os.environ.get("SSDP_BURST", "20"))
+
 UPNP_RESPONSE = "\r\n".join([
     "HTTP/1.1 200 OK",
     "CACHE-CONTROL: max-age=120",
@@ -24,86 +44,20 @@ UPNP_RESPONSE = "\r\n".join([
     f"LOCATION: http://{SELF_IP}:80/device.xml",
     "", ""
 ])
+UPNP_RESPONSE_BYTES = UPNP_RESPONSE.encode()
 
-def parse_qs(path):
-    parsed = up.urlparse(path)
-    return parsed.path, dict(up.parse_qsl(parsed.query, keep_blank_values=True))
+STATS = emu_stats.EndpointStats("router")
 
 def read_body(handler):
     length = int(handler.headers.get("Content-Length", 0))
     return handler.rfile.read(length) if length > 0 else b""
 
-def ok(handler, body: bytes, ctype="text/plain"):
-    handler.send_response(200, "OK")
-    handler.send_header("Content-Type", ctype)
-    handler.send_header("Content-Length", str(len(body)))
-    handler.end_headers()
-    handler.wfile.write(body)
 
-
-class RouterHandler(BaseHTTPRequestHandler):
+class RouterHandler(RoutedHandler, BaseHTTPRequestHandler):
     server_version = "VulnRouter/1.0"
-
-    def do_GET(self):
-        path, qs = parse_qs(self.path)
-
-        if path == "/login.cgi" and "cli" in qs:
-            return ok(self, b"Command executed via login.cgi (dummy)")
-
-        if "images" in self.path:
-            return ok(self, b"GPON router admin content (auth bypassed)")
-
-        if path == "/cgi-bin/downloadFlile.cgi":
-            return ok(self, b"downloadFlile.cgi response (dummy)")
-
-        if path == "/goform/WriteFacMac":
-            return ok(self, b"WriteFacMac applied (dummy)")
-
-        if path == "/goform/AdvSetLanip":
-            return ok(self, b"AdvSetLanip applied (dummy)")
-
-        if "country=" in self.path:
-            return ok(self, b"Country parameter applied (dummy)")
-
-        if path == "/device.xml":
-            xml = f"""<?xml version="1.0"?>
-                    <root>
-                    <device><friendlyName>DummyRouter</friendlyName><presentationURL>http://{SELF_IP}/</presentationURL></device>
-                    </root>""".encode()
-            return ok(self, xml, "application/xml")
-
-        self.send_response(404); self.end_headers(); self.wfile.write(b"Not Found")
-
-    def do_POST(self):
-        path, qs = parse_qs(self.path)
-        body = read_body(self)
-        ctype = (self.headers.get("Content-Type") or "").lower()
-
-        if path.startswith("/ubus"):
-            return ok(self, b'{"jsonrpc":"2.0","result":"ok"}', "application/json")
-
-        if path == "/ztp/cgi-bin/handler":
-            return ok(self, b'{"status":"applied"}', "application/json")
-
-        if path == "/HNAP1":
-            return ok(self, b"<Envelope><Body>HNAP OK</Body></Envelope>", "text/xml")
-
-        if path == "/cgi-bin/cstecgi.cgi":
-            return ok(self, b"cstecgi.cgi applied (dummy)")
-
-        if path == "/apply.cgi":
-            return ok(self, b"apply.cgi OK (dummy)")
-
-        if path == "/ping.ccp":
-            return ok(self, b"ping OK (dummy)")
-
-        if path.startswith("/cgi-bin/luci/"):
-            return ok(self, b"luci country write OK (dummy)")
-
-        if path == "/shell":
-            return ok(self, b"MVPower /shell (dummy)", "text/plain")
-            
-        self.send_response(404); self.end_headers(); self.wfile.write(b"Not Found")
+    routes = load_routes(os.environ.get("ROUTER_ROUTES", os.path.join(HERE, "router_routes.json")),
+                         {"SELF_IP": SELF_IP, "FIRMWARE": FIRMWARE})
+    stats = STATS
 
     def log_message(self, fmt, *args):
         return 
@@ -113,13 +67,17 @@ class TR064Handler(BaseHTTPRequestHandler):
     server_version = "TR064/1.0"
 
     def do_POST(self):
+        t0 = time.perf_counter()
         body = read_body(self)
         self.send_response(200)
         self.send_header("Content-Type", "text/xml"); self.end_headers()
         self.wfile.write(b"<SOAP-ENV:Envelope><SOAP-ENV:Body>OK</SOAP-ENV:Body></SOAP-ENV:Envelope>")
+        STATS.record("tr064 POST", 200, time.perf_counter() - t0)
 
     def do_GET(self):
+        t0 = time.perf_counter()
         self.send_response(404); self.end_headers()
+        STATS.record("tr064 GET", 404, time.perf_counter() - t0)
 
     def log_message(self, fmt, *args):
         return
@@ -132,7 +90,9 @@ def run_ssdp():
     while True:
         data, addr = sock.recvfrom(4096)
         if data and b"M-SEARCH" in data:
+            t0 = time.perf_counter()
             sock.sendto(UPNP_RESPONSE.encode(), addr)
+            STATS.record("ssdp M-SEARCH", "replied", time.perf_counter() - t0)
 
 
 
@@ -148,18 +108,202 @@ def run_http(port, ssl_ctx=None):
 def run_tr064():
     HTTPServer(('', 7547), TR064Handler).serve_forever()
 
-def main():
+class _ServerShim:
+    """What BaseHTTPRequestHandler expects from self.server when run outside socketserver."""
+    def __init__(self, port, addr=""):
+        self.server_address = (addr, port)
+
+
+class RouterHost:
+    """
+    All router services on one selectors loop: the loop only accepts TCP connections and
+    answers SSDP datagrams; TLS handshake and request handling run in a bounded worker pool.
+    """
+
+    def __init__(self, workers=WORKERS, ssl_ctx=None):
+        self.sel = selectors.DefaultSelector()
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="router")
+        # at most this many accepted connections in flight; beyond that they wait in the kernel backlog
+        self.slots = threading.BoundedSemaphore(workers * 4)
+        # listening sockets are unregistered while no slot is free (the loop itself never blocks)
+        self.listeners = {}
+        self.paused = False
+        self.plock = threading.Lock()
+        self.ssl_ctx = ssl_ctx
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        self.ssdp_buckets = {}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def listen_tcp(self, port, handler, tls=False, addr=''):
+        srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        srv.bind((addr, port))
+        srv.listen(1024)
+        srv.setblocking(False)
+        self.listeners[srv] = (handler, tls, _ServerShim(port, addr))
+        self.sel.register(srv, selectors.EVENT_READ, (self._accept, self.listeners[srv]))
+        print(f"[VULNERABLE ROUTER] {'HTTPS' if tls else 'HTTP'} server on {addr}:{port} ({handler.__name__})")
+
+    def listen_udp(self, port, addr=''):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((addr, port))
+        sock.setblocking(False)
+        self.sel.register(sock, selectors.EVENT_READ, (self._ssdp, None))
+        print(f"[*] SSDP listener on {addr}:{port}/UDP (max {SSDP_RATE:g}/s per source, burst {SSDP_BURST:g})")
+
+    def _accept(self, srv, data):
+        handler, tls, shim = data
+        for _ in range(64):
+            if not self.slots.acquire(blocking=False):
+                self.count("backpressure")
+                self._pause()
+                return
+            try:
+                conn, addr = srv.accept()
+            except (BlockingIOError, InterruptedError):
+                self.slots.release()
+                return
+            except OSError:
+                self.slots.release()
+                self.count("accept_errors")
+                return
+            self.count("connections")
+            self.pool.submit(self._serve, conn, addr, handler, tls, shim)
+
+    def _pause(self):
+        """No free slot: stop watching the listeners until _serve releases one."""
+        with self.plock:
+            self._listen(False)
+            # a slot released before paused was set would never resume us
+            if self.slots.acquire(blocking=False):
+                self.slots.release()
+                self._listen(True)
+
+    def _resume(self):
+        with self.plock:
+            if self.paused:
+                self._listen(True)
+
+    def _listen(self, on):
+        # caller holds plock; the selector picks up re-registered sockets on its next select()
+        if self.paused != on:
+            return
+        self.paused = not on
+        for srv, data in self.listeners.items():
+            if on:
+                self.sel.register(srv, selectors.EVENT_READ, (self._accept, data))
+            else:
+                self.sel.unregister(srv)
+
+    def _serve(self, conn, addr, handler, tls, shim):
+        try:
+            conn.setblocking(True)
+            conn.settimeout(CONN_TIMEOUT)
+            if tls:
+                try:
+                    conn = self.ssl_ctx.wrap_socket(conn, server_side=True)
+                except (ssl.SSLError, OSError):
+                    self.count("tls_failed")
+                    return
+                self.count("tls_resumed" if conn.session_reused else "tls_full")
+            handler(conn, addr, shim)
+        except Exception:
+            self.count("handler_errors")
+        finally:
+            try:
+                conn.close()
+            except OSError:
+                pass
+            self.slots.release()
+            self._resume()
+
+    def _ssdp(self, sock, _data):
+        for _ in range(256):
+            try:
+                data, addr = sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if not (data and b"M-SEARCH" in data):
+                continue
+            self.count("ssdp_msearch")
+            t0 = time.perf_counter()
+            if not self._ssdp_allow(addr[0]):
+                self.count("ssdp_limited")
+                STATS.record("ssdp M-SEARCH", "limited", time.perf_counter() - t0)
+                continue
+            try:
+                sock.sendto(UPNP_RESPONSE_BYTES, addr)
+                self.count("ssdp_replied")
+                STATS.record("ssdp M-SEARCH", "replied", time.perf_counter() - t0)
+            except OSError:
+                pass
+
+    def _ssdp_allow(self, ip):
+        now = time.monotonic()
+        tokens, last = self.ssdp_buckets.get(ip, (SSDP_BURST, now))
+        tokens = min(SSDP_BURST, tokens + (now - last) * SSDP_RATE)
+        if len(self.ssdp_buckets) > 65536:
+            self.ssdp_buckets.clear()
+        if tokens < 1.0:
+            self.ssdp_buckets[ip] = (tokens, now)
+            return False
+        self.ssdp_buckets[ip] = (tokens - 1.0, now)
+        return True
+
+    def summary(self):
+        with self.lock:
+            st = dict(self.stats)
+        if self.ssl_ctx is not None:
+            ss = self.ssl_ctx.session_stats()
+            st["tls_cache_hits"] = ss.get("hits", 0)
+        return " ".join(f"{k}={v}" for k, v in sorted(st.items()))
+
+    def serve_forever(self):
+        nxt = time.monotonic() + STATS_INTERVAL
+        while True:
+            for key, _ in self.sel.select(timeout=1.0):
+                cb, data = key.data
+                cb(key.fileobj, data)
+            if STATS_INTERVAL > 0 and time.monotonic() >= nxt:
+                nxt += STATS_INTERVAL
+                print(f"[VULNERABLE ROUTER] stats {self.summary()}", flush=True)
+
+
+def tls_context():
+    key = os.environ.get("SSL_KEY", "/etc/ssl/private/router.key")
+    crt = os.environ.get("SSL_CRT", "/etc/ssl/certs/router.crt")
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(certfile=crt, keyfile=key)
+    # session resumption: TLS 1.3 tickets, TLS 1.2 tickets + server-side session cache
+    ctx.options &= ~ssl.OP_NO_TICKET
+    ctx.num_tickets = 2
+    return ctx
+
+def main_legacy():
     threading.Thread(target=run_ssdp, daemon=True).start()
 
     threading.Thread(target=run_tr064, daemon=True).start()
 
     threading.Thread(target=run_http, args=(80, None), daemon=True).start()
 
-    key = os.environ.get("SSL_KEY", "/etc/ssl/private/router.key")
-    crt = os.environ.get("SSL_CRT", "/etc/ssl/certs/router.crt")
-    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    ctx.load_cert_chain(certfile=crt, keyfile=key)
-    run_http(443, ctx)
+    run_http(443, tls_context())
+
+def main():
+    emu_stats.serve()
+    if LEGACY:
+        return main_legacy()
+    host = RouterHost(WORKERS, tls_context())
+    host.listen_udp(1900)
+    host.listen_tcp(7547, TR064Handler)
+    host.listen_tcp(80, RouterHandler)
+    host.listen_tcp(443, RouterHandler, tls=True)
+    host.serve_forever()
 
 if __name__ == "__main__":
     print(f"[VULNERABLE ROUTER] Router services at http://{SELF_IP}:80 , https://{SELF_IP}:443 and :7547, :1900/UDP")
@@ -5,11 +5,26 @@ import re
 import subprocess
 import sys
 import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 SID_RE = re.compile(r"\[\d+:(\d+):\d+\]")
 
+# ledger targets: ip:port, nc-style "ip port", http(s)://ip[:port], host="ip" ... port=N
+_IP = r"(\d{1,3}(?:\.\d{1,3}){3})"
+TARGET_RES = (
+    re.compile(_IP + r":(\d{1,5})\b"),
+    re.compile(r"\bnc\b[^|;&\n]*?" + _IP + r"\s+(\d{1,5})\b"),
+    re.compile(r"\bhost\s*=\s*[\"']" + _IP + r"[\"'][\s\S]{0,80}?\bport\s*=\s*(\d{1,5})\b"),
+)
+URL_RE = re.compile(r"\b(https?)://" + _IP + r"(?=[/'\"\s]|$)")
+IP_RE = re.compile(r"\b" + _IP + r"\b")
+
+# containers that ship Emulator_Common/emu_stats.py (--emu-stats docker)
+EMU_CONTAINERS = ("ip-camera", "vulnerable-router", "telnet-device", "mqtt-broker")
+
 
 def now():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -100,16 +115,187 @@ def as_sid_list(x) -> list[int]:
     return []
 
 
+def attack_targets(a: dict) -> list[tuple[str, int]]:
+    """Destinations of an attack for the ledger: the "targets" key ("ip:port" / "ip") or parsed from the command.
+    Port 0 = any port (only the IP is known)."""
+    spec = a.get("targets")
+    if spec:
+        out = []
+        for t in ([spec] if isinstance(spec, str) else spec):
+            ip, _, port = str(t).partition(":")
+            out.append((ip, int(port or 0)))
+        return out
+    cmd = a.get("command", "")
+    found: dict[str, set] = {}
+    for rx in TARGET_RES:
+        for ip, port in rx.findall(cmd):
+            found.setdefault(ip, set()).add(int(port))
+    for scheme, ip in URL_RE.findall(cmd):
+        found.setdefault(ip, set()).add(443 if scheme == "https" else 80)
+    for ip in IP_RE.findall(cmd):
+        found.setdefault(ip, set())
+    return [(ip, port) for ip, ports in found.items() for port in (sorted(ports) or [0])
+            if not ip.startswith(("127.", "0."))]
+
+
+def emu_sources(specs: list[str]) -> list[str]:
+    out = []
+    for spec in specs:
+        if spec == "docker":
+            out += [f"docker:{c}" for c in EMU_CONTAINERS]
+        else:
+            out.append(spec)
+    return out
+
+
+def fetch_emu(source: str, timeout: float = 5.0) -> dict:
+    """One stats document: docker:<container>, unix:<socket path> or http://host:port/."""
+    if source.startswith("docker:"):
+        cp = subprocess.run(["docker", "exec", source[7:], "python3", "/app/emu_stats.py"],
+                            capture_output=True, text=True, timeout=timeout)
+        doc = json.loads(cp.stdout or "{}")
+    elif source.startswith("unix:"):
+        sys.path.insert(1, str(Path(__file__).resolve().parent / "Emulator_Common"))
+        import emu_stats
+        doc = emu_stats.fetch(source[5:], timeout)
+    else:
+        with urllib.request.urlopen(source, timeout=timeout) as r:
+            doc = json.loads(r.read())
+    if "error" in doc:
+        raise OSError(doc["error"])
+    return doc
+
+
+def emu_snapshot(sources: list[str]) -> tuple[dict, list[int], list[str]]:
+    """Merged {service: snapshot} of all sources, fetched in parallel, histogram bounds and errors."""
+    services: dict = {}
+    bounds: list[int] = []
+    errors: list[str] = []
+    if not sources:
+        return services, bounds, errors
+    with ThreadPoolExecutor(len(sources)) as ex:
+        futs = [(src, ex.submit(fetch_emu, src)) for src in sources]
+        for src, fut in futs:
+            try:
+                doc = fut.result()
+                services.update(doc.get("services", {}))
+                bounds = doc.get("buckets_us", bounds)
+            except Exception as e:
+                errors.append(f"{src}: {e}")
+    return services, bounds, errors
+
+
+def bucket_quantile(buckets: list[int], bounds: list[int], q: float) -> int:
+    n = sum(buckets)
+    acc = 0
+    for i, c in enumerate(buckets):
+        acc += c
+        if n and acc >= q * n:
+            return bounds[i] if i < len(bounds) else -1
+    return 0
+
+
+def emu_delta(before: dict, after: dict, bounds: list[int]) -> dict:
+    """Per service/endpoint hits, codes and latency quantiles that happened between two snapshots.
+    Services missing from either snapshot (fetch failed) map to None: without "before", the totals since
+    the emulator started are not this attack's."""
+    out: dict = {}
+    for svc, snap in after.items():
+        if svc not in before:
+            out[svc] = None
+            continue
+        prev = before[svc]
+        # emulator restarted in between -> counters start from zero
+        if prev.get("uptime_s", 0) > snap.get("uptime_s", 0):
+            prev = {}
+        prev_eps = prev.get("endpoints", {})
+        for ep, st in snap.get("endpoints", {}).items():
+            p = prev_eps.get(ep, {})
+            hits = st["hits"] - p.get("hits", 0)
+            if hits <= 0:
+                continue
+            codes = {c: n - p.get("codes", {}).get(c, 0) for c, n in st["codes"].items()}
+            pb = p.get("buckets") or [0] * len(st["buckets"])
+            buckets = [a - b for a, b in zip(st["buckets"], pb)]
+            out.setdefault(svc, {})[ep] = {
+                "hits": hits,
+                "codes": {c: n for c, n in codes.items() if n > 0},
+                "p50_us": bucket_quantile(buckets, bounds, 0.5),
+                "p99_us": bucket_quantile(buckets, bounds, 0.99),
+            }
+    for svc in before:
+        if svc not in after:   # "after" snapshot failed
+            out[svc] = None
+    return out
+
+
+def delivered_hits(delivery: dict | None) -> int | None:
+    """Hits over the services that could be measured; None if none could."""
+    if delivery is None:
+        return None
+    measured = [eps for eps in delivery.values() if eps is not None]
+    if delivery and not measured:
+        return None
+    return sum(st["hits"] for eps in measured for st in eps.values())
+
+
+def recheck(report_path: Path, fastlog: str | None, slack: float) -> int:
+    """Re-evaluates a finished run from its attack windows via the fast.log time index (ba_logindex)."""
+    import ba_logindex
+
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    fastlog_path = Path(fastlog or report.get("summary", {}).get("fastlog") or "/var/log/suricata/fast.log")
+    if not fastlog_path.exists():
+        print(f"fast.log not found: {fastlog_path}", file=sys.stderr)
+        return 2
+    idx = ba_logindex.LogIndex(str(fastlog_path), slack=slack)
+    idx.update()
+    first = idx.times[0] if idx.times else None
+    out = []
+    print(f"Recheck {report_path} against {fastlog_path} ({len(idx.offsets)} index samples)")
+    for r in report.get("attacks", []):
+        win = r.get("window")
+        if not win:
+            print(f"{r['id']}: no attack window in the report (run predates --recheck), skipped")
+            continue
+        lines = idx.lines(win[0], win[1], update=False)
+        counts = parse_sid_counts("\n".join(line.decode("utf-8", "replace") for _, line in lines))
+        expected = r.get("expected_rulesid", [])
+        missing = [sid for sid in expected if counts.get(sid, 0) == 0]
+        passed = not missing
+        note = " (window older than fast.log, rotated?)" if first is not None and win[1] < first else ""
+        change = "" if passed == r.get("pass") else f" (was {'PASS' if r.get('pass') else 'FAIL'})"
+        print(f"{r['id']}: {'PASS' if passed else 'FAIL'}{change} observed={sorted(counts)} missing={missing}{note}")
+        out.append({"id": r["id"], "window": win, "observed_counts": counts, "pass": passed, "missing": missing,
+                    "pass_before": r.get("pass")})
+    dst = report_path.with_name("recheck.json")
+    dst.write_text(json.dumps({"fastlog": str(fastlog_path), "attacks": out}, indent=2), encoding="utf-8")
+    fails = sum(1 for r in out if not r["pass"])
+    print(f"PASS={len(out) - fails} FAIL={fails}  -> {dst}")
+    return 0 if not fails else 1
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
-    ap.add_argument("config", help="JSON file with attacks")
+    ap.add_argument("config", help="JSON file with attacks (with --recheck: run_report.json of an earlier run)")
     ap.add_argument("--fastlog", default=None, help="Override fast.log path")
     ap.add_argument("--outdir", default=None, help="Output directory (default: ./attack_runs/<timestamp>)")
     ap.add_argument("--timeout", type=int, default=20, help="Default command timeout (seconds)")
     ap.add_argument("--max-log-wait", type=float, default=15.0, help="Max seconds to wait for fast.log to update")
     ap.add_argument("--poll", type=float, default=1.0, help="Polling interval for fast.log updates")
+    ap.add_argument("--emu-stats", action="append", default=[],
+                    help="Snapshot emulator endpoint stats before/after each attack: docker (all emulator "
+                         "containers), docker:<name>, unix:<socket> (ba_emuhost) or http://host:port/ (repeatable)")
+    ap.add_argument("--ledger", default=None,
+                    help="Append one ground-truth entry per attack target to this ledger (score with ba_ledger.py)")
+    ap.add_argument("--recheck", action="store_true",
+                    help="Re-evaluate the attack windows of a run_report.json against fast.log (indexed, no re-run)")
+    ap.add_argument("--slack", type=float, default=5.0, help="--recheck: tolerated fast.log timestamp disorder (s)")
     args = ap.parse_args()
 
+    if args.recheck:
+        return recheck(Path(args.config), args.fastlog, args.slack)
+
     cfg_path = Path(args.config)
     cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
 
@@ -150,6 +336,17 @@ def main() -> int:
     results = []
     total_counts: dict[int, int] = {}
 
+    sources = emu_sources(args.emu_stats or (cfg.get("emu_stats", []) if isinstance(cfg, dict) else []))
+    if sources:
+        log(f"Emulator stats: {', '.join(sources)}")
+
+    ledger = None
+    ledger_path = args.ledger or (cfg.get("ledger") if isinstance(cfg, dict) else None)
+    if ledger_path:
+        import ba_ledger
+        ledger = ba_ledger.LedgerWriter(ledger_path, "ba_attack_runner")
+        log(f"Ledger: {ledger_path}")
+
     enabled = [a for a in attacks if a.get("enabled", True)]
     log(f"Enabled attacks: {len(enabled)}/{len(attacks)}")
 
@@ -165,6 +362,8 @@ def main() -> int:
         log(f"[{i}/{len(enabled)}] {aid} - {name}")
         log(f"Command: {cmd}")
 
+        emu_before, _, emu_errors = emu_snapshot(sources)
+
         t0 = time.time()
         rc, out, err = run_shell(cmd, timeout=timeout)
         runtime = time.time() - t0
@@ -173,6 +372,17 @@ def main() -> int:
             log(f"Post-wait: {post_wait:.1f}s")
             time.sleep(post_wait)
 
+        targets = []
+        if ledger is not None:
+            # only the destination is known: source address/port and protocol stay wildcards
+            targets = attack_targets(a)
+            lid = ledger.label(aid, expected)
+            t1 = time.time()
+            for ip, port in targets:
+                ledger.flow(t0, t1, "", ip, 0, port, 0, lid)
+            shown = ", ".join(f"{ip}:{port or '*'}" for ip, port in targets)
+            log(f"Ledger targets: {shown or '(none found)'}")
+
         frag = ""
         new_cur = cur
         if fastlog_path.exists():
@@ -187,6 +397,13 @@ def main() -> int:
 
         cur = new_cur
         counts = parse_sid_counts(frag)
+        t_end = time.time()
+
+        delivery = None
+        if sources:
+            emu_after, bounds, errs = emu_snapshot(sources)
+            emu_errors += errs
+            delivery = emu_delta(emu_before, emu_after, bounds) if emu_before or emu_after else None
 
         for sid, c in counts.items():
             total_counts[sid] = total_counts.get(sid, 0) + c
@@ -200,6 +417,15 @@ def main() -> int:
         log(f"Observed SIDs: {sorted(counts.keys()) if counts else '(none)'}")
         if missing:
             log(f"Missing SIDs: {missing}")
+        if delivery is not None:
+            hits = [f"{svc} {ep}={st['hits']} ({','.join(f'{c}x{n}' for c, n in st['codes'].items())})"
+                    for svc, eps in sorted(delivery.items()) if eps for ep, st in sorted(eps.items())]
+            log(f"Delivered: {'; '.join(hits) if hits else '(nothing at the instrumented emulators)'}")
+            unmeasured = sorted(svc for svc, eps in delivery.items() if eps is None)
+            if unmeasured:
+                log(f"[WARN] snapshot missing, delivery unknown: {', '.join(unmeasured)}")
+        for e in emu_errors:
+            log(f"[WARN] emulator stats: {e}")
 
         results.append({
             "id": aid,
@@ -215,8 +441,15 @@ def main() -> int:
             "observed_counts": counts,
             "pass": passed,
             "missing": missing,
+            "delivery": delivery,
+            "delivered_hits": delivered_hits(delivery),
+            "ledger_targets": [f"{ip}:{port}" for ip, port in targets] if ledger is not None else None,
+            "window": [round(t0, 3), round(t_end, 3)],
         })
 
+    if ledger is not None:
+        ledger.close()
+
     fails = [r for r in results if not r["pass"]]
     summary = {
         "started_at": now(),
@@ -227,6 +460,10 @@ def main() -> int:
         "attacks_fail": len(fails),
         "total_sid_counts": {str(k): v for k, v in sorted(total_counts.items())},
     }
+    if sources:
+        # FAIL without any request reaching an instrumented emulator: delivery problem, not (only) detection
+        # (delivered_hits None = not measurable, e.g. every "before" snapshot failed)
+        summary["attacks_fail_undelivered"] = sum(1 for r in fails if r["delivered_hits"] == 0)
 
     report = {
         "summary": summary,
@@ -0,0 +1,318 @@
+import argparse
+import csv
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import monitor_drops as md
+
+TOTAL_RE = re.compile(r"SUMMARY\s+total=(\d+)")
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class NoStats(RuntimeError):
+    """A load level got no stats sample within --settle, so it could not be measured."""
+
+
+class DropFeed:
+    """
+    Reads Suricata stats in the background from the same sources monitor_drops uses
+    (eve.json follower or unix-socket dump-counters) and keeps (time, kernel_drops, kernel_packets).
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        if args.socket:
+            client = md.SuricataSocket(args.socket)
+            client.connect()
+            self.source = md.socket_source(client, args.interval, False)
+            self.desc = f"socket {args.socket} every {args.interval:g}s"
+        else:
+            if not os.access(args.eve, os.R_OK):
+                raise OSError(f"cannot read {args.eve}")
+            follower = md.EveFollower(args.eve, from_start=False)
+            self.source = md.eve_source(follower, False)
+            self.desc = f"eve {args.eve} ({follower.mode})"
+        self.cond = threading.Condition()
+        self.samples: list[tuple[float, int, int]] = []
+        self.error: Exception | None = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> None:
+        try:
+            for stats, t, _lag, _behind in self.source:
+                kd, kp, _dd = md.extract_stats({"stats": stats})
+                with self.cond:
+                    self.samples.append((time.time(), kd, kp))
+                    del self.samples[:-10000]
+                    self.cond.notify_all()
+        except Exception as e:  # source died -> controller stops waiting
+            with self.cond:
+                self.error = e
+                self.cond.notify_all()
+
+    def after(self, t: float, timeout: float) -> tuple[float, int, int] | None:
+        """First sample taken at or after t (waits up to timeout seconds)."""
+        end = time.time() + timeout
+        with self.cond:
+            while True:
+                for s in self.samples:
+                    if s[0] >= t:
+                        return s
+                left = end - time.time()
+                if left <= 0 or self.error is not None:
+                    return None
+                self.cond.wait(left)
+
+    def latest(self) -> tuple[float, int, int] | None:
+        with self.cond:
+            return self.samples[-1] if self.samples else None
+
+
+def find_pids(names: list[str]) -> list[int]:
+    pids = []
+    for d in Path("/proc").iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            comm = (d / "comm").read_text().strip()
+        except OSError:
+            continue
+        if comm in names:
+            pids.append(int(d.name))
+    return pids
+
+
+def proc_ticks(pids: list[int]) -> int:
+    """utime+stime of all given processes (incl. their threads) in clock ticks."""
+    total = 0
+    for pid in pids:
+        try:
+            raw = Path(f"/proc/{pid}/stat").read_text()
+        except OSError:
+            continue
+        fields = raw[raw.rindex(")") + 2:].split()
+        total += int(fields[11]) + int(fields[12])
+    return total
+
+
+def sys_ticks() -> tuple[int, int]:
+    """(busy, total) jiffies from /proc/stat."""
+    vals = [int(x) for x in Path("/proc/stat").read_text().split("\n", 1)[0].split()[1:]]
+    idle = vals[3] + (vals[4] if len(vals) > 4 else 0)
+    return sum(vals) - idle, sum(vals)
+
+
+def run_step(args: argparse.Namespace, feed: DropFeed, pids: list[int], value: float, log) -> dict:
+    """Runs ba_noise at one load level and measures drops and CPU over the step."""
+    if args.knob == "rate":
+        load = ["--rate", f"{value:g}", "--max-rate", f"{value:g}"]
+    else:
+        load = ["--rate", f"{args.base_rate:g}", "--max-rate", f"{args.base_rate:g}", "--bandwidth", f"{value:g}"]
+    cmd = [sys.executable, args.noise, "--duration", str(int(args.step + args.warmup)), "--quiet",
+           "--report-interval", "0", "--seed", str(args.seed)] + load + args.noise_arg
+    log(f"[{now()}] STEP {args.knob}={value:g}: {' '.join(cmd[1:])}")
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                            start_new_session=True)
+    out: list[str] = []
+    reader = threading.Thread(target=lambda: out.extend(proc.stdout), daemon=True)
+    reader.start()
+
+    t_start = time.time() + args.warmup
+    time.sleep(args.warmup)
+    base = feed.after(t_start, args.settle)
+    c0, s0, w0 = proc_ticks(pids), sys_ticks(), time.time()
+
+    aborted = False
+    t_end = t_start + args.step
+    while proc.poll() is None and time.time() < t_end:
+        time.sleep(0.5)
+        cur = feed.latest()
+        # Back off early: crit threshold already crossed in this step
+        if base and cur and cur[1] - base[1] >= args.crit:
+            aborted = True
+            break
+
+    c1, s1, w1 = proc_ticks(pids), sys_ticks(), time.time()
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGINT)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+    reader.join(timeout=2)
+    end = feed.after(w1, args.settle)
+
+    drops = packets = None
+    if base and end:
+        drops = max(0, end[1] - base[1])
+        packets = max(0, end[2] - base[2])
+    m = TOTAL_RE.search("".join(out))
+    elapsed = max(1e-6, w1 - w0)
+    res = {
+        "value": value,
+        "drops": drops,
+        "packets": packets,
+        "drop_ratio": round(drops / packets, 6) if drops is not None and packets else None,
+        "noise_events": int(m.group(1)) if m else None,
+        "suricata_cpu_pct": round(100.0 * (c1 - c0) / CLK_TCK / elapsed, 1) if pids else None,
+        "sys_cpu_pct": round(100.0 * (s1[0] - s0[0]) / max(1, s1[1] - s0[1]), 1),
+        "seconds": round(elapsed, 1),
+        "aborted": aborted,
+    }
+    if drops is None:
+        res["status"] = "no-stats"
+    elif drops >= args.crit:
+        res["status"] = "crit"
+    elif drops >= args.warn:
+        res["status"] = "warn"
+    else:
+        res["status"] = "ok"
+    log(f"[{now()}]   -> drops={drops} packets={packets} suricata_cpu={res['suricata_cpu_pct']}% "
+        f"sys_cpu={res['sys_cpu_pct']}% status={res['status']}")
+    return res
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Find the highest ba_noise load Suricata sustains without drops.")
+    ap.add_argument("--eve", default=md.DEFAULT_EVE, help="eve.json with stats events (default source)")
+    ap.add_argument("--socket", nargs="?", const=md.DEFAULT_SOCKET, default=None,
+                    help="Read counters via the Suricata unix socket instead of eve.json")
+    ap.add_argument("--interval", type=float, default=1.0, help="dump-counters interval for --socket")
+    ap.add_argument("--knob", choices=("rate", "bandwidth"), default="rate",
+                    help="What to ramp: ba_noise --rate (events/min) or --bandwidth (Mbit/s)")
+    ap.add_argument("--start", type=float, default=60.0, help="First load level")
+    ap.add_argument("--max", type=float, default=60000.0, help="Upper bound for the ramp")
+    ap.add_argument("--factor", type=float, default=2.0, help="Ramp multiplier per step")
+    ap.add_argument("--tolerance", type=float, default=0.05, help="Stop binary search at this relative gap")
+    ap.add_argument("--max-steps", type=int, default=20, help="Max total steps (ramp + search)")
+    ap.add_argument("--base-rate", type=float, default=60.0, help="ba_noise --rate while ramping --bandwidth")
+    ap.add_argument("--step", type=float, default=60.0, help="Measured seconds per load level")
+    ap.add_argument("--warmup", type=float, default=10.0, help="Seconds of load before measuring")
+    ap.add_argument("--settle", type=float, default=20.0, help="Max wait for a stats sample at step start/end")
+    ap.add_argument("--retries", type=int, default=1, help="Repeat a level that got no stats sample this often, then abort")
+    ap.add_argument("--cooldown", type=float, default=15.0, help="Pause after a step that crossed a threshold")
+    ap.add_argument("--warn", type=int, default=1, help="kernel_drops per step that count as not sustainable")
+    ap.add_argument("--crit", type=int, default=500, help="kernel_drops per step that abort the step early")
+    ap.add_argument("--noise", default=str(Path(__file__).with_name("ba_noise.py")), help="Path to ba_noise.py")
+    ap.add_argument("--noise-arg", action="append", default=[], help="Extra argument passed to ba_noise (repeatable)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--suricata-pid", type=int, action="append", default=None,
+                    help="Suricata PID(s) for CPU measurement (default: search /proc for Suricata-Main)")
+    ap.add_argument("--json", default=None, help="Write the capacity curve as JSON")
+    ap.add_argument("--csv", default=None, help="Write the capacity curve as CSV")
+    args = ap.parse_args()
+
+    def log(line=""):
+        print(line, flush=True)
+
+    try:
+        feed = DropFeed(args)
+    except OSError as e:
+        print(f"Cannot open stats source: {e}", file=sys.stderr)
+        return 2
+    pids = args.suricata_pid or find_pids(["Suricata-Main", "suricata"])
+    log(f"[{now()}] source: {feed.desc}; suricata pids: {pids or 'not found (no per-process CPU)'}")
+
+    started = now()
+    curve: list[dict] = []
+
+    def step(value: float) -> bool:
+        # a level without stats sample is unmeasured, not failing: retry it, then give up
+        for attempt in range(max(0, args.retries) + 1):
+            res = run_step(args, feed, pids, value, log)
+            curve.append(res)
+            if res["status"] != "no-stats":
+                break
+            if attempt < args.retries:
+                log(f"[{now()}]   no stats sample within --settle, retrying {value:g}")
+        else:
+            raise NoStats(f"no stats sample within --settle at {value:g} ({attempt + 1} attempts)")
+        if res["status"] in ("warn", "crit") and args.cooldown > 0:
+            log(f"[{now()}]   threshold crossed, cooling down {args.cooldown:g}s")
+            time.sleep(args.cooldown)
+        return res["status"] == "ok"
+
+    good, bad, error = None, None, None
+    try:
+        # Phase 1: geometric ramp until the first failing level
+        value = args.start
+        while len(curve) < args.max_steps and value <= args.max:
+            if step(value):
+                good = value
+                value *= args.factor
+            else:
+                bad = value
+                break
+        if bad is None and good is not None and good * args.factor > args.max and len(curve) < args.max_steps:
+            log(f"[{now()}] reached --max without drops")
+
+        # Phase 2: binary search between last good and first bad level
+        if bad is not None and good is not None:
+            while len(curve) < args.max_steps and (bad - good) > args.tolerance * good:
+                mid = (good + bad) / 2.0
+                if step(mid):
+                    good = mid
+                else:
+                    bad = mid
+    except NoStats as e:
+        error = str(e)
+        print(f"Aborted: {e}; check the stats source ({feed.desc})", file=sys.stderr)
+
+    unit = "events/min" if args.knob == "rate" else "Mbit/s"
+    log("\n" + "=" * 78)
+    log("{:>12} {:>10} {:>12} {:>10} {:>10} {:>9} {:>7}".format(
+        args.knob, "drops", "packets", "ratio", "suri_cpu%", "sys_cpu%", "status"))
+    for r in sorted(curve, key=lambda r: r["value"]):
+        log("{:>12g} {:>10} {:>12} {:>10} {:>10} {:>9} {:>7}".format(
+            r["value"], str(r["drops"]), str(r["packets"]),
+            "-" if r["drop_ratio"] is None else f"{r['drop_ratio'] * 100:.3f}%",
+            "-" if r["suricata_cpu_pct"] is None else r["suricata_cpu_pct"], r["sys_cpu_pct"], r["status"]))
+    log("=" * 78)
+    if error is not None:
+        log(f"Capacity: not determined ({error})" + (f", last sustained: {good:g} {unit}" if good is not None else ""))
+    elif good is None:
+        log(f"Capacity: below {args.start:g} {unit} (first step already dropped)")
+    else:
+        log(f"Capacity: {good:g} {unit}" + (f" (first failing: {bad:g})" if bad is not None else " (upper bound not reached)"))
+
+    report = {
+        "started": started,
+        "source": feed.desc,
+        "knob": args.knob,
+        "unit": unit,
+        "capacity": good,
+        "first_failing": bad,
+        "error": error,
+        "warn": args.warn,
+        "crit": args.crit,
+        "step_seconds": args.step,
+        "noise_args": args.noise_arg,
+        "curve": curve,
+    }
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(curve[0]) if curve else ["value"])
+            w.writeheader()
+            w.writerows(curve)
+    if error is not None:
+        return 2
+    return 0 if good is not None else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,561 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import platform
+import resource
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# Request mix for the camera: (method, path, extra headers, body)
+CAMERA_MIX = [
+    ("GET", "/system.ini", {}, b""),
+    ("GET", "/admin", {"Authorization": "Basic " + base64.b64encode(b"admin:admin").decode()}, b""),
+    ("POST", "/res.php", {"Content-Type": "text/xml"}, b"<alarm>motion</alarm>"),
+    ("POST", "/onvif/device_service", {"Content-Type": "application/soap+xml"}, b"<s:Envelope/>"),
+]
+
+SSDP_MSEARCH = (b"M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\nMAN: \"ssdp:discover\"\r\nMX: 1\r\n"
+                b"ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n\r\n")
+TR064_BODY = (b'<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+              b'<u:GetInfo xmlns:u="urn:dslforum-org:service:DeviceInfo:1"/></s:Body></s:Envelope>')
+BASIC_ADMIN = {"Authorization": "Basic " + base64.b64encode(b"admin:admin").decode()}
+
+# Mirai-style credential list; root/admin is the one that works on the telnet device
+TELNET_CREDS = [(b"root", b"xc3511"), (b"root", b"vizxv"), (b"admin", b"admin"), (b"root", b"888888"),
+                (b"support", b"support"), (b"root", b"default"), (b"user", b"user"), (b"root", b"admin")]
+# what a bot typically sends first: WILL TERMINAL-TYPE, DO SUPPRESS-GO-AHEAD, WILL NAWS
+TELNET_IAC_HELLO = bytes((255, 251, 24, 255, 253, 3, 255, 251, 31))
+
+
+def pct(vals: list[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    return vals[min(len(vals) - 1, max(0, int(round(q / 100.0 * len(vals) + 0.5)) - 1))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(host: str, port: int, timeout: float = 10.0) -> None:
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"{host}:{port} not reachable")
+
+
+def spawn(script: str, env: dict) -> subprocess.Popen:
+    """Start an emulator as its own process (so the client does not share its GIL)."""
+    return subprocess.Popen([sys.executable, str(ROOT / script)], env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class Stats:
+    def __init__(self):
+        self.lat: list[float] = []
+        self.ok = 0
+        self.errors = 0
+        self.conns = 0
+        self.codes: dict[str, int] = {}
+
+    def report(self, elapsed: float, **extra) -> dict:
+        lat = sorted(self.lat)
+        return {
+            **extra,
+            "seconds": round(elapsed, 2),
+            "requests": self.ok,
+            "errors": self.errors,
+            "error_rate": round(self.errors / (self.ok + self.errors), 4) if self.ok + self.errors else 0.0,
+            "connections": self.conns,
+            "req_per_s": round(self.ok / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(pct(lat, 50) * 1e3, 2),
+            "p99_ms": round(pct(lat, 99) * 1e3, 2),
+            "max_ms": round(lat[-1] * 1e3, 2) if lat else 0.0,
+            "codes": self.codes,
+        }
+
+
+def http_request(method: str, path: str, headers: dict, body: bytes, keepalive: bool) -> bytes:
+    ver = "HTTP/1.1" if keepalive else "HTTP/1.0"
+    head = [f"{method} {path} {ver}", "Host: bench"]
+    head += [f"{k}: {v}" for k, v in headers.items()]
+    if method == "POST":
+        head.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[str, bool]:
+    """Reads one response; returns (status code, connection still usable)."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    code = lines[0].split(" ", 2)[1]
+    length = None
+    close = lines[0].startswith("HTTP/1.0")
+    for ln in lines[1:]:
+        k, _, v = ln.partition(":")
+        k = k.strip().lower()
+        if k == "content-length":
+            length = int(v)
+        elif k == "connection" and v.strip().lower() == "close":
+            close = True
+    if length is None:
+        await reader.read()  # unframed: body runs until the server closes
+        return code, False
+    await reader.readexactly(length)
+    return code, not close
+
+
+async def http_client(host: str, port: int, mix: list, idx: int, end: float, keepalive: bool, st: Stats,
+                      timeout: float, tls: ssl.SSLContext = None, count_connect: bool = False) -> None:
+    """With count_connect the latency of a request on a new connection includes connect (and TLS handshake)."""
+    reqs = [http_request(m, p, h, b, keepalive) for m, p, h, b in mix]
+    i = idx
+    writer = None
+    while time.perf_counter() < end:
+        try:
+            t0 = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=tls), timeout)
+                st.conns += 1
+            if not count_connect:
+                t0 = time.perf_counter()
+            writer.write(reqs[i % len(reqs)])
+            code, reusable = await asyncio.wait_for(read_response(reader), timeout)
+            st.lat.append(time.perf_counter() - t0)
+            st.ok += 1
+            st.codes[code] = st.codes.get(code, 0) + 1
+            i += 1
+            if not reusable:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, IndexError,
+                ValueError, ssl.SSLError):
+            st.errors += 1
+            if writer is not None:
+                writer.close()
+                writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def bench_http(host: str, port: int, clients: int, duration: float, mix: list, keepalive: bool,
+                     timeout: float, tls: ssl.SSLContext = None, count_connect: bool = False) -> tuple[Stats, float]:
+    st = Stats()
+    t0 = time.perf_counter()
+    end = t0 + duration
+    await asyncio.gather(*(http_client(host, port, mix, i, end, keepalive, st, timeout, tls, count_connect)
+                           for i in range(clients)))
+    return st, time.perf_counter() - t0
+
+
+class UdpClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiter = None
+
+    def datagram_received(self, data, addr):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(data)
+
+    def error_received(self, exc):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_exception(exc)
+
+
+async def udp_client(host: str, port: int, make, check, idx: int, end: float, st: Stats, timeout: float) -> None:
+    """Closed loop on one socket: send, wait for the matching reply (check() -> code, None = not ours), repeat."""
+    loop = asyncio.get_running_loop()
+    transport, proto = await loop.create_datagram_endpoint(UdpClient, remote_addr=(host, port))
+    st.conns += 1
+    rng = random.Random(idx)
+    try:
+        while time.perf_counter() < end:
+            pkt, key = make(rng)
+            t0 = time.perf_counter()
+            transport.sendto(pkt)
+            code = None
+            try:
+                while code is None:
+                    proto.waiter = loop.create_future()
+                    left = timeout - (time.perf_counter() - t0)
+                    if left <= 0:
+                        raise asyncio.TimeoutError
+                    code = check(await asyncio.wait_for(proto.waiter, left), key)
+            except (OSError, asyncio.TimeoutError):
+                st.errors += 1
+                continue
+            st.lat.append(time.perf_counter() - t0)
+            st.ok += 1
+            st.codes[code] = st.codes.get(code, 0) + 1
+    finally:
+        transport.close()
+
+
+async def bench_udp(host: str, port: int, clients: int, duration: float, make, check,
+                    timeout: float) -> tuple[Stats, float]:
+    st = Stats()
+    t0 = time.perf_counter()
+    end = t0 + duration
+    await asyncio.gather(*(udp_client(host, port, make, check, i, end, st, timeout) for i in range(clients)))
+    return st, time.perf_counter() - t0
+
+
+def raise_nofile() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+
+async def read_until_any(reader: asyncio.StreamReader, marks: tuple[bytes, ...]) -> bytes:
+    buf = b""
+    while not any(m in buf for m in marks):
+        chunk = await reader.read(4096)
+        if not chunk:
+            raise asyncio.IncompleteReadError(buf, None)
+        buf += chunk
+    return buf
+
+
+async def telnet_login(host: str, port: int, user: bytes, pw: bytes, iac: bool) -> str:
+    """One brute-force attempt: banner, user, password, result; returns 'ok' or 'fail'."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if iac:
+            writer.write(TELNET_IAC_HELLO)
+        await read_until_any(reader, (b"login: ",))
+        writer.write(user + b"\r\n")
+        await read_until_any(reader, (b"Password: ",))
+        writer.write(pw + b"\r\n")
+        res = await read_until_any(reader, (b"incorrect", b"$ "))
+        if b"$ " in res:
+            writer.write(b"exit\r\n")
+            return "ok"
+        return "fail"
+    finally:
+        writer.close()
+
+
+async def telnet_worker(host: str, port: int, idx: int, end: float, st: Stats, timeout: float, iac: bool) -> None:
+    rng = random.Random(idx)
+    while time.perf_counter() < end:
+        user, pw = rng.choice(TELNET_CREDS)
+        t0 = time.perf_counter()
+        try:
+            res = await asyncio.wait_for(telnet_login(host, port, user, pw, iac), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            st.errors += 1
+            await asyncio.sleep(0.01)
+            continue
+        st.lat.append(time.perf_counter() - t0)
+        st.ok += 1
+        st.conns += 1
+        st.codes[res] = st.codes.get(res, 0) + 1
+
+
+async def telnet_hold(host: str, port: int, n: int, timeout: float) -> tuple[list, int]:
+    """Opens n sessions that stop at the login prompt (idle bots); returns ((reader, writer) list, failures)."""
+    sem = asyncio.Semaphore(500)
+
+    async def one():
+        async with sem:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            await asyncio.wait_for(read_until_any(reader, (b"login: ",)), timeout)
+            return reader, writer
+
+    res = await asyncio.gather(*(one() for _ in range(n)), return_exceptions=True)
+    conns = [c for c in res if not isinstance(c, BaseException)]
+    return conns, n - len(conns)
+
+
+async def bench_telnet(host: str, port: int, clients: int, hold: int, duration: float, timeout: float,
+                       iac: bool) -> tuple[Stats, float, int, int]:
+    """Returns (stats, elapsed, idle sessions opened, idle sessions still open after the run)."""
+    held, hold_failed = await telnet_hold(host, port, hold, timeout) if hold else ([], 0)
+    st = Stats()
+    t0 = time.perf_counter()
+    end = t0 + duration
+    await asyncio.gather(*(telnet_worker(host, port, i, end, st, timeout, iac) for i in range(clients)))
+    elapsed = time.perf_counter() - t0
+    # idle sessions the server still keeps open after the load phase
+    alive = sum(1 for r, _ in held if not r.at_eof())
+    for _, w in held:
+        w.close()
+    return st, elapsed, len(held), alive
+
+
+def run_telnet(args: argparse.Namespace) -> dict:
+    raise_nofile()
+    proc = None
+    host, port = args.host, args.port
+    if args.spawn:
+        host, port = "127.0.0.1", free_port()
+        proc = spawn("Telnet_Device/telnet_server.py", {
+            "TELNET_PORTS": str(port),
+            "TELNET_IDLE": str(max(10.0, args.duration * 3)),
+            "TELNET_MAX_SESSIONS": str(max(10000, args.hold + 2 * args.clients)),
+        })
+    try:
+        wait_port(host, port)
+        st, elapsed, held, alive = asyncio.run(bench_telnet(host, port, args.clients, args.hold, args.duration,
+                                                            args.timeout, not args.no_iac))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    return st.report(elapsed, target="telnet", clients=args.clients, idle_sessions=held,
+                     idle_sessions_alive=alive, logins_per_s=round(st.ok / elapsed, 1) if elapsed else 0.0)
+
+
+def run_camera(args: argparse.Namespace) -> dict:
+    proc = None
+    host, port = args.host, args.port
+    if args.spawn:
+        host, port = "127.0.0.1", free_port()
+        proc = spawn("IP_Camera/camera_server.py", {"CAMERA_PORT": str(port), "CAMERA_LEGACY": "1" if args.legacy else "0"})
+    try:
+        wait_port(host, port)
+        st, elapsed = asyncio.run(bench_http(host, port, args.clients, args.duration, CAMERA_MIX,
+                                             not args.no_keepalive, args.timeout))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    return st.report(elapsed, target="camera", server="legacy" if args.legacy else "threaded",
+                     clients=args.clients, keepalive=not args.no_keepalive)
+
+
+def coap_get(rng: random.Random) -> tuple[bytes, int]:
+    mid = rng.getrandbits(16)
+    # CON GET /sensor/temp (Uri-Path options "sensor", "temp")
+    return bytes((0x40, 0x01, mid >> 8, mid & 0xFF, 0xB6)) + b"sensor" + bytes((0x04,)) + b"temp", mid
+
+
+def coap_put_root(rng: random.Random) -> tuple[bytes, int]:
+    mid = rng.getrandbits(16)
+    # CON PUT / with a small payload; the emulator answers 2.04 Changed "OK"
+    return bytes((0x40, 0x03, mid >> 8, mid & 0xFF, 0xFF)) + b"on", mid
+
+
+def coap_check(data: bytes, mid: int):
+    if len(data) < 4 or (data[2] << 8 | data[3]) != mid:
+        return None
+    return f"{data[1] >> 5}.{data[1] & 31:02d}"
+
+
+def ssdp_check(data: bytes, _key):
+    return data.split(b" ", 2)[1].decode("latin-1", "replace") if data.startswith(b"HTTP/") else None
+
+
+# (emulator, case, endpoint in the ba_emuhost ready file, kind, parameters); one emulator process per emulator
+SUITE = [
+    ("camera", "http-noauth", "http", "http", {"mix": [("GET", "/admin", {}, b"")], "keepalive": True}),
+    ("camera", "http-auth", "http", "http", {"mix": [("GET", "/admin", BASIC_ADMIN, b"")], "keepalive": True}),
+    ("router", "http", "http", "http", {"mix": [("GET", "/device.xml", {}, b"")], "keepalive": False}),
+    ("router", "https", "https", "http", {"mix": [("GET", "/device.xml", {}, b"")], "keepalive": False,
+                                          "tls": True}),
+    ("router", "tr064", "tr064", "http", {"mix": [("POST", "/upnp/control/deviceinfo",
+                                                   {"Content-Type": 'text/xml; charset="utf-8"'}, TR064_BODY)],
+                                          "keepalive": False}),
+    ("router", "ssdp", "ssdp", "udp", {"make": lambda rng: (SSDP_MSEARCH, None), "check": ssdp_check}),
+    ("telnet", "login", "telnet", "telnet", {}),
+    ("coap", "get", "coap", "udp", {"make": coap_get, "check": coap_check}),
+    ("coap", "put-root", "coap", "udp", {"make": coap_put_root, "check": coap_check}),
+]
+
+
+def proc_cpu(pid: int) -> float:
+    """utime + stime of a process in seconds (0 if unavailable)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def spawn_emuhost(emulator: str, addr: str, tmp: str, timeout: float = 20.0) -> tuple[subprocess.Popen, dict]:
+    """One ba_emuhost process per emulator; returns it and its ready-file endpoints."""
+    ready = os.path.join(tmp, f"{emulator}.json")
+    env = {"SSDP_RATE": "1e9", "SSDP_BURST": "1e9", "TELNET_MAX_SESSIONS": "100000", "TELNET_IDLE": "30",
+           "ROUTER_STATS_INTERVAL": "0", "TELNET_STATS_INTERVAL": "0", "COAP_STATS_INTERVAL": "0"}
+    proc = subprocess.Popen([sys.executable, str(ROOT / "ba_emuhost.py"), "--only", emulator, "--addr",
+                             f"{emulator}={addr}", "--ready-file", ready, "--stats-socket", ""],
+                            env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    end = time.time() + timeout
+    while time.time() < end:
+        if os.path.exists(ready):
+            with open(ready) as f:
+                return proc, json.load(f)["services"][emulator]["endpoints"]
+        if proc.poll() is not None:
+            raise RuntimeError(f"ba_emuhost --only {emulator} exited with {proc.returncode}")
+        time.sleep(0.05)
+    proc.terminate()
+    raise TimeoutError(f"ba_emuhost --only {emulator} not ready after {timeout:g}s")
+
+
+def run_case(kind: str, host: str, port: int, clients: int, params: dict, args: argparse.Namespace) -> tuple[Stats, float]:
+    if kind == "http":
+        tls = None
+        if params.get("tls"):
+            tls = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            tls.check_hostname = False
+            tls.verify_mode = ssl.CERT_NONE
+        return asyncio.run(bench_http(host, port, clients, args.duration, params["mix"], params["keepalive"],
+                                      args.timeout, tls, count_connect=True))
+    if kind == "udp":
+        return asyncio.run(bench_udp(host, port, clients, args.duration, params["make"], params["check"],
+                                     args.timeout))
+    st, elapsed, _, _ = asyncio.run(bench_telnet(host, port, clients, 0, args.duration, args.timeout, True))
+    return st, elapsed
+
+
+def run_suite(args: argparse.Namespace) -> dict:
+    raise_nofile()
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    only = {x.strip() for x in args.cases.split(",") if x.strip()} if args.cases else None
+    cases = [c for c in SUITE if only is None or c[0] in only or f"{c[0]}.{c[1]}" in only]
+    existing = None
+    if args.emuhost:
+        with open(args.emuhost) as f:
+            existing = json.load(f)["services"]
+    doc = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "duration_s": args.duration,
+        "levels": levels,
+        "emulators": "existing" if existing else "spawned",
+        "results": {},
+    }
+    tmp = tempfile.mkdtemp(prefix="emu-bench-")
+    try:
+        for n, emulator in enumerate(dict.fromkeys(c[0] for c in cases)):
+            proc = None
+            if existing is not None:
+                endpoints = (existing.get(emulator) or {}).get("endpoints", {})
+            else:
+                proc, endpoints = spawn_emuhost(emulator, f"127.20.0.{n + 2}", tmp)
+            try:
+                for _, case, ep, kind, params in (c for c in cases if c[0] == emulator):
+                    if ep not in endpoints:
+                        print(f"{emulator:>7} {case:<12} skipped: no {ep} endpoint", flush=True)
+                        continue
+                    host, _, port = endpoints[ep].split("://", 1)[1].rpartition(":")
+                    rows = doc["results"].setdefault(emulator, {}).setdefault(case, {})
+                    for clients in levels:
+                        cpu0, srv0 = time.process_time(), proc_cpu(proc.pid) if proc else 0.0
+                        st, elapsed = run_case(kind, host, int(port), clients, params, args)
+                        rep = st.report(elapsed, clients=clients, endpoint=endpoints[ep])
+                        rep["client_cpu_pct"] = round(100 * (time.process_time() - cpu0) / elapsed, 1)
+                        if proc:
+                            rep["server_cpu_pct"] = round(100 * (proc_cpu(proc.pid) - srv0) / elapsed, 1)
+                        rows[str(clients)] = rep
+                        print(f"{emulator:>7} {case:<12} c={clients:<5} {rep['req_per_s']:>9.1f} req/s  "
+                              f"p50={rep['p50_ms']:>8.2f}ms p99={rep['p99_ms']:>8.2f}ms  "
+                              f"err={rep['error_rate'] * 100:5.1f}%  client_cpu={rep['client_cpu_pct']:.0f}%" +
+                              (f" server_cpu={rep['server_cpu_pct']:.0f}%" if proc else ""), flush=True)
+                        time.sleep(0.2)
+            finally:
+                if proc is not None:
+                    proc.terminate()
+                    proc.wait()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return doc
+
+
+def compare(doc: dict, base: dict) -> list[str]:
+    """req/s and p99 change per emulator/case/level against an earlier suite result."""
+    out = []
+    for emulator, cases in doc["results"].items():
+        for case, rows in cases.items():
+            for level, rep in rows.items():
+                old = base.get("results", {}).get(emulator, {}).get(case, {}).get(level)
+                if not old or not old.get("req_per_s"):
+                    continue
+                d_rps = 100.0 * (rep["req_per_s"] - old["req_per_s"]) / old["req_per_s"]
+                d_p99 = rep["p99_ms"] - old["p99_ms"]
+                out.append(f"{emulator:>7} {case:<12} c={level:<5} req/s {old['req_per_s']:>9.1f} -> "
+                           f"{rep['req_per_s']:>9.1f} ({d_rps:+6.1f}%)  p99 {d_p99:+8.2f}ms")
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Load benchmarks for the device emulators.")
+    sub = ap.add_subparsers(dest="target", required=True)
+
+    cam = sub.add_parser("camera", help="HTTP load against IP_Camera/camera_server.py")
+    cam.add_argument("--host", default="10.10.0.4")
+    cam.add_argument("--port", type=int, default=80)
+    cam.add_argument("--spawn", action="store_true", help="Start a local camera process on a free port")
+    cam.add_argument("--legacy", action="store_true", help="With --spawn: old single-threaded HTTP/1.0 server")
+    cam.add_argument("--clients", type=int, default=500, help="Concurrent client connections")
+    cam.add_argument("--duration", type=float, default=10.0)
+    cam.add_argument("--no-keepalive", action="store_true", help="HTTP/1.0, one connection per request")
+    cam.set_defaults(func=run_camera)
+
+    tel = sub.add_parser("telnet", help="Brute-force logins against Telnet_Device/telnet_server.py")
+    tel.add_argument("--host", default="10.10.0.2")
+    tel.add_argument("--port", type=int, default=23)
+    tel.add_argument("--spawn", action="store_true", help="Start a local telnet device process on a free port")
+    tel.add_argument("--clients", type=int, default=200, help="Concurrent brute-force workers")
+    tel.add_argument("--hold", type=int, default=0, help="Idle sessions (parked at the login prompt) held during the run")
+    tel.add_argument("--duration", type=float, default=10.0)
+    tel.add_argument("--no-iac", action="store_true", help="Do not send telnet option negotiation first")
+    tel.set_defaults(func=run_telnet)
+
+    sui = sub.add_parser("suite", help="All emulator protocols at several concurrency levels, JSON per level")
+    sui.add_argument("--levels", default="1,10,100", help="Comma-separated client counts")
+    sui.add_argument("--duration", type=float, default=5.0, help="Seconds per case and level")
+    sui.add_argument("--cases", default=None,
+                     help="Only these emulators/cases, e.g. camera,router.https (default: all)")
+    sui.add_argument("--emuhost", default=None,
+                     help="Ready file of a running ba_emuhost to benchmark instead of spawning one per emulator")
+    sui.add_argument("--baseline", default=None, help="Earlier suite JSON: print req/s and p99 changes")
+    sui.set_defaults(func=run_suite)
+
+    for p in sub.choices.values():
+        p.add_argument("--timeout", type=float, default=5.0, help="Per connect/request timeout (counted as error)")
+        p.add_argument("--json", default=None, help="Also write the result as JSON")
+    args = ap.parse_args()
+
+    if args.target == "suite":
+        doc = args.func(args)
+        if args.baseline:
+            print("\nagainst " + args.baseline)
+            for line in compare(doc, json.loads(Path(args.baseline).read_text(encoding="utf-8"))):
+                print(line)
+        if args.json:
+            Path(args.json).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+        rows = [r for cases in doc["results"].values() for lv in cases.values() for r in lv.values()]
+        return 0 if rows and all(r["requests"] for r in rows) else 1
+
+    res = args.func(args)
+    for k, v in res.items():
+        print(f"{k:>12}: {v}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2), encoding="utf-8")
+    return 0 if res["requests"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
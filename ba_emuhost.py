@@ -0,0 +1,370 @@
+"""
+All emulators in one process, without Docker: camera, router (HTTP/HTTPS/TR-064/SSDP), telnet,
+CoAP and - if mosquitto is installed - the MQTT broker with the debug subscriber.
+
+Every service binds its own loopback address (127.10.0.<last octet of the testbed IP>; all of
+127/8 is local on Linux, other addresses can be added to lo with --alias). Services start
+concurrently; once every socket is bound a READY line is printed and, optionally, a JSON file
+with the endpoints and a ready-made `ba_noise --targets` string is written.
+"""
+import argparse
+import asyncio
+import errno
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for d in ("IP_Camera", "Vulnerable_Router", "Telnet_Device", "MQTT_Broker", "Emulator_Common"):
+    sys.path.insert(1, os.path.join(ROOT, d))
+
+# same last octet as in startup.sh
+DEFAULT_ADDRS = {
+    "camera": "127.10.0.4",
+    "router": "127.10.0.3",
+    "telnet": "127.10.0.2",
+    "coap": "127.10.0.5",
+    "mqtt": "127.10.0.5",
+}
+PORTS = {
+    "camera": {"http": 80},
+    "router": {"http": 80, "https": 443, "tr064": 7547, "ssdp": 1900},
+    "telnet": {"telnet": 23, "telnet-alt": 2323},
+    "coap": {"coap": 5683},
+    "mqtt": {"mqtt": 1883},
+}
+UDP = {"ssdp", "coap"}
+
+
+class Skipped(Exception):
+    """Optional service whose prerequisites are missing (e.g. no mosquitto binary)."""
+
+
+class Service:
+    """One emulator: start() binds everything (raises on failure) and returns the blocking serve loop."""
+
+    def __init__(self, name, addr, ports, start):
+        self.name = name
+        self.addr = addr
+        self.ports = ports
+        self.start = start
+        self.ready = threading.Event()
+        self.error = None
+        self.skipped = None
+        self.note = ""
+        self.t_ready = None
+
+    def endpoints(self):
+        return {k: f"{'udp' if k in UDP else 'tcp'}://{self.addr}:{p}" for k, p in self.ports.items()}
+
+    def run(self, t0):
+        try:
+            serve = self.start(self)
+        except Skipped as e:
+            self.skipped = str(e)
+            self.ready.set()
+            return
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.ready.set()
+            return
+        self.t_ready = time.monotonic() - t0
+        self.ready.set()
+        if serve is not None:
+            try:
+                serve()
+            except Exception as e:
+                print(f"[EMUHOST] {self.name} stopped: {type(e).__name__}: {e}", flush=True)
+
+
+def start_camera(svc, legacy=False):
+    import camera_server
+    httpd = camera_server.make_server(svc.ports["http"], legacy, svc.addr)
+    return httpd.serve_forever
+
+
+def self_signed_cert():
+    """Throwaway cert for the router's HTTPS port unless SSL_KEY/SSL_CRT point to existing files."""
+    key = os.environ.get("SSL_KEY", "/etc/ssl/private/router.key")
+    crt = os.environ.get("SSL_CRT", "/etc/ssl/certs/router.crt")
+    if os.path.exists(key) and os.path.exists(crt):
+        return None
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        return None
+    tmp = tempfile.mkdtemp(prefix="emuhost-tls-")
+    key, crt = os.path.join(tmp, "router.key"), os.path.join(tmp, "router.crt")
+    subprocess.run([openssl, "req", "-x509", "-nodes", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1", "-keyout", key, "-out", crt,
+                    "-days", "365", "-subj", "/CN=vulnerable-router"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["SSL_KEY"], os.environ["SSL_CRT"] = key, crt
+    return tmp
+
+
+def start_router(svc, workers=64):
+    import router_server as rs
+    ctx = None
+    try:
+        ctx = rs.tls_context()
+    except (OSError, ValueError) as e:
+        svc.ports.pop("https", None)
+        svc.note = f"no HTTPS ({e.__class__.__name__}: set SSL_KEY/SSL_CRT)"
+    host = rs.RouterHost(workers, ctx)
+    host.listen_udp(svc.ports["ssdp"], svc.addr)
+    host.listen_tcp(svc.ports["tr064"], rs.TR064Handler, addr=svc.addr)
+    host.listen_tcp(svc.ports["http"], rs.RouterHandler, addr=svc.addr)
+    if ctx is not None:
+        host.listen_tcp(svc.ports["https"], rs.RouterHandler, tls=True, addr=svc.addr)
+    return host.serve_forever
+
+
+class AsyncServices:
+    """telnet and CoAP share one asyncio loop in a background thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="emuhost-asyncio", daemon=True).start()
+
+    def call(self, coro, timeout=10.0):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def start_telnet(self, svc):
+        import telnet_server
+        dev = telnet_server.TelnetDevice()
+        self.call(telnet_server.start(dev, list(svc.ports.values()), svc.addr))
+        return None
+
+    def start_coap(self, svc):
+        import coap_server
+        transport, srv = self.call(coap_server.start(svc.ports["coap"], svc.addr))
+        asyncio.run_coroutine_threadsafe(coap_server.run(transport, srv), self.loop)
+        return None
+
+
+class Mosquitto:
+    """mosquitto as a child process with a generated config; the debug subscriber runs in-process."""
+
+    def __init__(self):
+        self.proc = None
+        self.tmp = None
+
+    def start(self, svc):
+        exe = shutil.which("mosquitto")
+        if exe is None:
+            raise Skipped("mosquitto not installed")
+        self.tmp = tempfile.mkdtemp(prefix="emuhost-mqtt-")
+        conf = os.path.join(self.tmp, "mosquitto.conf")
+        with open(conf, "w") as f:
+            f.write(f"listener {svc.ports['mqtt']} {svc.addr}\nallow_anonymous true\npersistence false\n")
+        self.proc = subprocess.Popen([exe, "-c", conf], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        if not wait_tcp(svc.addr, svc.ports["mqtt"], 5.0, self.proc):
+            raise RuntimeError(f"mosquitto did not come up (exit {self.proc.poll()})")
+        os.environ["MQTT_HOST"] = svc.addr
+        os.environ["MQTT_PORT"] = str(svc.ports["mqtt"])
+        try:
+            import mqtt_debug_subscriber as sub
+        except ImportError as e:
+            svc.note = f"broker only, no debug subscriber ({e})"
+            return None
+        client = sub.make_client("debug-listener")
+        return client.loop_forever
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+        if self.tmp:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def wait_tcp(addr, port, timeout, proc=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        try:
+            socket.create_connection((addr, port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def bindable(addr):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.bind((addr, 0))
+        return True
+    except OSError as e:
+        if e.errno == errno.EADDRNOTAVAIL:
+            return False
+        raise
+    finally:
+        s.close()
+
+
+def add_alias(addr):
+    subprocess.run(["ip", "addr", "add", f"{addr}/32", "dev", "lo"], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def del_alias(addr):
+    subprocess.run(["ip", "addr", "del", f"{addr}/32", "dev", "lo"],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def targets_arg(by_name):
+    parts = []
+    for key, (name, port) in (("camera", ("camera", "http")), ("router", ("router", "http")),
+                              ("mqtt", ("mqtt", "mqtt")), ("coap", ("coap", "coap"))):
+        svc = by_name.get(name)
+        if svc is not None and svc.error is None and not svc.skipped and port in svc.ports:
+            parts.append(f"{key}={svc.addr}:{svc.ports[port]}")
+    return ",".join(parts)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Host all emulators in one process on loopback addresses.")
+    ap.add_argument("--only", default="camera,router,telnet,coap,mqtt",
+                    help="Comma-separated services to start")
+    ap.add_argument("--addr", action="append", default=[], metavar="SERVICE=IP",
+                    help="Bind address for a service (repeatable), e.g. camera=10.10.0.4")
+    ap.add_argument("--port", action="append", default=[], metavar="SERVICE.NAME=PORT",
+                    help="Override one port (repeatable), e.g. router.https=8443")
+    ap.add_argument("--port-offset", type=int, default=None,
+                    help="Added to every default port (default: 0 as root, 10000 otherwise)")
+    ap.add_argument("--alias", action="store_true",
+                    help="Add missing bind addresses to lo (needs root) and remove them on exit")
+    ap.add_argument("--camera-legacy", action="store_true", help="Old single-threaded camera server")
+    ap.add_argument("--router-workers", type=int, default=64)
+    ap.add_argument("--ready-timeout", type=float, default=10.0, help="Max seconds until all services are bound")
+    ap.add_argument("--ready-file", default=None, help="Write endpoints as JSON here once everything is up")
+    ap.add_argument("--stats-socket", default="/tmp/emuhost_stats.sock",
+                    help="Unix socket with the per-endpoint stats of all services ('' = off)")
+    ap.add_argument("--stats-port", type=int, default=0, help="Also serve the stats as HTTP on this port")
+    ap.add_argument("--keep-going", action="store_true", help="Keep running if some services failed to start")
+    args = ap.parse_args()
+
+    t0 = time.monotonic()
+    names = [n.strip() for n in args.only.split(",") if n.strip()]
+    unknown = [n for n in names if n not in PORTS]
+    if unknown:
+        ap.error(f"unknown service(s): {', '.join(unknown)}")
+    offset = args.port_offset if args.port_offset is not None else (0 if os.geteuid() == 0 else 10000)
+    addrs = dict(DEFAULT_ADDRS)
+    for item in args.addr:
+        k, _, v = item.partition("=")
+        addrs[k.strip()] = v.strip()
+    ports = {n: {k: p + offset for k, p in PORTS[n].items()} for n in names}
+    for item in args.port:
+        k, _, v = item.partition("=")
+        n, _, sub = k.strip().partition(".")
+        if n not in ports or sub not in ports[n]:
+            ap.error(f"unknown port {k}")
+        ports[n][sub] = int(v)
+
+    added = []
+    for addr in sorted({addrs[n] for n in names}):
+        if addr in ("", "0.0.0.0") or bindable(addr):
+            continue
+        if not args.alias:
+            ap.error(f"{addr} is not a local address (use --alias or a 127.x.y.z address)")
+        add_alias(addr)
+        added.append(addr)
+
+    tls_tmp = None
+    if "router" in names and "https" in ports["router"]:
+        try:
+            tls_tmp = self_signed_cert()
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"[EMUHOST] could not create a TLS certificate: {e}", flush=True)
+
+    aio = AsyncServices() if {"telnet", "coap"} & set(names) else None
+    broker = Mosquitto()
+    starters = {
+        "camera": lambda svc: start_camera(svc, args.camera_legacy),
+        "router": lambda svc: start_router(svc, args.router_workers),
+        "telnet": lambda svc: aio.start_telnet(svc),
+        "coap": lambda svc: aio.start_coap(svc),
+        "mqtt": broker.start,
+    }
+    services = [Service(n, addrs[n], ports[n], starters[n]) for n in names]
+    for svc in services:
+        threading.Thread(target=svc.run, args=(t0,), name=f"emuhost-{svc.name}", daemon=True).start()
+    import emu_stats
+    emu_stats.serve(args.stats_socket, args.stats_port, "127.0.0.1")
+
+    deadline = time.monotonic() + args.ready_timeout
+    for svc in services:
+        if not svc.ready.wait(max(0.0, deadline - time.monotonic())):
+            svc.error = f"not ready after {args.ready_timeout:g}s"
+    elapsed = time.monotonic() - t0
+
+    by_name = {s.name: s for s in services}
+    failed = [s for s in services if s.error]
+    for svc in services:
+        if svc.error:
+            print(f"[EMUHOST] {svc.name:<7} FAILED  {svc.error}", flush=True)
+        elif svc.skipped:
+            print(f"[EMUHOST] {svc.name:<7} skipped {svc.skipped}", flush=True)
+        else:
+            eps = " ".join(f"{k}={v}" for k, v in svc.endpoints().items())
+            note = f"  ({svc.note})" if svc.note else ""
+            print(f"[EMUHOST] {svc.name:<7} {svc.t_ready * 1000:6.0f}ms  {eps}{note}", flush=True)
+    targets = targets_arg(by_name)
+    print(f"[EMUHOST] ba_noise --targets {targets}", flush=True)
+    if args.stats_socket:
+        print(f"[EMUHOST] endpoint stats: ba_attack_runner_min.py --emu-stats unix:{args.stats_socket}", flush=True)
+
+    def cleanup(*_):
+        broker.stop()
+        if tls_tmp:
+            shutil.rmtree(tls_tmp, ignore_errors=True)
+        for addr in added:
+            del_alias(addr)
+
+    if failed and not args.keep_going:
+        print(f"[EMUHOST] {len(failed)} service(s) failed, exiting (use --keep-going to ignore)", flush=True)
+        cleanup()
+        return 1
+
+    if args.ready_file:
+        info = {
+            "ready_s": round(elapsed, 3),
+            "targets": targets,
+            "stats_socket": args.stats_socket or None,
+            "services": {s.name: {"ok": s.error is None and not s.skipped, "error": s.error,
+                                  "skipped": s.skipped, "note": s.note,
+                                  "endpoints": s.endpoints() if s.error is None and not s.skipped else {}}
+                         for s in services},
+        }
+        tmp = args.ready_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(info, f, indent=2)
+        os.replace(tmp, args.ready_file)
+    print(f"READY {elapsed:.3f}s", flush=True)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    cleanup()
+    if args.ready_file:
+        try:
+            os.remove(args.ready_file)
+        except OSError:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
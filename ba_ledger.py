@@ -0,0 +1,496 @@
+"""
+Ground-truth flow ledger and alert scorer.
+
+Generators (ba_noise, ba_attack_runner_min) append every flow they create to a compact binary
+ledger: time window, IPv4 5-tuple (0 = wildcard), generator and a label (attack id or "noise")
+with the expected SIDs. `score` streams eve.json alerts and joins them to the ledger(s) with a
+sorted merge over a sliding window, so memory is bounded by the flows active within
+skew + grace seconds, not by the size of the run.
+
+File format (little endian):
+    header  b"BALEDGER" version(u8) 7 reserved bytes
+    'L'     label_id u32, n_sids u16, name_len u16, n_sids * u32, name (utf-8)
+    'F'     t0 f64, dur f32, src u32, dst u32, sport u16, dport u16, proto u8, generator u8, label_id u32
+Label records precede the first flow that uses them; ids are only valid from that point on,
+so several writer sessions can append to the same file.
+
+    python ba_ledger.py score --eve /var/log/suricata/eve.json noise.ledger attacks.ledger
+    python ba_ledger.py dump attacks.ledger --limit 20
+"""
+import argparse
+import heapq
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"BALEDGER"
+VERSION = 1
+HEADER = MAGIC + bytes([VERSION]) + bytes(7)
+FLOW = struct.Struct("<cdfIIHHBBI")
+LABEL = struct.Struct("<cIHH")
+
+GENERATORS = {"unknown": 0, "ba_noise": 1, "ba_noise-pcap": 2, "ba_attack_runner": 3, "ba_variants": 4}
+GENERATOR_NAMES = {v: k for k, v in GENERATORS.items()}
+PROTOS = {"TCP": 6, "UDP": 17}
+
+# detection latency histogram, upper bounds in milliseconds
+LAT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+def ip2int(ip: str) -> int:
+    try:
+        return struct.unpack("!I", socket.inet_aton(ip))[0]
+    except OSError:
+        return 0
+
+
+def int2ip(v: int) -> str:
+    return socket.inet_ntoa(struct.pack("!I", v)) if v else "*"
+
+
+def sock_tuple(sock: socket.socket) -> Optional[tuple]:
+    """(src, dst, sport, dport, proto) of a connected TCP or UDP socket (connect UDP sockets so the
+    source address is bound). Taken right after connect: the socket may be closed by the time the
+    flow is recorded."""
+    try:
+        src, sport = sock.getsockname()[:2]
+        dst, dport = sock.getpeername()[:2]
+    except (OSError, AttributeError):
+        return None
+    return (src, dst, sport, dport, 17 if sock.type == socket.SOCK_DGRAM else 6)
+
+
+class LedgerWriter:
+    """Thread-safe, buffered appender; one instance per generator process."""
+
+    def __init__(self, path: str, generator: str, flush_bytes: int = 1 << 18):
+        self.path = path
+        self.gen = GENERATORS.get(generator, 0)
+        self.flush_bytes = flush_bytes
+        self.lock = threading.Lock()
+        self.buf = bytearray()
+        self.labels: Dict[Tuple[str, Tuple[int, ...]], int] = {}
+        self.flows = 0
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.f = open(path, "ab")
+        if new:
+            self.f.write(HEADER)
+
+    def label(self, name: str, sids: Iterable[int] = ()) -> int:
+        key = (name, tuple(sorted(int(s) for s in sids)))
+        with self.lock:
+            lid = self.labels.get(key)
+            if lid is None:
+                lid = self.labels[key] = len(self.labels) + 1
+                raw = name.encode("utf-8")[:65535]
+                self.buf += LABEL.pack(b"L", lid, len(key[1]), len(raw))
+                self.buf += struct.pack(f"<{len(key[1])}I", *key[1]) + raw
+            return lid
+
+    def flow(self, t0: float, t1: float, src: str, dst: str, sport: int, dport: int, proto: int,
+             label: int) -> None:
+        rec = FLOW.pack(b"F", t0, max(0.0, t1 - t0), ip2int(src), ip2int(dst), sport, dport, proto, self.gen, label)
+        with self.lock:
+            if self.f is None:
+                return
+            self.buf += rec
+            self.flows += 1
+            if len(self.buf) >= self.flush_bytes:
+                self._flush()
+
+    def flow_tuple(self, tup: Optional[tuple], t0: float, t1: float, label: int) -> None:
+        if tup is not None:
+            self.flow(t0, t1, *tup, label)
+
+    def _flush(self) -> None:
+        if self.buf:
+            self.f.write(self.buf)
+            self.buf.clear()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.f is not None:
+                self._flush()
+                self.f.close()
+                self.f = None
+
+
+class Flow:
+    __slots__ = ("t0", "t1", "src", "dst", "sport", "dport", "proto", "gen", "name", "sids", "hit", "fp")
+
+    def __init__(self, t0, dur, src, dst, sport, dport, proto, gen, name, sids):
+        self.t0, self.t1 = t0, t0 + dur
+        self.src, self.dst, self.sport, self.dport, self.proto = src, dst, sport, dport, proto
+        self.gen, self.name, self.sids = gen, name, sids
+        self.hit = None   # expected SIDs seen so far
+        self.fp = None    # unexpected SIDs seen so far
+
+    def wildcard(self) -> bool:
+        return not (self.src and self.sport and self.dport and self.proto)
+
+
+def read_ledger(path: str, chunk: int = 1 << 20) -> Iterator[Flow]:
+    labels: Dict[int, Tuple[str, Tuple[int, ...]]] = {}
+    with open(path, "rb") as f:
+        head = f.read(len(HEADER))
+        if head[:8] != MAGIC:
+            raise ValueError(f"{path}: not a ledger file")
+        buf = b""
+        pos = 0
+        while True:
+            data = f.read(chunk)
+            buf = buf[pos:] + data
+            pos = 0
+            n = len(buf)
+            while pos < n:
+                kind = buf[pos:pos + 1]
+                if kind == b"F":
+                    if pos + FLOW.size > n:
+                        break
+                    _, t0, dur, src, dst, sp, dp, proto, gen, lid = FLOW.unpack_from(buf, pos)
+                    pos += FLOW.size
+                    name, sids = labels.get(lid, ("?", ()))
+                    yield Flow(t0, dur, src, dst, sp, dp, proto, gen, name, sids)
+                elif kind == b"L":
+                    if pos + LABEL.size > n:
+                        break
+                    _, lid, nsid, nlen = LABEL.unpack_from(buf, pos)
+                    end = pos + LABEL.size + 4 * nsid + nlen
+                    if end > n:
+                        break
+                    sids = struct.unpack_from(f"<{nsid}I", buf, pos + LABEL.size)
+                    name = buf[pos + LABEL.size + 4 * nsid:end].decode("utf-8", "replace")
+                    labels[lid] = (name, tuple(sids))
+                    pos = end
+                else:
+                    raise ValueError(f"{path}: corrupt record at offset {f.tell() - len(buf) + pos}")
+            if not data:
+                return
+
+
+def reorder(items: Iterable, key, horizon: float) -> Iterator:
+    """Sort a stream that is only out of order by up to `horizon` seconds."""
+    heap: list = []
+    seq = 0
+    newest = float("-inf")
+    for it in items:
+        t = key(it)
+        newest = max(newest, t)
+        heapq.heappush(heap, (t, seq, it))
+        seq += 1
+        while heap and heap[0][0] < newest - horizon:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+_ts_cache: Dict[str, float] = {}
+
+
+def eve_time(ts: str) -> Optional[float]:
+    """Fast path for Suricata timestamps (2024-01-01T12:00:00.123456+0100): cache per second."""
+    base_key = ts[:19] + ts[-5:]
+    base = _ts_cache.get(base_key)
+    if base is None:
+        try:
+            base = datetime.strptime(base_key, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+        except ValueError:
+            return None
+        if len(_ts_cache) > 100000:
+            _ts_cache.clear()
+        _ts_cache[base_key] = base
+    frac = ts[19:-5]
+    return base + (float(frac) if frac.startswith(".") else 0.0)
+
+
+def read_alerts(path: str, offset: int = 0) -> Iterator[Tuple[float, int, int, int, int, int, int]]:
+    """(time, sid, src, sport, dst, dport, proto) for every IPv4 alert in eve.json from byte offset on
+    (ignored if the file is shorter, i.e. it was rotated)."""
+    with open(path, "rb") as f:
+        if 0 < offset <= os.fstat(f.fileno()).st_size:
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # offset points into a line: skip the rest of it
+        for line in f:
+            if b'"alert"' not in line:
+                continue
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue
+            if ev.get("event_type") != "alert":
+                continue
+            t = eve_time(ev.get("timestamp", ""))
+            sid = (ev.get("alert") or {}).get("signature_id")
+            if t is None or sid is None:
+                continue
+            src, dst = ip2int(ev.get("src_ip", "")), ip2int(ev.get("dest_ip", ""))
+            if not src or not dst:
+                continue
+            yield (t, int(sid), src, int(ev.get("src_port") or 0), dst, int(ev.get("dest_port") or 0),
+                   PROTOS.get(str(ev.get("proto", "")).upper(), 0))
+
+
+class SidStats:
+    __slots__ = ("expected", "tp", "miss", "tp_alerts", "fp_alerts", "fp_flows", "unattributed", "lat")
+
+    def __init__(self):
+        self.expected = self.tp = self.miss = 0
+        self.tp_alerts = self.fp_alerts = self.fp_flows = self.unattributed = 0
+        self.lat = [0] * (len(LAT_BUCKETS_MS) + 1)
+
+    def add_latency(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        for i, b in enumerate(LAT_BUCKETS_MS):
+            if ms <= b:
+                self.lat[i] += 1
+                return
+        self.lat[-1] += 1
+
+    def quantile(self, q: float) -> Optional[int]:
+        n = sum(self.lat)
+        if not n:
+            return None
+        acc = 0
+        for i, c in enumerate(self.lat):
+            acc += c
+            if acc >= q * n:
+                return LAT_BUCKETS_MS[i] if i < len(LAT_BUCKETS_MS) else -1
+        return -1
+
+
+class Scorer:
+    """
+    Sliding-window join of time-sorted alerts against time-sorted ledger flows.
+    A flow is active from t0 - skew to t1 + grace; exact 5-tuple flows are indexed by their
+    (direction-independent) tuple, wildcard flows (attack runner: only target IP/port known)
+    by their target IP.
+    """
+
+    def __init__(self, flows: Iterator[Flow], skew: float = 1.0, grace: float = 10.0, all_labels: bool = False):
+        self.flows = flows
+        self.pending = next(self.flows, None)
+        self.skew = skew
+        self.grace = grace
+        self.exact: Dict[tuple, List[Flow]] = {}
+        self.wild: Dict[int, List[Flow]] = {}
+        self.expiry: list = []
+        self.seq = 0
+        self.sids: Dict[int, SidStats] = {}
+        # name -> [entries, fully detected, partially detected, {sid: entries hit}, {unexpected sid: entries}];
+        # only labels that expect SIDs unless all_labels (e.g. negative controls of ba_variants)
+        self.labels: Dict[str, list] = {}
+        self.all_labels = all_labels
+        self.n_flows = self.n_alerts = 0
+        self.peak_active = 0
+
+    def sid(self, sid: int) -> SidStats:
+        st = self.sids.get(sid)
+        if st is None:
+            st = self.sids[sid] = SidStats()
+        return st
+
+    @staticmethod
+    def key(proto, a, ap, b, bp):
+        return (proto,) + ((a, ap, b, bp) if (a, ap) <= (b, bp) else (b, bp, a, ap))
+
+    def _admit(self, fl: Flow) -> None:
+        self.n_flows += 1
+        for s in fl.sids:
+            self.sid(s).expected += 1
+        if fl.wildcard():
+            self.wild.setdefault(fl.dst, []).append(fl)
+        else:
+            self.exact.setdefault(self.key(fl.proto, fl.src, fl.sport, fl.dst, fl.dport), []).append(fl)
+        heapq.heappush(self.expiry, (fl.t1 + self.grace, self.seq, fl))
+        self.seq += 1
+        self.peak_active = max(self.peak_active, len(self.expiry))
+
+    def _retire(self, fl: Flow) -> None:
+        if fl.wildcard():
+            lst = self.wild.get(fl.dst)
+            k = fl.dst
+            idx = self.wild
+        else:
+            k = self.key(fl.proto, fl.src, fl.sport, fl.dst, fl.dport)
+            lst = self.exact.get(k)
+            idx = self.exact
+        if lst is not None:
+            try:
+                lst.remove(fl)
+            except ValueError:
+                pass
+            if not lst:
+                del idx[k]
+        hit = fl.hit or set()
+        for s in fl.sids:
+            if s not in hit:
+                self.sid(s).miss += 1
+        if fl.sids or self.all_labels:
+            lab = self.labels.setdefault(fl.name, [0, 0, 0, {}, {}])
+            lab[0] += 1
+            for s in hit:
+                lab[3][s] = lab[3].get(s, 0) + 1
+            for s in fl.fp or ():
+                lab[4][s] = lab[4].get(s, 0) + 1
+            if not fl.sids:
+                return
+            if hit >= set(fl.sids):
+                lab[1] += 1
+            elif hit:
+                lab[2] += 1
+
+    def _evict(self, now: float) -> None:
+        while self.expiry and self.expiry[0][0] < now:
+            self._retire(heapq.heappop(self.expiry)[2])
+
+    def advance(self, t: float) -> None:
+        while self.pending is not None and self.pending.t0 <= t + self.skew:
+            self._evict(self.pending.t0 - self.skew)
+            self._admit(self.pending)
+            self.pending = next(self.flows, None)
+        self._evict(t)
+
+    def _candidates(self, t, sid, src, sport, dst, dport, proto) -> List[Flow]:
+        out = [fl for fl in self.exact.get(self.key(proto, src, sport, dst, dport), ())
+               if fl.t0 - self.skew <= t <= fl.t1 + self.grace]
+        if out:
+            return out
+        for ip, other, port, oport in ((dst, src, dport, sport), (src, dst, sport, dport)):
+            for fl in self.wild.get(ip, ()):
+                if not (fl.t0 - self.skew <= t <= fl.t1 + self.grace):
+                    continue
+                if fl.src and fl.src != other:
+                    continue
+                if fl.dport and fl.dport != port:
+                    continue
+                if fl.proto and proto and fl.proto != proto:
+                    continue
+                out.append(fl)
+        return out
+
+    def alert(self, t, sid, src, sport, dst, dport, proto) -> None:
+        self.n_alerts += 1
+        self.advance(t)
+        st = self.sid(sid)
+        cands = self._candidates(t, sid, src, sport, dst, dport, proto)
+        if not cands:
+            st.unattributed += 1
+            return
+        # prefer a flow that expects this SID, then the most recent one
+        fl = max(cands, key=lambda f: (sid in f.sids, f.t0))
+        if sid in fl.sids:
+            st.tp_alerts += 1
+            if fl.hit is None:
+                fl.hit = set()
+            if sid not in fl.hit:
+                fl.hit.add(sid)
+                st.tp += 1
+                st.add_latency(max(0.0, t - fl.t0))
+        else:
+            st.fp_alerts += 1
+            if fl.fp is None:
+                fl.fp = set()
+            if sid not in fl.fp:
+                fl.fp.add(sid)
+                st.fp_flows += 1
+
+    def finish(self) -> None:
+        self.advance(float("inf"))
+
+    def report(self) -> dict:
+        sids = {}
+        for sid, st in sorted(self.sids.items()):
+            sids[str(sid)] = {
+                "expected": st.expected, "tp": st.tp, "miss": st.miss,
+                "recall": round(st.tp / st.expected, 4) if st.expected else None,
+                "tp_alerts": st.tp_alerts, "fp_alerts": st.fp_alerts, "fp_flows": st.fp_flows,
+                "unattributed": st.unattributed,
+                "latency_ms": {"p50": st.quantile(0.5), "p90": st.quantile(0.9), "p99": st.quantile(0.99),
+                               "buckets": st.lat},
+            }
+        return {
+            "flows": self.n_flows, "alerts": self.n_alerts, "peak_active_flows": self.peak_active,
+            "latency_buckets_ms": list(LAT_BUCKETS_MS),
+            "sids": sids,
+            "labels": {k: {"entries": v[0], "detected": v[1], "partial": v[2],
+                           "sids_hit": {str(s): n for s, n in sorted(v[3].items())},
+                           "sids_unexpected": {str(s): n for s, n in sorted(v[4].items())}}
+                       for k, v in sorted(self.labels.items())},
+        }
+
+
+def format_report(rep: dict) -> str:
+    lines = [f"flows={rep['flows']} alerts={rep['alerts']} peak_active={rep['peak_active_flows']}", "",
+             f"{'sid':>9} {'expected':>8} {'tp':>7} {'miss':>6} {'recall':>7} {'fp_alerts':>9} {'fp_flows':>8} "
+             f"{'unattr':>7} {'lat_p50':>8} {'lat_p99':>8}"]
+
+    def ms(v):
+        return "-" if v is None else (">60s" if v < 0 else f"{v}ms")
+    for sid, st in rep["sids"].items():
+        rec = "-" if st["recall"] is None else f"{st['recall'] * 100:.1f}%"
+        lines.append(f"{sid:>9} {st['expected']:>8} {st['tp']:>7} {st['miss']:>6} {rec:>7} {st['fp_alerts']:>9} "
+                     f"{st['fp_flows']:>8} {st['unattributed']:>7} {ms(st['latency_ms']['p50']):>8} "
+                     f"{ms(st['latency_ms']['p99']):>8}")
+    if rep["labels"]:
+        lines += ["", f"{'label':<24} {'entries':>8} {'detected':>9} {'partial':>8}"]
+        for name, st in rep["labels"].items():
+            lines.append(f"{name[:24]:<24} {st['entries']:>8} {st['detected']:>9} {st['partial']:>8}")
+    return "\n".join(lines)
+
+
+def cmd_score(args) -> int:
+    flows = heapq.merge(*(reorder(read_ledger(p), lambda f: f.t0, args.reorder) for p in args.ledger),
+                        key=lambda f: f.t0)
+    sc = Scorer(flows, args.skew, args.grace)
+    for a in reorder(read_alerts(args.eve), lambda a: a[0], args.reorder):
+        sc.alert(*a)
+    sc.finish()
+    rep = sc.report()
+    print(format_report(rep))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rep, f, indent=2)
+    return 0
+
+
+def cmd_dump(args) -> int:
+    for i, fl in enumerate(read_ledger(args.ledger)):
+        if args.limit and i >= args.limit:
+            break
+        proto = {6: "tcp", 17: "udp"}.get(fl.proto, "*")
+        print(f"{datetime.fromtimestamp(fl.t0).isoformat(timespec='milliseconds')} {fl.t1 - fl.t0:8.3f}s "
+              f"{proto} {int2ip(fl.src)}:{fl.sport or '*'} -> {int2ip(fl.dst)}:{fl.dport or '*'} "
+              f"{GENERATOR_NAMES.get(fl.gen, fl.gen)} {fl.name} {list(fl.sids) or ''}")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Flow ledger tools: score alerts against ground truth, dump ledgers.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("score", help="Join eve.json alerts to ledger flows: per-SID TP/FP/misses/latency")
+    sp.add_argument("ledger", nargs="+", help="Ledger file(s) from ba_noise / ba_attack_runner_min")
+    sp.add_argument("--eve", default="/var/log/suricata/eve.json")
+    sp.add_argument("--skew", type=float, default=1.0, help="Seconds an alert may precede the flow start (clock skew)")
+    sp.add_argument("--grace", type=float, default=10.0, help="Seconds after the flow end an alert still belongs to it")
+    sp.add_argument("--reorder", type=float, default=30.0, help="Max out-of-order distance in both inputs (s)")
+    sp.add_argument("--json", default=None, help="Write the report as JSON")
+    sp.set_defaults(fn=cmd_score)
+    dp = sub.add_parser("dump", help="Print ledger entries")
+    dp.add_argument("ledger")
+    dp.add_argument("--limit", type=int, default=0)
+    dp.set_defaults(fn=cmd_dump)
+    args = ap.parse_args()
+    try:
+        return args.fn(args)
+    except BrokenPipeError:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+Time-sparse sidecar index for eve.json and fast.log: every `step` bytes one (byte offset, timestamp)
+sample, kept next to the log as <log>.idx (or under ~/.cache/ba_logindex if the log dir is read-only).
+The index grows incrementally with the log and is rebuilt when the log was rotated (other inode,
+shorter file or different first bytes). Readers seek straight to a time range instead of scanning:
+
+    python ba_logindex.py build /var/log/suricata/eve.json /var/log/suricata/fast.log
+    python ba_logindex.py query /var/log/suricata/eve.json --from 10:43:56 --to 10:45:10 --grep '"alert"'
+    python ba_logindex.py info /var/log/suricata/eve.json
+
+    idx = LogIndex("/var/log/suricata/fast.log")
+    for ts, line in idx.lines(t0, t1): ...
+
+Samples skip eve flow/netflow records (their timestamp is the flow start, not the write time). Lines
+written more than `slack` seconds out of timestamp order can fall outside the scanned range.
+"""
+import argparse
+import hashlib
+import os
+import re
+import struct
+import sys
+import time
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+MAGIC = b"BALOGIDX"
+VERSION = 1
+# magic, version, kind, step, inode, scanned up to, fingerprint length, sha1 of the first bytes
+HEADER = struct.Struct("<8sHHIQQI20s")
+ENTRY = struct.Struct("<Qd")
+FP_LEN = 4096
+KIND_EVE, KIND_FAST = 1, 2
+DEFAULT_STEP = 256 << 10
+DEFAULT_SLACK = 5.0
+SAMPLE_READ = 64 << 10   # bytes read per sample; a sample needs one complete line in there
+CACHE_DIR = Path.home() / ".cache" / "ba_logindex"
+
+EVE_TS_RE = re.compile(rb'"timestamp"\s*:\s*"([^"]+)"')
+EVE_LAGGING = (b'"event_type":"flow"', b'"event_type":"netflow"')
+FAST_TS_RE = re.compile(rb"^(\d\d)/(\d\d)/(\d{4})-(\d\d):(\d\d):(\d\d)(\.\d+)?")
+
+_sec_cache: dict = {}
+
+
+def _cached(key, fn):
+    v = _sec_cache.get(key)
+    if v is None:
+        if len(_sec_cache) > 100000:
+            _sec_cache.clear()
+        v = _sec_cache[key] = fn()
+    return v
+
+
+def eve_ts(s: bytes) -> Optional[float]:
+    """'2024-05-01T10:43:56.123456+0200' -> epoch (the per-second part is cached)."""
+    try:
+        frac = 0.0
+        tz = s[-5:] if s[-5:-4] in (b"+", b"-") else b""
+        if s[19:20] == b".":
+            frac = float(b"0" + s[19:len(s) - len(tz)])
+        base = _cached((s[:19], tz), lambda: datetime.strptime(
+            (s[:19] + tz).decode(), "%Y-%m-%dT%H:%M:%S%z" if tz else "%Y-%m-%dT%H:%M:%S").timestamp())
+        return base + frac
+    except ValueError:
+        return None
+
+
+def line_time(line: bytes) -> Optional[float]:
+    """Timestamp of an eve.json or fast.log line (fast.log: local time), None if there is none."""
+    if line[:1] == b"{":
+        m = EVE_TS_RE.search(line, 0, 256)
+        return eve_ts(m.group(1)) if m else None
+    m = FAST_TS_RE.match(line)
+    if not m:
+        return None
+    mo, d, y, hh, mm, ss, frac = m.groups()
+    base = _cached((y, mo, d, hh, mm, ss), lambda: time.mktime(
+        (int(y), int(mo), int(d), int(hh), int(mm), int(ss), 0, 0, -1)))
+    return base + (float(b"0" + frac) if frac else 0.0)
+
+
+def parse_when(s: str, ref: Optional[float] = None) -> float:
+    """Epoch seconds, ISO date/time (naive = local time) or HH:MM[:SS] on the day of `ref` (default: today)."""
+    s = s.strip()
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    if re.fullmatch(r"\d{1,2}:\d\d(:\d\d(\.\d+)?)?", s):
+        day = datetime.fromtimestamp(ref if ref is not None else time.time()).date().isoformat()
+        s = f"{day}T{s}"
+    return datetime.fromisoformat(s).timestamp()
+
+
+def sidecar_path(log: str) -> Path:
+    p = Path(log)
+    if os.access(p.parent, os.W_OK):
+        return p.with_name(p.name + ".idx")
+    return CACHE_DIR / (hashlib.sha1(str(p.resolve()).encode()).hexdigest()[:16] + "_" + p.name + ".idx")
+
+
+class LogIndex:
+    """Sparse (offset, timestamp) samples of one log file with incremental updates."""
+
+    def __init__(self, path: str, index_path: Optional[str] = None, step: int = DEFAULT_STEP,
+                 slack: float = DEFAULT_SLACK):
+        self.path = str(path)
+        self.index_path = Path(index_path) if index_path else sidecar_path(self.path)
+        self.step = step
+        self.slack = slack
+        self.kind = 0
+        self.inode = 0
+        self.scanned = 0      # next sample position; everything before it is sampled
+        self.fp_len = 0
+        self.fp = b""
+        self.offsets: List[int] = []
+        self.times: List[float] = []
+        self.rebuilt = False
+        self._load()
+
+    # ---------------- persistence ----------------
+
+    def _load(self) -> None:
+        try:
+            data = self.index_path.read_bytes()
+        except OSError:
+            return
+        if len(data) < HEADER.size:
+            return
+        magic, ver, kind, step, inode, scanned, fp_len, fp = HEADER.unpack_from(data)
+        if magic != MAGIC or ver != VERSION or step != self.step:
+            return
+        self.kind, self.inode, self.scanned, self.fp_len, self.fp = kind, inode, scanned, fp_len, fp
+        n = (len(data) - HEADER.size) // ENTRY.size
+        for off, ts in ENTRY.iter_unpack(data[HEADER.size:HEADER.size + n * ENTRY.size]):
+            self.offsets.append(off)
+            self.times.append(ts)
+
+    def _header(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, self.kind, self.step, self.inode, self.scanned, self.fp_len, self.fp)
+
+    def _save(self, new: int, full: bool) -> None:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        if full or not self.index_path.exists():
+            tmp = self.index_path.with_name(self.index_path.name + f".tmp{os.getpid()}")
+            with open(tmp, "wb") as f:
+                f.write(self._header())
+                f.write(b"".join(ENTRY.pack(o, t) for o, t in zip(self.offsets, self.times)))
+            os.replace(tmp, self.index_path)
+            return
+        with open(self.index_path, "r+b") as f:
+            # entries first, header (scanned) last: a crash in between only loses the new samples
+            f.seek(HEADER.size + (len(self.offsets) - new) * ENTRY.size)
+            f.truncate()
+            f.write(b"".join(ENTRY.pack(o, t) for o, t in zip(self.offsets[-new:], self.times[-new:])))
+            f.flush()
+            f.seek(0)
+            f.write(self._header())
+
+    # ---------------- building ----------------
+
+    def _valid(self, f, st: os.stat_result) -> bool:
+        if not self.fp_len or st.st_ino != self.inode or st.st_size < self.scanned or st.st_size < self.fp_len:
+            return False
+        f.seek(0)
+        return hashlib.sha1(f.read(self.fp_len)).digest() == self.fp
+
+    def _sample(self, f, pos: int, size: int) -> Optional[Tuple[int, Optional[float]]]:
+        """First line starting within [pos, pos + step) that has a usable timestamp: (offset, ts);
+        (offset, None) if the block has none, None if the log does not reach past the block yet."""
+        start = pos
+        if pos:
+            f.seek(pos - 1)
+            buf = f.read(min(self.step, SAMPLE_READ) + 1)
+            nl = buf.find(b"\n")
+            if nl < 0:
+                return (pos, None) if pos + self.step < size else None
+            start, buf = pos + nl, buf[nl + 1:]
+        else:
+            f.seek(0)
+            buf = f.read(min(self.step, SAMPLE_READ))
+        off = start
+        while buf:
+            nl = buf.find(b"\n")
+            if nl < 0 or off + nl >= size:
+                break
+            line = buf[:nl]
+            if not (line[:1] == b"{" and any(m in line[:200] for m in EVE_LAGGING)):
+                ts = line_time(line)
+                if ts is not None:
+                    if not self.kind:
+                        self.kind = KIND_EVE if line[:1] == b"{" else KIND_FAST
+                    return off, ts
+            off += nl + 1
+            buf = buf[nl + 1:]
+        return (pos, None) if pos + self.step < size else None
+
+    def update(self) -> int:
+        """Samples the part of the log written since the last update; returns the number of new samples."""
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            full = not self._valid(f, st)
+            if full:
+                self.offsets, self.times = [], []
+                self.kind, self.inode, self.scanned = 0, st.st_ino, 0
+                self.fp_len = min(FP_LEN, st.st_size)
+                f.seek(0)
+                self.fp = hashlib.sha1(f.read(self.fp_len)).digest()
+                self.rebuilt = True
+            new = 0
+            pos = self.scanned
+            while pos < st.st_size:
+                s = self._sample(f, pos, st.st_size)
+                if s is None:
+                    break
+                if s[1] is not None and (not self.offsets or s[0] > self.offsets[-1]):
+                    self.offsets.append(s[0])
+                    self.times.append(s[1])
+                    new += 1
+                pos = max(pos + self.step, s[0] + 1)
+            self.scanned = min(pos, st.st_size)
+        if new or full:
+            self._save(new, full)
+        return new
+
+    # ---------------- queries ----------------
+
+    def span(self, t0: float, t1: float) -> Tuple[int, Optional[int]]:
+        """Byte range [start, end) that holds every line stamped within [t0, t1] (end None = to EOF)."""
+        n = len(self.times)
+        if not n:
+            return 0, None
+        pmax, smin = [], [0.0] * n
+        m = float("-inf")
+        for t in self.times:
+            m = max(m, t)
+            pmax.append(m)
+        m = float("inf")
+        for i in range(n - 1, -1, -1):
+            m = min(m, self.times[i])
+            smin[i] = m
+        i = bisect_right(pmax, t0 - self.slack) - 1
+        start = self.offsets[i] if i >= 0 else 0
+        # smin is non-decreasing; first sample whose suffix minimum is past t1 + slack ends the range
+        j = bisect_right(smin, t1 + self.slack)
+        end = self.offsets[j] if j < n else None
+        return start, end
+
+    def lines(self, t0: float, t1: float, update: bool = True,
+              contains: Optional[bytes] = None) -> Iterator[Tuple[float, bytes]]:
+        """(timestamp, line) for every complete line stamped within [t0, t1] (and containing `contains`)."""
+        if update:
+            self.update()
+        start, end = self.span(t0, t1)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            rest = b""
+            pos = start
+            while end is None or pos < end:
+                chunk = f.read(1 << 20 if end is None else min(1 << 20, end - pos))
+                if not chunk:
+                    break
+                pos += len(chunk)
+                buf = rest + chunk
+                cut = buf.rfind(b"\n") + 1
+                rest = buf[cut:]
+                for line in buf[:cut].splitlines():
+                    if contains is not None and contains not in line:
+                        continue
+                    ts = line_time(line)
+                    if ts is not None and t0 <= ts <= t1:
+                        yield ts, line
+
+    def info(self) -> dict:
+        return {"log": self.path, "index": str(self.index_path), "kind": {KIND_EVE: "eve", KIND_FAST: "fast"}.get(self.kind),
+                "samples": len(self.offsets), "step": self.step, "scanned": self.scanned, "inode": self.inode,
+                "first": self.times[0] if self.times else None, "last": self.times[-1] if self.times else None}
+
+
+def _iso(ts: Optional[float]) -> str:
+    return "-" if ts is None else datetime.fromtimestamp(ts).isoformat(timespec="milliseconds")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Sparse time -> offset index for eve.json / fast.log")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    bp = sub.add_parser("build", help="Create or update the index of one or more logs")
+    bp.add_argument("logs", nargs="+")
+    qp = sub.add_parser("query", help="Print the lines of a time range")
+    qp.add_argument("log")
+    qp.add_argument("--from", dest="t_from", required=True, help="Epoch, ISO time or HH:MM[:SS] (local time)")
+    qp.add_argument("--to", dest="t_to", default=None, help="Default: end of the log")
+    qp.add_argument("--grep", default=None, help="Only lines containing this string")
+    qp.add_argument("--count", action="store_true", help="Only print the number of lines")
+    ip = sub.add_parser("info", help="Show the index state")
+    ip.add_argument("logs", nargs="+")
+    for p in (bp, qp, ip):
+        p.add_argument("--index", default=None, help="Sidecar path (default: <log>.idx)")
+        p.add_argument("--step", type=int, default=DEFAULT_STEP, help="Bytes between samples")
+        p.add_argument("--slack", type=float, default=DEFAULT_SLACK, help="Tolerated timestamp disorder in seconds")
+    args = ap.parse_args()
+
+    if args.cmd in ("build", "info"):
+        for log in args.logs:
+            idx = LogIndex(log, args.index, args.step, args.slack)
+            if args.cmd == "build":
+                t0 = time.perf_counter()
+                new = idx.update()
+                print(f"{log}: {'rebuilt, ' if idx.rebuilt else ''}{new} new samples in "
+                      f"{(time.perf_counter() - t0) * 1000:.1f} ms -> {idx.index_path}")
+            inf = idx.info()
+            print(f"{log}: {inf['samples']} samples ({inf['kind'] or '?'}), {inf['scanned']} bytes, "
+                  f"{_iso(inf['first'])} .. {_iso(inf['last'])}")
+        return 0
+
+    idx = LogIndex(args.log, args.index, args.step, args.slack)
+    t_build = time.perf_counter()
+    idx.update()
+    t_build = time.perf_counter() - t_build
+    ref = idx.times[-1] if idx.times else None
+    t0 = parse_when(args.t_from, ref)
+    t1 = parse_when(args.t_to, ref) if args.t_to else float("inf")
+    needle = args.grep.encode() if args.grep else None
+    n = 0
+    t_q = time.perf_counter()
+    out = sys.stdout.buffer
+    for _ts, line in idx.lines(t0, t1, update=False, contains=needle):
+        n += 1
+        if not args.count:
+            out.write(line + b"\n")
+    t_q = time.perf_counter() - t_q
+    start, end = idx.span(t0, t1)
+    scanned = (end if end is not None else os.path.getsize(args.log)) - start
+    print(f"{n} lines, scanned {scanned} bytes in {t_q * 1000:.1f} ms (index update {t_build * 1000:.1f} ms)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        sys.exit(0)
@@ -1,5 +1,7 @@
-import argparse, glob, http.client, json, random, re, socket, threading, time
+import argparse, glob, heapq, html, http.client, http.server, json, math, queue, random, re, socket, struct, sys, threading, time
+from array import array
 from collections import Counter, deque
+from email.utils import formatdate
 from pathlib import Path
 
 _PL = threading.Lock()
@@ -10,6 +12,65 @@ def _log(act, tgt, ok, msg=""):
         if msg: s += f" {msg}"
         print(s, flush=True)
 
+class EventLog:
+    """Workers push (ts, act, tgt, ok, msg) tuples; a single writer thread formats and writes them in batches.
+    fmt: "text" (classic lines) or "jsonl"; quiet: only errors and the per-interval aggregate line."""
+    def __init__(self, fmt="text", path=None, quiet=False, agg=1.0, maxq=200000):
+        self.fmt=fmt; self.quiet=quiet; self.maxq=maxq
+        self.agg=agg if (quiet or fmt=="jsonl") else 0.0
+        self.out=open(path,"a",encoding="utf-8",buffering=1<<20) if path else sys.stdout
+        self.q=queue.SimpleQueue(); self.dropped=0
+        self._sec=-1; self._sts=""
+        self.th=threading.Thread(target=self._run, name="evlog", daemon=True)
+    def start(self):
+        self.th.start(); return self
+    def emit(self, act, tgt, ok, msg=""):
+        if self.q.qsize()>=self.maxq: self.dropped+=1; return
+        self.q.put((time.time(),act,tgt,ok,msg))
+    def close(self):
+        self.q.put(None); self.th.join(timeout=5.0)
+        if self.out is not sys.stdout: self.out.close()
+    def _stamp(self, t):
+        sec=int(t)
+        if sec!=self._sec: self._sec=sec; self._sts=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+        return self._sts
+    def _line(self, ev):
+        t,act,tgt,ok,msg=ev
+        if self.fmt=="jsonl":
+            return json.dumps({"ts":round(t,6),"act":act,"tgt":tgt,"ok":ok,"msg":msg},separators=(",",":"))+"\n"
+        s=f"{self._stamp(t)} {act:<14} {tgt:<21} {'OK' if ok else 'ERR'}"
+        return s+(f" {msg}\n" if msg else "\n")
+    def _agg_line(self, t, win, span):
+        if self.fmt=="jsonl":
+            return json.dumps({"ts":round(t,6),"agg":{f"{k[0]}:{'ok' if k[1] else 'err'}":v for k,v in sorted(win.items())},
+                               "rate":round(sum(win.values())/span,2),"dropped":self.dropped},separators=(",",":"))+"\n"
+        per=Counter()
+        for (act,ok),v in win.items(): per[act.split(":",1)[0]]+=v
+        parts=" ".join(f"{k}={v}" for k,v in sorted(per.items())) or "-"
+        errs=sum(v for (act,ok),v in win.items() if not ok)
+        return f"{self._stamp(t)} {'AGG':<14} {'-':<21} OK {parts} err={errs} rate={sum(win.values())/span:.1f}/s dropped={self.dropped}\n"
+    def _run(self):
+        win=Counter(); last=time.time(); done=False
+        while not done:
+            buf=[]; n=0
+            try: ev=self.q.get(timeout=0.1)
+            except queue.Empty: ev=False
+            while ev is not False:
+                if ev is None: done=True; break
+                worker=":" in ev[1]  # "PROTO:worker" events are aggregated, control lines (RATE, ...) always pass
+                if worker: win[(ev[1],ev[3])]+=1
+                if not (self.quiet and worker and ev[3]): buf.append(self._line(ev))
+                n+=1
+                if n>=4096: break
+                try: ev=self.q.get_nowait()
+                except queue.Empty: ev=False
+            now=time.time()
+            if self.agg>0 and (now-last>=self.agg or done) and win:
+                buf.append(self._agg_line(now,win,max(1e-6,now-last))); win.clear(); last=now
+            if buf:
+                try: self.out.write("".join(buf)); self.out.flush()
+                except Exception: pass
+
 _CONTENT = re.compile(r'\b(?:content|uricontent)\s*:\s*"([^"]*)"', re.I)
 _PCRE    = re.compile(r'\bpcre\s*:\s*"([^"]+)"', re.I)
 _RULE    = re.compile(r'^(alert|drop|reject|pass)\s+', re.I)
@@ -123,32 +184,112 @@ def parse_targets(s):
         t[k]=(host,port)
     return t
 
+# ground-truth ledger (--ledger): one record per exchange, label "noise", no expected SIDs
+_LEDGER=None; _LTUP=None; _LNOISE=0
+def _lt(s):
+    """5-tuple of a connected socket, taken before it can be closed (None without a ledger)."""
+    return _LTUP(s) if _LEDGER is not None and s is not None else None
+def _lrec(tup, t0, t1=None):
+    if tup is not None: _LEDGER.flow_tuple(tup,t0,time.time() if t1 is None else t1,_LNOISE)
+
 _HTTP_UA=["smart-noise/1.0","curl/8.0","python-httpclient/1.0","mozilla/5.0"]
 _HTTP_PATH=["/","/status","/health","/index.html","/api/status","/device/status"]
 
-def http_once(rng, avoid, targets):
+class HttpPool:
+    """Persistent HTTP/1.1 connections to one target; each slot behaves like one polling client."""
+    def __init__(self, host, port, size=4, max_req=100):
+        self.host, self.port = host, port
+        self.size=max(0,int(size)); self.max_req=max(1,int(max_req))
+        self.slots=[[None,0,False] for _ in range(self.size)]  # [conn, requests, busy]
+        self.lock=threading.Lock(); self.new=0; self.reused=0; self.stale=0
+    def _fresh(self):
+        with self.lock: self.new+=1
+        return http.client.HTTPConnection(self.host,self.port,timeout=3)
+    def get(self, rng):
+        """Returns (slot_index or -1, conn, reused)."""
+        with self.lock:
+            if self.size:
+                i0=rng.randrange(self.size)
+                for k in range(self.size):
+                    i=(i0+k)%self.size; sl=self.slots[i]
+                    if sl[2]: continue
+                    sl[2]=True
+                    if sl[0] is not None and sl[0].sock is not None:
+                        self.reused+=1; return (i,sl[0],True)
+                    sl[0]=None; sl[1]=0; break
+                else:
+                    i=-1
+            else:
+                i=-1
+        return (i,self._fresh(),False)
+    def put(self, i, c, keep):
+        if i<0:
+            c.close(); return
+        with self.lock:
+            sl=self.slots[i]; sl[1]+=1; sl[2]=False
+            if keep and sl[1]<self.max_req and c.sock is not None:
+                sl[0]=c; return
+            sl[0]=None; sl[1]=0
+        c.close()
+    def close(self):
+        with self.lock:
+            conns=[sl[0] for sl in self.slots if sl[0] is not None]
+            for sl in self.slots: sl[0]=None; sl[1]=0
+        for c in conns:
+            try: c.close()
+            except Exception: pass
+
+_HTTP_STALE=(http.client.RemoteDisconnected,http.client.BadStatusLine,ConnectionResetError,BrokenPipeError,ConnectionAbortedError)
+
+def _http_req(rng, avoid, targets, keepalive):
+    """Picks target, method, path and UA; returns (key, host, port, meth, path, ua, blocked_reason_or_None)."""
     key="router" if rng.random()<0.55 else "camera"
     host,port=targets[key]
+    conn_hdr="" if keepalive else "Connection: close\r\n"
     meth="HEAD" if rng.random()<0.08 else "GET"
     path=("/"+"".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4,10)))) if rng.random()<0.12 else rng.choice(_HTTP_PATH)
     ua=rng.choice(_HTTP_UA)
-    preview=f"{meth} {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {ua}\r\nConnection: close\r\n\r\n"
+    preview=f"{meth} {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {ua}\r\n{conn_hdr}\r\n"
     bad=avoid.bad(preview)
     if bad:
         meth,path,ua=meth,"/","smart-noise/1.0"
-        preview=f"{meth} {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {ua}\r\nConnection: close\r\n\r\n"
-        if avoid.bad(preview): return ("HTTP",f"{host}:{port}",False,f"blocked({bad})")
+        preview=f"{meth} {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {ua}\r\n{conn_hdr}\r\n"
+        if avoid.bad(preview): return (key,host,port,meth,path,ua,bad)
+    return (key,host,port,meth,path,ua,None)
+
+def http_once(rng, avoid, targets, pools):
+    key,host,port,meth,path,ua,bad=_http_req(rng, avoid, targets, any(p.size for p in pools.values()))
+    if bad: return ("HTTP",f"{host}:{port}",False,f"blocked({bad})")
+    pool=pools[key]
+    hdrs={"User-Agent":ua}
+    if not pool.size: hdrs["Connection"]="close"
+    i,c,reused=pool.get(rng)
+    t0=time.time(); tup=None
     try:
-        c=http.client.HTTPConnection(host,port,timeout=3)
-        c.request(meth,path,headers={"User-Agent":ua,"Connection":"close"})
-        if rng.random()<0.04: c.close(); return ("HTTP",f"{host}:{port}",True,f"{key} {meth} {path} drop")
-        r=c.getresponse(); code=r.status
-        try: r.read(128)
-        except Exception: pass
-        c.close()
-        return ("HTTP",f"{host}:{port}",True,f"{key} {meth} {path} {code}")
+        for attempt in (0,1):
+            try:
+                c.request(meth,path,headers=hdrs); tup=_lt(c.sock)
+                if rng.random()<0.04:
+                    pool.put(i,c,False)
+                    return ("HTTP",f"{host}:{port}",True,f"{key} {meth} {path} drop")
+                r=c.getresponse()
+                break
+            except _HTTP_STALE:
+                # idle keep-alive connection closed by the server: retry once on a fresh one, like a real client
+                if not reused or attempt: raise
+                with pool.lock: pool.stale+=1
+                c.close(); c=pool._fresh(); reused=False
+        code=r.status
+        try: body=r.read(65536)
+        except Exception: body=None
+        keep=(body is not None and not r.will_close and r.isclosed())
+        pool.put(i,c,keep)
+        return ("HTTP",f"{host}:{port}",True,f"{key} {meth} {path} {code}{' ka' if reused else ''}")
     except Exception as e:
+        pool.put(i,c,False)
         return ("HTTP",f"{host}:{port}",False,f"{key} {meth} {path} {type(e).__name__}")
+    finally:
+        _lrec(tup,t0)
 
 def _mvar(n):
     out=bytearray()
@@ -162,6 +303,16 @@ def _mstr(s):
     b=s.encode("utf-8","ignore")
     return bytes([(len(b)>>8)&0xff,len(b)&0xff])+b
 
+def _mqtt_connect(cid):
+    vh=b"\x00\x04MQTT\x04"+bytes([0x02])+b"\x00\x3c"
+    pl=_mstr(cid)
+    return b"\x10"+_mvar(len(vh)+len(pl))+vh+pl
+def _mqtt_sub(pid, topic):
+    sub_pl=_mstr(topic)+b"\x00"; sub_vh=bytes([(pid>>8)&0xff,pid&0xff])
+    return b"\x82"+_mvar(len(sub_vh)+len(sub_pl))+sub_vh+sub_pl
+def _mqtt_pub(topic, payload):
+    return b"\x30"+_mvar(len(_mstr(topic))+len(payload))+_mstr(topic)+payload
+
 class RawMQTT:
     def __init__(self, host, port, cid, avoid):
         self.host, self.port, self.cid = host, port, cid
@@ -172,20 +323,17 @@ class RawMQTT:
         if now-self.last_conn<15: return False
         self.last_conn=now
         try:
-            s=socket.create_connection((self.host,self.port),timeout=3); s.settimeout(2.0)
-            vh=b"\x00\x04MQTT\x04"+bytes([0x02])+b"\x00\x3c"
-            pl=_mstr(self.cid)
-            s.sendall(b"\x10"+_mvar(len(vh)+len(pl))+vh+pl)
+            s=socket.create_connection((self.host,self.port),timeout=3); s.settimeout(2.0); tup=_lt(s)
+            s.sendall(_mqtt_connect(self.cid))
             try: s.recv(4)
             except Exception: pass
             topic="home/telemetry/#"
             if not self.avoid.bad(topic):
                 pid=self.pid; self.pid=(self.pid+1)&0xffff or 1
-                sub_pl=_mstr(topic)+b"\x00"; sub_vh=bytes([(pid>>8)&0xff,pid&0xff])
-                s.sendall(b"\x82"+_mvar(len(sub_vh)+len(sub_pl))+sub_vh+sub_pl)
+                s.sendall(_mqtt_sub(pid,topic))
                 try: s.recv(5)
                 except Exception: pass
-            self.sock=s; return True
+            self.sock=s; _lrec(tup,now); return True
         except Exception:
             self.sock=None; return False
     def close(self):
@@ -198,17 +346,17 @@ class RawMQTT:
     def pub(self, topic, payload, rng):
         if self.avoid.bad(topic+" "+payload): return (False,"blocked")
         if not self.connect(): return (False,"connect")
+        t0=time.time(); tup=_lt(self.sock)
         try:
-            pkt=b"\x30"+_mvar(len(_mstr(topic))+len(payload))+_mstr(topic)+payload.encode()
-            self.sock.sendall(pkt)
+            self.sock.sendall(_mqtt_pub(topic,payload.encode())); _lrec(tup,t0)
             if rng.random()<0.03: self.close(); return (True,"drop")
             return (True,f"bytes={len(payload)}")
         except Exception as e:
             self.close(); return (False,type(e).__name__)
 
-def _mpayload(rng, avoid):
+def _mpayload(rng, avoid, now=None):
     temp=round(18+rng.random()*8,1); hum=int(30+rng.random()*40); bat=int(10+rng.random()*90)
-    s=json.dumps({"temp":temp,"hum":hum,"bat":bat,"ts":int(time.time())},separators=(",",":"))
+    s=json.dumps({"temp":temp,"hum":hum,"bat":bat,"ts":int(time.time() if now is None else now)},separators=(",",":"))
     return s if not avoid.bad(s) else json.dumps({"temp":temp,"hum":hum,"bat":bat},separators=(",",":"))
 
 def mqtt_once(rng, avoid, state):
@@ -221,9 +369,9 @@ def mqtt_once(rng, avoid, state):
 _RTSP_UA=["VLC/3.0.20","Lavf/59.27.100","smart-noise-rtsp/1.0"]
 _RTSP_PATH=["/","/live","/stream","/media","/cam"]
 
-def rtsp_once(rng, avoid, targets, st):
+def _rtsp_req(rng, avoid, targets, st, now):
+    """Builds one OPTIONS/DESCRIBE (DESCRIBE kept under 2/min for SID 9000001); returns (meth, path, req, do_desc, blocked)."""
     host,port=targets["rtsp"]
-    now=time.time()
     while st["dt"] and now-st["dt"][0]>60: st["dt"].popleft()
     do_desc=(rng.random()<0.10 and len(st["dt"])<2)
     meth="DESCRIBE" if do_desc else "OPTIONS"
@@ -236,9 +384,17 @@ def rtsp_once(rng, avoid, targets, st):
     if bad:
         url=f"rtsp://{host}:{port}/"
         req=f"OPTIONS {url} RTSP/1.0\r\nCSeq: {st['cseq']}\r\nUser-Agent: smart-noise-rtsp/1.0\r\n\r\n"; st["cseq"]+=1
-        if avoid.bad(req): return ("RTSP",f"{host}:{port}",False,f"blocked({bad})")
+        meth,path,do_desc="OPTIONS","/",False
+        if avoid.bad(req): return (meth,path,req,do_desc,bad)
+    return (meth,path,req,do_desc,None)
+
+def rtsp_once(rng, avoid, targets, st):
+    host,port=targets["rtsp"]
+    with st["lock"]: meth,path,req,do_desc,bad=_rtsp_req(rng, avoid, targets, st, time.time())
+    if bad: return ("RTSP",f"{host}:{port}",False,f"blocked({bad})")
+    t0=time.time(); tup=None
     try:
-        s=socket.create_connection((host,port),timeout=3); s.settimeout(2.0)
+        s=socket.create_connection((host,port),timeout=3); s.settimeout(2.0); tup=_lt(s)
         s.sendall(req.encode("utf-8","ignore"))
         if rng.random()<0.05:
             s.close()
@@ -254,6 +410,122 @@ def rtsp_once(rng, avoid, targets, st):
         return ("RTSP",f"{host}:{port}",True,f"{meth} {path} {code}")
     except Exception as e:
         return ("RTSP",f"{host}:{port}",False,type(e).__name__)
+    finally:
+        _lrec(tup,t0)
+
+def _rtsp_desc_budget(st, now):
+    """Reserves one DESCRIBE from the budget shared with rtsp_once (2/min, below SID 9000001's 5/60s)."""
+    with st["lock"]:
+        while st["dt"] and now-st["dt"][0]>60: st["dt"].popleft()
+        if len(st["dt"])>=2: return False
+        st["dt"].append(now); return True
+
+class _Interleaved:
+    """Walks a TCP-interleaved RTSP stream: skips '$' RTP/RTCP frames in place, returns RTSP messages in between."""
+    def __init__(self):
+        self.skip=0; self.carry=b""; self.frames=0
+    def feed(self, data):
+        out=[]
+        if self.carry: data=memoryview(self.carry+bytes(data)); self.carry=b""
+        i=0; n=len(data)
+        while i<n:
+            if self.skip:
+                k=min(self.skip,n-i); self.skip-=k; i+=k; continue
+            if data[i]==0x24:
+                if n-i<4: self.carry=bytes(data[i:]); break
+                self.skip=(data[i+2]<<8)|data[i+3]; self.frames+=1; i+=4; continue
+            head=bytes(data[i:i+8192])
+            e=head.find(b"\r\n\r\n")
+            if e<0:
+                if len(head)>=8192: i=n; break  # not RTSP, give up on this chunk and resync on the next '$'
+                self.carry=head; break
+            m=re.search(rb"(?im)^content-length:\s*(\d+)",head[:e])
+            tot=e+4+(int(m.group(1)) if m else 0)
+            if n-i<tot: self.carry=bytes(data[i:]); break
+            out.append(bytes(data[i:i+tot])); i+=tot
+        return out
+
+class RtspSession:
+    """One long-lived viewer: DESCRIBE (or cached SDP) -> SETUP (TCP interleaved) -> PLAY, then drains the
+    media into a fixed buffer and sends GET_PARAMETER/OPTIONS keepalives within the session timeout."""
+    def __init__(self, idx, host, port, path, avoid, st, shared, emit, hold=0.0, keepalive=0.0):
+        self.idx,self.host,self.port,self.avoid,self.st=idx,host,port,avoid,st
+        self.url=f"rtsp://{host}:{port}{path}"; self.shared=shared; self.stats=Counter(); self.emit=emit
+        self.hold=hold; self.ka=keepalive; self.cseq=1; self.sess=None; self.ka_meth="GET_PARAMETER"
+        self.ua=_RTSP_UA[idx%len(_RTSP_UA)]; self.tgt=f"{host}:{port}"
+    def _req(self, s, meth, url, extra=()):
+        hdr=[f"CSeq: {self.cseq}",f"User-Agent: {self.ua}"]+([f"Session: {self.sess}"] if self.sess else [])+list(extra)
+        req=f"{meth} {url} RTSP/1.0\r\n"+"\r\n".join(hdr)+"\r\n\r\n"; self.cseq+=1
+        bad=self.avoid.bad(f"{meth} {url} RTSP/1.0\r\nUser-Agent: {self.ua}")  # Transport/Range syntax is fixed RTSP grammar
+        if bad: raise ValueError(f"blocked({bad})")
+        s.sendall(req.encode())
+    def _resp(self, s, il, buf, mv):
+        while True:
+            n=s.recv_into(buf)
+            if not n: raise ConnectionError("closed")
+            self.stats["bytes"]+=n
+            msgs=il.feed(mv[:n])
+            if msgs: return msgs[0]
+    def _setup(self, s, il, buf, mv):
+        sdp=self.shared.get("sdp")
+        if sdp is None:
+            if not _rtsp_desc_budget(self.st,time.time()): return "budget"
+            self._req(s,"DESCRIBE",self.url,["Accept: application/sdp"])
+            r=self._resp(s,il,buf,mv)
+            if not r.startswith(b"RTSP/1.0 200"): return r[9:12].decode("latin-1")
+            head,_,body=r.partition(b"\r\n\r\n")
+            m=re.search(rb"(?im)^content-base:\s*(\S+)",head)
+            base=(m.group(1).decode() if m else self.url).rstrip("/")+"/"
+            ctl=[c.decode() for c in re.findall(rb"(?m)^a=control:(\S+)",body.split(b"m=",1)[-1] if b"m=" in body else b"")]
+            sdp=self.shared["sdp"]=[c if c.startswith("rtsp://") else base+c for c in ctl if c!="*"] or [self.url]
+        for k,url in enumerate(sdp):
+            self._req(s,"SETUP",url,[f"Transport: RTP/AVP/TCP;unicast;interleaved={2*k}-{2*k+1}"])
+            r=self._resp(s,il,buf,mv)
+            if not r.startswith(b"RTSP/1.0 200"):
+                self.shared.pop("sdp",None)  # stale track list: next attempt DESCRIBEs again
+                return r[9:12].decode("latin-1")
+            m=re.search(rb"(?im)^session:\s*([^;\r\n]+)(?:;\s*timeout=(\d+))?",r)
+            if m:
+                self.sess=m.group(1).decode().strip()
+                if not self.ka: self.ka=max(5.0,int(m.group(2) or 60)/2.0)
+        self._req(s,"PLAY",self.url+"/",["Range: npt=0.000-"])
+        r=self._resp(s,il,buf,mv)
+        return "ok" if r.startswith(b"RTSP/1.0 200") else r[9:12].decode("latin-1")
+    def run(self, stop, end):
+        buf=bytearray(1<<16); mv=memoryview(buf); backoff=1.0
+        while not stop.is_set() and time.monotonic()<end:
+            self.cseq=1; self.sess=None; il=_Interleaved(); s=None; tup=None; t0=time.time()
+            try:
+                s=socket.create_connection((self.host,self.port),timeout=3); tup=_lt(s)
+                res=self._setup(s,il,buf,mv)
+                if res!="ok":
+                    self.emit("RTSP:sess",self.tgt,res=="budget",f"#{self.idx} setup {res}")
+                    s.close(); stop.wait(15.0 if res=="budget" else backoff); backoff=min(backoff*2,30.0); continue
+                self.stats["sessions"]+=1; backoff=1.0; s.settimeout(1.0)
+                self.emit("RTSP:sess",self.tgt,True,f"#{self.idx} PLAY session={self.sess} keepalive={self.ka:.0f}s")
+                t_open=time.monotonic(); t_ka=t_open
+                while not stop.is_set() and time.monotonic()<end and (not self.hold or time.monotonic()-t_open<self.hold):
+                    if time.monotonic()-t_ka>=self.ka:
+                        self._req(s,self.ka_meth,self.url+"/"); t_ka=time.monotonic(); self.stats["keepalives"]+=1
+                    try: n=s.recv_into(buf)
+                    except socket.timeout: continue
+                    if not n: raise ConnectionError("closed")
+                    self.stats["bytes"]+=n
+                    for r in il.feed(mv[:n]):
+                        if not r.startswith(b"RTSP/1.0 200") and self.ka_meth=="GET_PARAMETER": self.ka_meth="OPTIONS"
+                self.stats["frames"]+=il.frames; il.frames=0
+                try: self._req(s,"TEARDOWN",self.url+"/")
+                except Exception: pass
+                self.emit("RTSP:sess",self.tgt,True,f"#{self.idx} TEARDOWN")
+            except Exception as e:
+                self.stats["errors"]+=1; self.stats["frames"]+=il.frames
+                self.emit("RTSP:sess",self.tgt,False,f"#{self.idx} {type(e).__name__} {e}".strip())
+                stop.wait(backoff); backoff=min(backoff*2,30.0)
+            finally:
+                if s is not None:
+                    try: s.close()
+                    except Exception: pass
+                _lrec(tup,t0)
 
 _COAP_PATH=["/sensor/temp","/sensor/hum","/status"]
 def _coap_opts(path):
@@ -266,16 +538,20 @@ def _coap_opts(path):
         out.append((delta<<4)|len(val)); out.extend(val)
     return bytes(out)
 
+def _coap_req(rng):
+    path=rng.choice(_COAP_PATH)
+    mid=rng.randint(0,0xffff)
+    return path, bytes([0x40,0x01,(mid>>8)&0xff,mid&0xff]) + _coap_opts(path)  # CON GET
+
 def coap_once(rng, avoid, targets):
     host,port=targets.get("coap",("",0))
     if not host or port<=0: return ("COAP","-",False,"no-target")
-    path=rng.choice(_COAP_PATH)
+    path,pkt=_coap_req(rng)
     if avoid.bad(path): return ("COAP",f"{host}:{port}",False,"blocked(path)")
-    mid=rng.randint(0,0xffff)
-    pkt=bytes([0x40,0x01,(mid>>8)&0xff,mid&0xff]) + _coap_opts(path)  # CON GET
+    t0=time.time(); tup=None
     try:
         s=socket.socket(socket.AF_INET,socket.SOCK_DGRAM); s.settimeout(1.0)
-        s.sendto(pkt,(host,port))
+        s.connect((host,port)); s.send(pkt); tup=_lt(s)
         msg=f"GET {path}"
         try:
             data,_=s.recvfrom(64)
@@ -286,22 +562,422 @@ def coap_once(rng, avoid, targets):
         return ("COAP",f"{host}:{port}",True,msg)
     except Exception as e:
         return ("COAP",f"{host}:{port}",False,type(e).__name__)
+    finally:
+        _lrec(tup,t0)
+
+_PROFILES={
+    "constant":{"arrivals":"constant"},
+    "poisson":{"arrivals":"poisson"},
+    "diurnal":{"arrivals":"poisson","period":600.0,"min":0.2,"max":1.0,"phase":0.0},
+    "burst":{"arrivals":"poisson","on":5.0,"off":25.0,"peak":4.0,"base":0.25},
+}
+
+def load_profile(spec):
+    """Profile name or JSON file -> {"default": cfg, "<proto>": cfg, ...}.
+    File format: {"profile":"diurnal","period":600,...,"protocols":{"mqtt":{"profile":"burst",...}}}"""
+    def norm(d, base=None):
+        d=dict(d or {}); name=str(d.get("profile") or (base or {}).get("profile") or "poisson").lower()
+        if name not in _PROFILES: raise ValueError(f"unknown profile {name!r} (have: {','.join(_PROFILES)})")
+        cfg=dict(_PROFILES[name]); cfg["profile"]=name
+        if base and base.get("profile")==name: cfg.update({k:v for k,v in base.items() if k!="protocols"})
+        cfg.update({k:v for k,v in d.items() if k!="protocols"}); cfg["profile"]=name
+        for k in ("min","max","peak","base"):
+            if k in cfg and not float(cfg[k])>=0: raise ValueError(f"profile {name}: {k} must be >= 0, got {cfg[k]!r}")
+        if name=="diurnal" and not float(cfg["period"])>0: raise ValueError(f"profile diurnal: period must be > 0, got {cfg['period']!r}")
+        if name=="burst" and (float(cfg["on"])<0 or float(cfg["off"])<0 or not float(cfg["on"])+float(cfg["off"])>0):
+            raise ValueError(f"profile burst: on/off must be >= 0 with on+off > 0, got {cfg['on']!r}/{cfg['off']!r}")
+        return cfg
+    spec=spec or "poisson"
+    if spec.lower() in _PROFILES: return {"default":norm({"profile":spec})}
+    raw=json.loads(Path(spec).read_text(encoding="utf-8"))
+    out={"default":norm(raw)}
+    for k,v in (raw.get("protocols") or {}).items(): out[k.lower()]=norm(v,out["default"])
+    return out
 
-def _esleep(rng, lam, end, stop):
-    if lam<=0: time.sleep(0.25); return
-    dt=min(rng.expovariate(lam),2.0)
-    until=min(time.time()+dt,end)
-    while not stop.is_set() and time.time()<until: time.sleep(0.05)
+class Schedule:
+    """Streams event deadlines (seconds relative to start) for a base rate lam (events/s) and a profile."""
+    def __init__(self, lam, cfg, rng):
+        self.lam=max(0.0,float(lam)); self.cfg=cfg; self.rng=rng; self.t=0.0
+        self.kind=cfg["profile"]; self.poisson=(cfg.get("arrivals")=="poisson")
+    def mult(self, t):
+        c=self.cfg
+        if self.kind=="diurnal":
+            lo,hi=float(c["min"]),float(c["max"])
+            x=(t/float(c["period"])+float(c["phase"]))%1.0
+            return lo+(hi-lo)*(0.5-0.5*math.cos(2*math.pi*x))
+        if self.kind=="burst":
+            on,off=float(c["on"]),float(c["off"])
+            return float(c["peak"]) if (t%(on+off))<on else float(c["base"])
+        return 1.0
+    def peak(self):
+        c=self.cfg
+        if self.kind=="diurnal": return self.lam*max(float(c["min"]),float(c["max"]))
+        if self.kind=="burst": return self.lam*max(float(c["peak"]),float(c["base"]))
+        return self.lam
+    def expected(self, a, b):
+        """Requested number of events in [a,b) (midpoint integration of lam*mult)."""
+        if b<=a: return 0.0
+        n=min(100000,max(64,int((b-a)*4)))
+        h=(b-a)/n
+        return sum(self.lam*self.mult(a+(i+0.5)*h) for i in range(n))*h
+    def next(self):
+        for _ in range(1000):
+            l=self.lam*self.mult(self.t)
+            if l>0: break
+            if self.kind!="burst" or self.peak()<=0: self.t+=0.25; return None
+            per=float(self.cfg["on"])+float(self.cfg["off"])  # skip a silent off-phase
+            self.t=(math.floor(self.t/per)+1)*per
+        else:
+            self.t+=0.25; return None  # rate 0 in every phase (e.g. burst with peak=base=0): idle, never divide by 0
+        self.t+=self.rng.expovariate(l) if self.poisson else 1.0/l
+        return self.t
+
+class TokenBucket:
+    """Monotonic-clock token bucket; bounds catch-up bursts after a worker fell behind its deadlines."""
+    def __init__(self, rate, burst=1.0):
+        self.rate=float(rate); self.cap=max(1.0,float(burst)); self.tok=self.cap; self.ts=time.monotonic()
+    def wait(self, n=1.0):
+        """Takes n tokens; returns 0.0 or the seconds until they will be available (nothing taken)."""
+        now=time.monotonic()
+        self.tok=min(self.cap,self.tok+(now-self.ts)*self.rate); self.ts=now
+        if self.tok>=n: self.tok-=n; return 0.0
+        return (n-self.tok)/self.rate if self.rate>0 else 0.25
+
+def _sleep_until(deadline, stop):
+    """Sleeps on the monotonic clock; returns early (<=0.5ms) rather than oversleeping."""
+    while not stop.is_set():
+        d=deadline-time.monotonic()
+        if d<=0.0005: return True
+        time.sleep(min(d-0.0003,0.25) if d>0.002 else 0)
+    return False
 
-def _worker(name, lam, end, stop, rng, fn, counts):
-    while not stop.is_set() and time.time()<end:
-        _esleep(rng, lam, end, stop)
-        if stop.is_set() or time.time()>=end: break
+def _worker(name, sched, t0, end, stop, rng, fn, counts, emit, max_lag=1.0):
+    bucket=TokenBucket(sched.peak()*1.05, max(10.0,sched.peak()))
+    lag=0.0
+    while not stop.is_set() and time.monotonic()<end:
+        rel=sched.next()
+        if rel is None: stop.wait(0.25); continue
+        d=t0+lag+rel
+        if d>=end or not _sleep_until(d, stop): break
+        late=time.monotonic()-d
+        if late>max_lag: lag+=late; counts[f"{name}:late"]+=1  # rebase instead of firing a backlog burst
+        w=bucket.wait()
+        while w>0 and not stop.is_set():
+            time.sleep(min(w,0.25)); w=bucket.wait()
+        if stop.is_set() or time.monotonic()>=end: break
         proto,tgt,ok,msg=fn(rng)
         counts[proto]+=1
-        _log(f"{proto}:{name}", tgt, ok, msg)
+        emit(f"{proto}:{name}", tgt, ok, msg)
+
+# ---------------- bandwidth-targeted bulk traffic ----------------
+
+_BULK_KINDS=("upload","download","mqtt")
+
+class Bulk:
+    """Sustains a target bit rate with large transfers: camera-style HTTP uploads, firmware-sized HTTP downloads
+    and retained MQTT payloads. All data is sliced from one preallocated buffer via memoryview (no per-send copies)."""
+    def __init__(self, mbps, kinds, targets, avoid, rng, dev, buf_mb=8, chunk=65536, fw_path="/firmware.bin"):
+        self.rate=mbps*1e6/8.0; self.kinds=kinds; self.targets=targets; self.avoid=avoid
+        self.chunk=chunk; self.fw_path=fw_path; self.dev=dev
+        self.buf=bytearray(rng.getrandbits(8*buf_mb*(1<<20)).to_bytes(buf_mb*(1<<20),"little")); self.mv=memoryview(self.buf)
+        self.rbuf=bytearray(1<<18)
+        self.bucket=TokenBucket(self.rate,max(chunk*4,self.rate*0.05)); self.lock=threading.Lock()
+        self.tx=0; self.rx=0; self.ops=Counter(); self.errs=Counter()
+    def _take(self, n, stop):
+        while not stop.is_set():
+            with self.lock: w=self.bucket.wait(n)
+            if w<=0: return True
+            time.sleep(min(w,0.1))
+        return False
+    def _send(self, s, off, n, stop):
+        end=off+n
+        while off<end:
+            k=min(self.chunk,end-off)
+            if not self._take(k,stop): return False
+            s.sendall(self.mv[off:off+k]); off+=k
+            with self.lock: self.tx+=k  # shared by all bulk workers
+        return True
+    def _drain(self, s, limit, stop):
+        """Reads (and discards) up to limit bytes of response into a fixed buffer, paced by the bucket."""
+        mv=memoryview(self.rbuf); got=0
+        while got<limit and not stop.is_set():
+            n=s.recv_into(mv[:min(len(self.rbuf),limit-got)])
+            if not n: break
+            got+=n
+            with self.lock: self.rx+=n
+            self._take(n,stop)
+        return got
+    def upload(self, rng, stop):
+        host,port=self.targets["camera"]
+        n=rng.randint(len(self.buf)//8,len(self.buf)//2); off=rng.randrange(0,len(self.buf)-n+1)
+        path=f"/upload/clip{rng.randint(1,9999)}.mp4"
+        head=(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: smart-noise/1.0\r\nContent-Type: video/mp4\r\n"
+              f"Content-Length: {n}\r\nConnection: close\r\n\r\n")
+        if self.avoid.bad(head): return ("blocked",0)
+        t0=time.time()
+        with socket.create_connection((host,port),timeout=5) as s:
+            tup=_lt(s)
+            try:
+                s.sendall(head.encode())
+                if not self._send(s,off,n,stop): return ("stopped",n)
+                s.settimeout(5.0); self._drain(s,1<<16,stop)
+            finally:
+                _lrec(tup,t0)
+        return (f"POST {path}",n)
+    def download(self, rng, stop):
+        host,port=self.targets["router"]
+        head=f"GET {self.fw_path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: smart-noise/1.0\r\nConnection: close\r\n\r\n"
+        if self.avoid.bad(head): return ("blocked",0)
+        t0=time.time()
+        with socket.create_connection((host,port),timeout=5) as s:
+            tup=_lt(s)
+            try:
+                s.sendall(head.encode()); s.settimeout(5.0)
+                return (f"GET {self.fw_path}",self._drain(s,1<<31,stop))
+            finally:
+                _lrec(tup,t0)
+    def mqtt(self, rng, stop, st):
+        host,port=self.targets["mqtt"]
+        s=st.get("s")
+        if s is None:
+            if time.time()-st.get("t",0.0)<15: return ("connect-wait",0)
+            st["t"]=time.time()
+            s=socket.create_connection((host,port),timeout=5)
+            s.sendall(_mqtt_connect(f"sensor-{self.dev}-snap{st['i']}"))
+            s.settimeout(5.0); s.recv(4); st["s"]=s
+        topic=f"home/telemetry/{self.dev}/snapshot{st['i']}"
+        if self.avoid.bad(topic): return ("blocked",0)
+        n=rng.randint(64<<10,min(len(self.buf),1<<20)); off=rng.randrange(0,len(self.buf)-n+1)
+        t=_mstr(topic); t0=time.time(); tup=_lt(s)
+        try:
+            s.sendall(b"\x31"+_mvar(len(t)+n)+t)  # PUBLISH QoS0 retain
+            if not self._send(s,off,n,stop): return ("stopped",n)
+        except Exception:
+            st["s"]=None; s.close(); raise
+        finally:
+            _lrec(tup,t0)
+        return (f"PUB {topic} retain",n)
+    def run(self, i, rng, stop, end, emit):
+        st={"i":i}
+        while not stop.is_set() and time.monotonic()<end:
+            kind=rng.choice(self.kinds)
+            try:
+                what,n=(self.upload(rng,stop) if kind=="upload" else self.download(rng,stop) if kind=="download" else self.mqtt(rng,stop,st))
+                if what=="connect-wait": stop.wait(1.0); continue
+                with self.lock: self.ops[kind]+=1
+                emit(f"BULK:{kind}","-",what!="blocked",f"{what} bytes={n}")
+            except Exception as e:
+                with self.lock: self.errs[kind]+=1
+                emit(f"BULK:{kind}","-",False,type(e).__name__)
+                stop.wait(1.0)
+        if st.get("s") is not None:
+            try: st["s"].sendall(b"\xE0\x00"); st["s"].close()
+            except Exception: pass
+
+# ---------------- offline PCAP synthesis ----------------
+
+_TH_FIN,_TH_SYN,_TH_RST,_TH_PSH,_TH_ACK=0x01,0x02,0x04,0x08,0x10
+_MSS=1460
+
+def _csum(b):
+    """RFC 1071 checksum, summed in native word order (pack the result with "=H")."""
+    if len(b)&1: b+=b"\0"
+    t=sum(array("H",b)); t=(t>>16)+(t&0xffff); t+=t>>16
+    return (~t)&0xffff
+
+class PcapWriter:
+    """Ethernet/IPv4 pcap writer; packets may be pushed slightly out of order and are emitted sorted by timestamp."""
+    def __init__(self, path):
+        self.f=open(path,"wb",buffering=1<<22)
+        self.f.write(struct.pack("<IHHiIII",0xa1b2c3d4,2,4,0,0,65535,1))  # LINKTYPE_ETHERNET
+        self.heap=[]; self.seq=0; self.ipid=0; self.n=0; self.nbytes=0; self.macs={}
+    def _mac(self, ip4):
+        m=self.macs.get(ip4)
+        if m is None: m=self.macs[ip4]=b"\x02\x42"+ip4
+        return m
+    def _ip(self, ts, src, dst, proto, l4):
+        self.ipid=(self.ipid+1)&0xffff
+        h=struct.pack("!BBHHHBBH4s4s",0x45,0,20+len(l4),self.ipid,0x4000,64,proto,0,src,dst)
+        frame=self._mac(dst)+self._mac(src)+b"\x08\x00"+h[:10]+struct.pack("=H",_csum(h))+h[12:]+l4
+        self.seq+=1; heapq.heappush(self.heap,(ts,self.seq,frame))
+    def tcp(self, ts, src, dst, sport, dport, seq, ack, flags, payload=b""):
+        h=struct.pack("!HHIIBBHHH",sport,dport,seq&0xffffffff,ack&0xffffffff,0x50,flags,64240,0,0)
+        c=_csum(src+dst+struct.pack("!BBH",0,6,20+len(payload))+h+payload)
+        self._ip(ts,src,dst,6,h[:16]+struct.pack("=H",c)+h[18:]+payload)
+    def udp(self, ts, src, dst, sport, dport, payload):
+        h=struct.pack("!HHHH",sport,dport,8+len(payload),0)
+        c=_csum(src+dst+struct.pack("!BBH",0,17,8+len(payload))+h+payload) or 0xffff
+        self._ip(ts,src,dst,17,h[:6]+struct.pack("=H",c)+payload)
+    def flush(self, until=None):
+        out=[]; hp=self.heap
+        while hp and (until is None or hp[0][0]<=until):
+            ts,_,fr=heapq.heappop(hp)
+            sec=int(ts); out.append(struct.pack("<IIII",sec,int((ts-sec)*1e6),len(fr),len(fr))); out.append(fr)
+            self.nbytes+=len(fr)
+        self.n+=len(out)//2
+        if out: self.f.write(b"".join(out))
+    def close(self):
+        self.flush(); self.f.close()
+
+class _TcpFlow:
+    """Handshake, data segments with peer ACKs, and FIN teardown for one synthetic TCP connection."""
+    def __init__(self, w, rng, cli, srv, sport, dport, ts, rtt):
+        self.w,self.cli,self.srv,self.sp,self.dp,self.rtt=w,cli,srv,sport,dport,rtt
+        self.cs=rng.getrandbits(32); self.ss=rng.getrandbits(32)
+        w.tcp(ts,cli,srv,sport,dport,self.cs,0,_TH_SYN)
+        w.tcp(ts+rtt/2,srv,cli,dport,sport,self.ss,self.cs+1,_TH_SYN|_TH_ACK)
+        self.cs+=1; self.ss+=1
+        w.tcp(ts+rtt,cli,srv,sport,dport,self.cs,self.ss,_TH_ACK)
+        self.t=ts+rtt; self.t_open=ts
+    def send(self, ts, data, to_server=True):
+        ts=max(ts,self.t); w=self.w
+        a,b,sp,dp=(self.cli,self.srv,self.sp,self.dp) if to_server else (self.srv,self.cli,self.dp,self.sp)
+        for off in range(0,len(data),_MSS):
+            seg=data[off:off+_MSS]
+            if to_server: w.tcp(ts,a,b,sp,dp,self.cs,self.ss,_TH_PSH|_TH_ACK,seg); self.cs+=len(seg)
+            else: w.tcp(ts,a,b,sp,dp,self.ss,self.cs,_TH_PSH|_TH_ACK,seg); self.ss+=len(seg)
+            ts+=0.000012
+        ts+=self.rtt/2
+        if to_server: w.tcp(ts,b,a,dp,sp,self.ss,self.cs,_TH_ACK)
+        else: w.tcp(ts,b,a,dp,sp,self.cs,self.ss,_TH_ACK)
+        self.t=ts; return ts
+    def close(self, ts, by_client=True):
+        ts=max(ts,self.t); w=self.w; rtt=self.rtt
+        if by_client:
+            w.tcp(ts,self.cli,self.srv,self.sp,self.dp,self.cs,self.ss,_TH_FIN|_TH_ACK); self.cs+=1
+            w.tcp(ts+rtt/2,self.srv,self.cli,self.dp,self.sp,self.ss,self.cs,_TH_FIN|_TH_ACK); self.ss+=1
+            w.tcp(ts+rtt,self.cli,self.srv,self.sp,self.dp,self.cs,self.ss,_TH_ACK)
+        else:
+            w.tcp(ts,self.srv,self.cli,self.dp,self.sp,self.ss,self.cs,_TH_FIN|_TH_ACK); self.ss+=1
+            w.tcp(ts+rtt/2,self.cli,self.srv,self.sp,self.dp,self.cs,self.ss,_TH_FIN|_TH_ACK); self.cs+=1
+            w.tcp(ts+rtt,self.srv,self.cli,self.dp,self.sp,self.ss,self.cs,_TH_ACK)
+        self.t=ts+rtt
+        if _LEDGER is not None: _LEDGER.flow(self.t_open,self.t,socket.inet_ntoa(self.cli),socket.inet_ntoa(self.srv),self.sp,self.dp,6,_LNOISE)
+        return self.t
+
+_HTTP_SRV={"router":"VulnRouter/1.0","camera":"InsecureCam/1.0"}
+_RTSP_PUBLIC="DESCRIBE, ANNOUNCE, SETUP, PLAY, RECORD, PAUSE, GET_PARAMETER, TEARDOWN"
+
+def _http_resp(key, meth, path, ts):
+    """Response bytes the (HTTP/1.0 BaseHTTPRequestHandler) emulators would send for noise paths."""
+    head=f"Server: {_HTTP_SRV.get(key,'BaseHTTP/0.6')} Python/3.11\r\nDate: {formatdate(ts,usegmt=True)}\r\n"
+    if meth=="HEAD":
+        msg="Unsupported method ('HEAD')"
+        body=(http.server.DEFAULT_ERROR_MESSAGE % {"code":501,"message":html.escape(msg,quote=False),
+              "explain":"Server does not support this operation"}).encode("utf-8","replace")
+        return (f"HTTP/1.0 501 {msg}\r\n{head}Connection: close\r\nContent-Type: text/html;charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode()
+    if key=="camera" and path in ("/","/admin","/index.html"):
+        return (f"HTTP/1.0 401 Unauthorized\r\n{head}WWW-Authenticate: Basic realm=\"IoT Camera\"\r\n"
+                "Content-Type: text/plain\r\n\r\n").encode()+b"Authentication required"
+    return f"HTTP/1.0 404 Not Found\r\n{head}\r\n".encode()+b"Not Found"
+
+class PcapSynth:
+    """Turns the live generators' payloads into complete synthetic flows (no sockets)."""
+    def __init__(self, w, avoid, targets, src_ip, rng, mqtt_cid, mqtt_topic):
+        self.w,self.avoid,self.targets=w,avoid,targets
+        self.src=socket.inet_aton(src_ip); self.rng=rng
+        self.port=rng.randint(32768,60999); self.rtsp_st={"cseq":1,"dt":deque(),"lock":threading.Lock()}
+        self.mqtt=None; self.mqtt_last=-1e18; self.mqtt_cid=mqtt_cid; self.mqtt_topic=mqtt_topic; self.mqtt_pid=1
+    def _sport(self):
+        self.port=self.port+1 if self.port<60999 else 32768
+        return self.port
+    def _rtt(self): return 0.0002+self.rng.random()*0.0006
+    def _tcp(self, host, port, ts):
+        return _TcpFlow(self.w,self.rng,self.src,socket.inet_aton(host),self._sport(),port,ts,self._rtt())
+    def http(self, rng, ts):
+        key,host,port,meth,path,ua,bad=_http_req(rng,self.avoid,self.targets,False)
+        if bad: return ("HTTP",f"{host}:{port}",False,f"blocked({bad})")
+        hh=host if port==80 else f"{host}:{port}"
+        req=f"{meth} {path} HTTP/1.1\r\nHost: {hh}\r\nAccept-Encoding: identity\r\nUser-Agent: {ua}\r\nConnection: close\r\n\r\n"
+        f=self._tcp(host,port,ts); t=f.send(ts+f.rtt,req.encode())
+        if rng.random()<0.04:
+            f.close(t); return ("HTTP",f"{host}:{port}",True,f"{key} {meth} {path} drop")
+        resp=_http_resp(key,meth,path,ts)
+        t=f.send(t+0.0005+rng.random()*0.002,resp,to_server=False); f.close(t,by_client=False)
+        return ("HTTP",f"{host}:{port}",True,f"{key} {meth} {path} {resp[9:12].decode()}")
+    def mqtt_ev(self, rng, ts):
+        host,port=self.targets["mqtt"]; tgt=f"{host}:{port}"
+        if rng.random()<0.02:
+            if self.mqtt: self.mqtt.send(ts,b"\xE0\x00"); self.mqtt.close(ts+0.0001); self.mqtt=None
+            return ("MQTT",tgt,True,"disconnect")
+        payload=_mpayload(rng,self.avoid,ts)
+        if self.avoid.bad(self.mqtt_topic+" "+payload): return ("MQTT",tgt,False,f"PUB {self.mqtt_topic} blocked")
+        if self.mqtt is None:
+            if ts-self.mqtt_last<15: return ("MQTT",tgt,False,f"PUB {self.mqtt_topic} connect")
+            self.mqtt_last=ts; f=self.mqtt=self._tcp(host,port,ts)
+            t=f.send(ts+f.rtt,_mqtt_connect(self.mqtt_cid)); t=f.send(t+0.0003,b"\x20\x02\x00\x00",to_server=False)
+            if not self.avoid.bad("home/telemetry/#"):
+                pid=self.mqtt_pid; self.mqtt_pid=(pid+1)&0xffff or 1
+                t=f.send(t+0.0001,_mqtt_sub(pid,"home/telemetry/#"))
+                f.send(t+0.0003,b"\x90\x03"+bytes([(pid>>8)&0xff,pid&0xff])+b"\x00",to_server=False)
+        f=self.mqtt; t=f.send(ts,_mqtt_pub(self.mqtt_topic,payload.encode()))
+        if rng.random()<0.03:
+            f.close(t); self.mqtt=None; return ("MQTT",tgt,True,f"PUB {self.mqtt_topic} drop")
+        return ("MQTT",tgt,True,f"PUB {self.mqtt_topic} bytes={len(payload)}")
+    def rtsp(self, rng, ts):
+        host,port=self.targets["rtsp"]; tgt=f"{host}:{port}"
+        meth,path,req,do_desc,bad=_rtsp_req(rng,self.avoid,self.targets,self.rtsp_st,ts)
+        if bad: return ("RTSP",tgt,False,f"blocked({bad})")
+        f=self._tcp(host,port,ts); t=f.send(ts+f.rtt,req.encode("utf-8","ignore"))
+        if do_desc: self.rtsp_st["dt"].append(ts)
+        if rng.random()<0.05:
+            f.close(t); return ("RTSP",tgt,True,f"{meth} {path} drop")
+        cseq=re.search(r"CSeq: (\d+)",req).group(1)
+        resp=(f"RTSP/1.0 200 OK\r\nCSeq: {cseq}\r\nPublic: {_RTSP_PUBLIC}\r\nServer: gortsplib\r\n\r\n" if meth=="OPTIONS"
+              else f"RTSP/1.0 404 Not Found\r\nCSeq: {cseq}\r\nServer: gortsplib\r\n\r\n")
+        t=f.send(t+0.0003,resp.encode(),to_server=False); f.close(t)
+        return ("RTSP",tgt,True,f"{meth} {path} {resp[9:12]}")
+    def coap(self, rng, ts):
+        host,port=self.targets.get("coap",("",0))
+        if not host or port<=0: return ("COAP","-",False,"no-target")
+        path,pkt=_coap_req(rng)
+        if self.avoid.bad(path): return ("COAP",f"{host}:{port}",False,"blocked(path)")
+        dst=socket.inet_aton(host); sp=self._sport()
+        self.w.udp(ts,self.src,dst,sp,port,pkt)
+        rtt=self._rtt(); self.w.udp(ts+rtt,dst,self.src,port,sp,bytes([0x60,0x45])+pkt[2:4]+b"\xffOK")
+        if _LEDGER is not None: _LEDGER.flow(ts,ts+rtt,socket.inet_ntoa(self.src),host,sp,port,17,_LNOISE)
+        return ("COAP",f"{host}:{port}",True,f"GET {path} resp")
+
+def run_pcap(dur, scheds, synth, counts, emit, t_start):
+    """Drives the schedules on a virtual clock (no sleeping) and writes every event's flow to the pcap."""
+    fns={"http":synth.http,"mqtt":synth.mqtt_ev,"rtsp":synth.rtsp,"coap":synth.coap}
+    heap=[]
+    for name,sc in scheds.items():
+        d=sc.next()
+        while d is None and sc.t<dur: d=sc.next()
+        if d is not None and d<dur: heap.append((d,name))
+    heapq.heapify(heap)
+    w=synth.w
+    while heap:
+        d,name=heapq.heappop(heap)
+        ts=t_start+d
+        w.flush(ts-0.5)  # flows finish well within 0.5 s, so everything older is final
+        proto,tgt,ok,msg=fns[name](scheds[name].rng,ts)
+        counts[proto]+=1
+        emit(f"{proto}:{name}",tgt,ok,msg)
+        sc=scheds[name]; d=sc.next()
+        while d is None and sc.t<dur: d=sc.next()
+        if d is not None and d<dur: heapq.heappush(heap,(d,name))
+    if synth.mqtt: synth.mqtt.close(synth.mqtt.t+0.001)
+    w.close()
+
+def _summary(counts, scheds, el, http_pools, evlog, extra=()):
+    print("\n"+"="*54)
+    print(f"{_ts()} SUMMARY  total={sum(counts.get(p,0) for p in ('HTTP','MQTT','RTSP','COAP'))}")
+    for p in ("HTTP","MQTT","RTSP","COAP"):
+        req=scheds[p.lower()].expected(0.0,el)
+        late=counts.get(f"{p.lower()}:late",0)
+        print(f"{p:>4}: {counts.get(p,0)}  req={req:.0f} ({100.0*counts.get(p,0)/req if req>0 else 100.0:.1f}%)"+(f" late={late}" if late else ""))
+    for k,p in http_pools.items():
+        n=p.new+p.reused
+        print(f"HTTP {k}: conns new={p.new} reused={p.reused} stale={p.stale} reuse={100.0*p.reused/n if n else 0.0:.1f}%")
+    for line in extra: print(line)
+    if evlog.dropped: print(f"LOG: dropped={evlog.dropped} events (writer queue full)")
+    print("="*54)
 
 def main():
+    global _LEDGER,_LTUP,_LNOISE
     ap=argparse.ArgumentParser()
     ap.add_argument("--duration", type=int, default=180)
     ap.add_argument("--rate", type=float, default=60.0)
@@ -309,12 +985,39 @@ def main():
     ap.add_argument("--targets", default=None)
     ap.add_argument("--attacks-json", default=None)
     ap.add_argument("--rules", nargs="*", default=None)
+    ap.add_argument("--profile", default=None, help="rate profile: constant|poisson|diurnal|burst or a JSON profile file")
+    ap.add_argument("--max-rate", type=float, default=240.0, help="upper bound for --rate (events/min)")
+    ap.add_argument("--report-interval", type=float, default=10.0, help="seconds between achieved-vs-requested rate lines (0 = off)")
+    ap.add_argument("--log-format", choices=("text","jsonl"), default="text", help="per-event log format")
+    ap.add_argument("--log-file", default=None, help="write event log here instead of stdout")
+    ap.add_argument("--quiet", action="store_true", help="only log errors and the per-second aggregate line")
+    ap.add_argument("--agg-interval", type=float, default=1.0, help="seconds between aggregate lines (jsonl/--quiet)")
+    ap.add_argument("--http-pool-size", type=int, default=4, help="persistent connections per HTTP target (0 = Connection: close)")
+    ap.add_argument("--http-max-requests", type=int, default=100, help="requests per connection before it is recycled")
+    ap.add_argument("--rtsp-sessions", type=int, default=0, help="long-lived RTSP viewer sessions (SETUP/PLAY + keepalive)")
+    ap.add_argument("--rtsp-path", default="/stream1", help="stream path for --rtsp-sessions")
+    ap.add_argument("--rtsp-hold", type=float, default=0.0, help="seconds per session before TEARDOWN and reconnect (0 = whole run)")
+    ap.add_argument("--rtsp-keepalive", type=float, default=0.0, help="keepalive interval (0 = half the server session timeout)")
+    ap.add_argument("--bandwidth", type=float, default=0.0, help="additionally sustain this many Mbit/s of bulk traffic")
+    ap.add_argument("--bulk-kinds", default="upload,download,mqtt", help="bulk transfer kinds: upload,download,mqtt")
+    ap.add_argument("--bulk-streams", type=int, default=4, help="concurrent bulk transfers")
+    ap.add_argument("--pcap", default=None, help="offline mode: synthesize the noise flows into this pcap instead of sending")
+    ap.add_argument("--pcap-src", default="10.10.0.100", help="client IP used in the synthesized flows")
+    ap.add_argument("--pcap-start", type=float, default=None, help="epoch timestamp of the first packet (default: now)")
+    ap.add_argument("--ledger", default=None, help="append every generated flow to this ground-truth ledger (ba_ledger.py)")
     a=ap.parse_args()
 
     dur=max(1,int(a.duration))
     rate=(a.rate if a.rate and a.rate>0 else 10.0)
-    if rate>240: _log("WARN","-",True,f"rate capped {rate}->240"); rate=240.0
+    if not a.pcap and rate>a.max_rate: _log("WARN","-",True,f"rate capped {rate}->{a.max_rate:g}"); rate=float(a.max_rate)
+    try: profile=load_profile(a.profile)
+    except (OSError,ValueError) as e:
+        _log("ERROR","-",False,f"profile {a.profile}: {e}"); return 2
     targets=parse_targets(a.targets)
+    if a.ledger:
+        import ba_ledger
+        _LEDGER=ba_ledger.LedgerWriter(a.ledger,"ba_noise-pcap" if a.pcap else "ba_noise")
+        _LTUP=ba_ledger.sock_tuple; _LNOISE=_LEDGER.label("noise")
 
     rules=[]
     if a.rules:
@@ -328,40 +1031,91 @@ def main():
     mh,mp=targets["mqtt"]
     mqtt=RawMQTT(mh,mp,f"sensor-{dev}",avoid)
     mqtt_state={"c":mqtt,"topic":f"home/telemetry/{dev}"}
-    rtsp_state={"cseq":1,"dt":deque()}
+    rtsp_state={"cseq":1,"dt":deque(),"lock":threading.Lock()}
+    http_pools={k:HttpPool(*targets[k],size=a.http_pool_size,max_req=a.http_max_requests) for k in ("router","camera")}
 
-    _log("START","-",True,f"duration={dur}s rate={rate:.1f}/min seed={a.seed}")
+    _log("START","-",True,f"duration={dur}s rate={rate:.1f}/min seed={a.seed} profile={profile['default']['profile']}")
     _log("TARGETS","-",True,",".join(f"{k}={v[0]}:{v[1]}" for k,v in targets.items()))
     _log("AVOID","-",True,f"sub={len(avoid.sub)} rx={len(avoid.rx)} rules={len(rules)}")
 
-    end=time.time()+dur; stop=threading.Event(); counts=Counter()
+    evlog=EventLog(a.log_format,a.log_file,a.quiet,a.agg_interval).start()
+    counts=Counter()
     lam=rate/60.0
     w={"http":0.35,"mqtt":0.45,"rtsp":0.17,"coap":0.03}
-    threads=[
-        threading.Thread(target=_worker, args=("http",lam*w["http"],end,stop,random.Random(rng0.randint(0,2**31-1)),
-            lambda r: http_once(r,avoid,targets),counts), daemon=True),
-        threading.Thread(target=_worker, args=("mqtt",lam*w["mqtt"],end,stop,random.Random(rng0.randint(0,2**31-1)),
-            lambda r: mqtt_once(r,avoid,mqtt_state),counts), daemon=True),
-        threading.Thread(target=_worker, args=("rtsp",lam*w["rtsp"],end,stop,random.Random(rng0.randint(0,2**31-1)),
-            lambda r: rtsp_once(r,avoid,targets,rtsp_state),counts), daemon=True),
-        threading.Thread(target=_worker, args=("coap",lam*w["coap"],end,stop,random.Random(rng0.randint(0,2**31-1)),
-            lambda r: coap_once(r,avoid,targets),counts), daemon=True),
-    ]
+    scheds={}; rngs={}
+    for name in ("http","mqtt","rtsp","coap"):
+        rngs[name]=random.Random(rng0.randint(0,2**31-1))
+        scheds[name]=Schedule(lam*w[name],profile.get(name,profile["default"]),rngs[name])
+
+    if a.pcap:
+        synth=PcapSynth(PcapWriter(a.pcap),avoid,targets,a.pcap_src,random.Random(rng0.randint(0,2**31-1)),f"sensor-{dev}",mqtt_state["topic"])
+        wall=time.monotonic()
+        try: run_pcap(dur,scheds,synth,counts,evlog.emit,time.time() if a.pcap_start is None else a.pcap_start)
+        except KeyboardInterrupt: synth.w.close()
+        finally: evlog.close()
+        wall=max(1e-9,time.monotonic()-wall)
+        if _LEDGER: _LEDGER.close(); extra_l=[f"LEDGER {a.ledger}: flows={_LEDGER.flows}"]
+        else: extra_l=[]
+        _summary(counts,scheds,dur,{},evlog,[f"PCAP {a.pcap}: packets={synth.w.n} bytes={synth.w.nbytes} "
+                 f"wall={wall:.1f}s ({synth.w.n/wall:.0f} pkt/s, {synth.w.n*60/wall/1e6:.2f}M pkt/min)"]+extra_l)
+        return 0
+
+    t0=time.monotonic(); end=t0+dur; stop=threading.Event()
+    fns={"http":lambda r: http_once(r,avoid,targets,http_pools),
+         "mqtt":lambda r: mqtt_once(r,avoid,mqtt_state),
+         "rtsp":lambda r: rtsp_once(r,avoid,targets,rtsp_state),
+         "coap":lambda r: coap_once(r,avoid,targets)}
+    threads=[threading.Thread(target=_worker, args=(name,scheds[name],t0,end,stop,rngs[name],fns[name],counts,evlog.emit), daemon=True)
+             for name in ("http","mqtt","rtsp","coap")]
+    bulk=None
+    if a.bandwidth>0:
+        kinds=tuple(k for k in (x.strip().lower() for x in a.bulk_kinds.split(",")) if k in _BULK_KINDS) or _BULK_KINDS
+        bulk=Bulk(a.bandwidth,kinds,targets,avoid,random.Random(rng0.randint(0,2**31-1)),dev)
+        for i in range(max(1,a.bulk_streams)):
+            threads.append(threading.Thread(target=bulk.run, args=(i,random.Random(rng0.randint(0,2**31-1)),stop,end,evlog.emit), daemon=True))
+    rtsp_shared={}; sessions=[]
+    for i in range(max(0,a.rtsp_sessions)):
+        sess=RtspSession(i,*targets["rtsp"],a.rtsp_path,avoid,rtsp_state,rtsp_shared,evlog.emit,a.rtsp_hold,a.rtsp_keepalive)
+        sessions.append(sess)
+        threads.append(threading.Thread(target=sess.run, args=(stop,end), daemon=True))
     try:
         for t in threads: t.start()
-        while time.time()<end: time.sleep(0.2)
+        last=t0; seen=Counter(); blast=t0; btx=brx=0
+        while time.monotonic()<end:
+            time.sleep(0.2)
+            now=time.monotonic()
+            if bulk and now-blast>=1.0:
+                with bulk.lock: tx,rx=bulk.tx,bulk.rx
+                evlog.emit("BULK",f"{a.bandwidth:g}Mbit/s",True,f"tx={(tx-btx)*8/(now-blast)/1e6:.2f}Mbit/s rx={(rx-brx)*8/(now-blast)/1e6:.2f}Mbit/s "
+                           f"total={(tx-btx+rx-brx)*8/(now-blast)/1e6:.2f}Mbit/s")
+                btx,brx,blast=tx,rx,now
+            if a.report_interval>0 and now-last>=a.report_interval:
+                for name in ("http","mqtt","rtsp","coap"):
+                    p=name.upper(); got=counts.get(p,0)-seen.get(p,0); seen[p]=counts.get(p,0)
+                    req=scheds[name].expected(last-t0,now-t0)
+                    evlog.emit("RATE",p,True,f"req={req/(now-last):.2f}/s got={got/(now-last):.2f}/s ({100.0*got/req if req>0 else 100.0:.1f}%)")
+                last=now
     except KeyboardInterrupt:
         stop.set()
     finally:
         stop.set()
         for t in threads: t.join(timeout=1.0)
         mqtt.close()
+        for p in http_pools.values(): p.close()
+        evlog.close()
+        if _LEDGER: _LEDGER.close()
 
-    print("\n"+"="*54)
-    print(f"{_ts()} SUMMARY  total={sum(counts.values())}")
-    for p in ("HTTP","MQTT","RTSP","COAP"):
-        print(f"{p:>4}: {counts.get(p,0)}")
-    print("="*54)
+    el=max(1e-9,min(time.monotonic(),end)-t0)
+    extra=[]; rtsp_stats=sum((x.stats for x in sessions),Counter())
+    if bulk:
+        with bulk.lock: tx,rx,ops,errs=bulk.tx,bulk.rx,dict(bulk.ops),dict(bulk.errs)  # workers may still be finishing
+        extra.append(f"BULK target={a.bandwidth:g}Mbit/s achieved={(tx+rx)*8/el/1e6:.2f}Mbit/s tx={tx} rx={rx} "
+                     f"ops={ops} errors={errs}")
+    if sessions:
+        extra.append(f"RTSP sessions={rtsp_stats['sessions']} errors={rtsp_stats['errors']} keepalives={rtsp_stats['keepalives']} "
+                     f"frames={rtsp_stats['frames']} bytes={rtsp_stats['bytes']} ({rtsp_stats['bytes']*8/el/1e6:.2f} Mbit/s)")
+    if _LEDGER: extra.append(f"LEDGER {a.ledger}: flows={_LEDGER.flows}")
+    _summary(counts,scheds,el,http_pools,evlog,extra)
     return 0
 
 if __name__=="__main__":
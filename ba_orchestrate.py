@@ -0,0 +1,505 @@
+"""
+Brings up the isolated smart-home testbed (what startup.sh used to do step by step):
+
+  cleanup   remove old containers and veths (parallel)
+  bridge    create br-smarthome with the gateway address if missing
+  build     hash each build context; rebuild only images whose hash differs from the
+            ba.context-hash label of the existing image (parallel)
+  start     docker run --network none for all containers (parallel)
+  network   veth pair per container, moved into its netns and addressed (parallel)
+  ready     per-service probes from the host: TCP connect/banner, UDP request/reply,
+            RTSP OPTIONS and DESCRIBE of the auto-published stream
+
+Each phase is timed. The backend is pluggable: `--backend fake` runs the same orchestration
+against simulated Docker/ip/probes (no root, no Docker), e.g. to test changes to this script.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+BRIDGE = "br-smarthome"
+NETMASK = 24
+GATEWAY = "10.10.0.100"
+HASH_LABEL = "ba.context-hash"
+
+# probe kinds: ("tcp", port, expected banner or None), ("udp", port, payload, None = any reply),
+# ("rtsp", port, method, path)
+SERVICES = [
+    {
+        "name": "ip-camera", "image": "ip-camera", "context": "IP_Camera",
+        "build_contexts": {"common": "Emulator_Common"},
+        "ip": "10.10.0.4", "veth": ("vscam", "vb_cam"),
+        "probes": [("tcp", 80, None)],
+    },
+    {
+        "name": "mqtt-broker", "image": "mqtt-broker", "context": "MQTT_Broker",
+        "build_contexts": {"common": "Emulator_Common"},
+        "ip": "10.10.0.5", "veth": ("vmqtt", "vb_mqtt"),
+        # empty CoAP CON (ping) is answered with RST
+        "probes": [("tcp", 1883, None), ("udp", 5683, b"\x40\x00\xbe\xef", None)],
+    },
+    {
+        "name": "telnet-device", "image": "telnet-device", "context": "Telnet_Device",
+        "build_contexts": {"common": "Emulator_Common"},
+        "ip": "10.10.0.2", "veth": ("vtelnet", "vb_telnet"),
+        "probes": [("tcp", 23, b"login:")],
+    },
+    {
+        "name": "vulnerable-router", "image": "vulnerable-router", "context": "Vulnerable_Router",
+        "build_contexts": {"common": "Emulator_Common"},
+        "ip": "10.10.0.3", "veth": ("vrouter", "vb_router"),
+        "probes": [("tcp", 80, None), ("tcp", 443, None), ("tcp", 7547, None),
+                   ("udp", 1900, b"M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\n"
+                                 b"MAN: \"ssdp:discover\"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n", b"HTTP/1.1 200")],
+    },
+    {
+        "name": "rtsp-server", "image": "rtsp-server", "context": "RTSP_Server",
+        "ip": "10.10.0.6", "veth": ("vrtsp", "vb_rtsp"),
+        # MediaMTX up, socat forward up, ffmpeg publisher has the stream live
+        "probes": [("rtsp", 8554, "OPTIONS", "/"), ("rtsp", 554, "OPTIONS", "/"),
+                   ("rtsp", 8554, "DESCRIBE", "/stream1")],
+    },
+]
+
+
+class OrchestrateError(Exception):
+    pass
+
+
+def now():
+    return datetime.now().strftime("%H:%M:%S")
+
+
+def log(msg):
+    print(f"[STARTUP {now()}] {msg}", flush=True)
+
+
+def context_hash(paths):
+    """sha256 over relative path + content of every file in the build context(s)."""
+    h = hashlib.sha256()
+    for label, path in paths:
+        base = os.path.join(ROOT, path)
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = sorted(d for d in dirnames if d != "__pycache__" and not d.startswith("."))
+            for fn in sorted(filenames):
+                if fn.endswith(".pyc"):
+                    continue
+                full = os.path.join(dirpath, fn)
+                h.update(f"{label}:{os.path.relpath(full, base)}\0".encode())
+                with open(full, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        h.update(chunk)
+                h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+# ---------------------------------------------------------------- probes
+
+def probe_tcp(ip, port, expect, timeout):
+    with socket.create_connection((ip, port), timeout=timeout) as s:
+        if expect is None:
+            return True
+        s.settimeout(timeout)
+        buf = b""
+        while expect not in buf and len(buf) < 4096:
+            data = s.recv(1024)
+            if not data:
+                break
+            buf += data
+        return expect in buf
+
+
+def probe_udp(ip, port, payload, expect, timeout):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.settimeout(timeout)
+        s.sendto(payload, (ip, port))
+        data, _ = s.recvfrom(4096)
+        return expect is None or data.startswith(expect)
+
+
+def probe_rtsp(ip, port, method, path, timeout):
+    req = (f"{method} rtsp://{ip}:{port}{path} RTSP/1.0\r\nCSeq: 1\r\n"
+           f"User-Agent: ba-orchestrate\r\n"
+           + ("Accept: application/sdp\r\n" if method == "DESCRIBE" else "") + "\r\n").encode()
+    with socket.create_connection((ip, port), timeout=timeout) as s:
+        s.settimeout(timeout)
+        s.sendall(req)
+        buf = b""
+        while b"\r\n" not in buf:
+            data = s.recv(1024)
+            if not data:
+                break
+            buf += data
+        return buf.startswith(b"RTSP/1.0 200")
+
+
+def describe_probe(p):
+    if p[0] == "tcp":
+        return f"tcp/{p[1]}" + (f" {p[2].decode()!r}" if p[2] else "")
+    if p[0] == "udp":
+        return f"udp/{p[1]}"
+    return f"rtsp/{p[1]} {p[2]} {p[3]}"
+
+
+# ---------------------------------------------------------------- backends
+
+class DockerBackend:
+    """Real Docker + iproute2; ip/nsenter go through sudo unless running as root."""
+
+    def __init__(self, log_dir, probe_timeout=1.0):
+        self.log_dir = log_dir
+        self.sudo = [] if os.geteuid() == 0 else ["sudo"]
+        self.probe_timeout = probe_timeout
+        os.makedirs(log_dir, exist_ok=True)
+
+    def _run(self, cmd, check=True, log_file=None):
+        if log_file:
+            with open(log_file, "w") as f:
+                res = subprocess.run(cmd, stdout=f, stderr=subprocess.STDOUT)
+            if check and res.returncode != 0:
+                with open(log_file, "r", errors="replace") as f:
+                    tail = "".join(f.readlines()[-15:])
+                raise OrchestrateError(f"{' '.join(cmd[:3])} failed (exit {res.returncode}, log {log_file}):\n{tail}")
+            return ""
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if check and res.returncode != 0:
+            raise OrchestrateError(f"{' '.join(cmd)} failed: {res.stderr.strip()}")
+        return res.stdout.strip()
+
+    def ip(self, *args, check=True, netns=None):
+        pre = self.sudo + (["nsenter", "-t", str(netns), "-n"] if netns else [])
+        return self._run(pre + ["ip", *args], check=check)
+
+    # images
+    def image_hash(self, image):
+        out = self._run(["docker", "image", "inspect", "-f", f'{{{{index .Config.Labels "{HASH_LABEL}"}}}}', image],
+                        check=False)
+        return out if out and out != "<no value>" else None
+
+    def build(self, image, context, build_contexts, digest):
+        cmd = ["docker", "build", "--label", f"{HASH_LABEL}={digest}", "-t", image]
+        for name, path in build_contexts.items():
+            cmd += ["--build-context", f"{name}={os.path.join(ROOT, path)}"]
+        cmd.append(os.path.join(ROOT, context))
+        self._run(cmd, log_file=os.path.join(self.log_dir, f"build-{image}.log"))
+
+    # containers
+    def remove(self, name):
+        self._run(["docker", "rm", "-f", name], check=False)
+
+    def run(self, name, image):
+        self._run(["docker", "run", "-d", "--name", name, "--network", "none", image])
+
+    def pid(self, name):
+        pid = int(self._run(["docker", "inspect", "-f", "{{.State.Pid}}", name]) or 0)
+        if pid == 0:
+            raise OrchestrateError(f"container {name} is not running")
+        return pid
+
+    # network
+    def delete_link(self, iface):
+        self.ip("link", "delete", iface, check=False)
+
+    def ensure_bridge(self, bridge, gateway, netmask):
+        if self._run(["ip", "-o", "link", "show", bridge], check=False):
+            created = False
+        else:
+            self.ip("link", "add", bridge, "type", "bridge")
+            created = True
+        self.ip("link", "set", bridge, "up")
+        if f"{gateway}/" not in self._run(["ip", "-o", "-4", "addr", "show", "dev", bridge], check=False):
+            self.ip("addr", "add", f"{gateway}/{netmask}", "dev", bridge)
+        return created
+
+    def wire(self, pid, host_if, br_if, ip, bridge, netmask, gateway):
+        self.ip("link", "add", host_if, "type", "veth", "peer", "name", br_if)
+        self.ip("link", "set", br_if, "master", bridge)
+        self.ip("link", "set", br_if, "up")
+        self.ip("link", "set", host_if, "netns", str(pid))
+        self.ip("link", "set", host_if, "name", "eth0", netns=pid)
+        self.ip("link", "set", "eth0", "up", netns=pid)
+        self.ip("addr", "add", f"{ip}/{netmask}", "dev", "eth0", netns=pid)
+        self.ip("route", "add", "default", "via", gateway, netns=pid)
+
+    def probe(self, ip, p):
+        t = self.probe_timeout
+        try:
+            if p[0] == "tcp":
+                return probe_tcp(ip, p[1], p[2], t)
+            if p[0] == "udp":
+                return probe_udp(ip, p[1], p[2], p[3], t)
+            return probe_rtsp(ip, p[1], p[2], p[3], t)
+        except OSError:
+            return False
+
+
+class FakeBackend:
+    """
+    Simulated backend: same calls, sleeps instead of work, probes turn true after a
+    per-service delay. Records every call so the orchestration order can be inspected.
+    """
+
+    def __init__(self, scale=1.0, seed=1, fail=(), state=None):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+        self.calls = []
+        self.state = state               # JSON file with the simulated image labels (cache hits across runs)
+        self.images = {}
+        if state and os.path.exists(state):
+            with open(state) as f:
+                self.images = json.load(f)
+        self.started = {}
+        self.pids = {}
+
+    def _act(self, what, seconds):
+        with self.lock:
+            self.calls.append((round(time.monotonic(), 3), threading.current_thread().name, what))
+            jitter = self.rng.uniform(0.8, 1.2)
+        time.sleep(seconds * self.scale * jitter)
+
+    def image_hash(self, image):
+        self._act(f"inspect {image}", 0.02)
+        return self.images.get(image)
+
+    def build(self, image, context, build_contexts, digest):
+        self._act(f"build {image}", 1.0 if image != "rtsp-server" else 2.0)
+        if f"build:{image}" in self.fail:
+            raise OrchestrateError(f"build of {image} failed (simulated)")
+        with self.lock:
+            self.images[image] = digest
+            if self.state:
+                with open(self.state, "w") as f:
+                    json.dump(self.images, f)
+
+    def remove(self, name):
+        self._act(f"rm {name}", 0.05)
+
+    def run(self, name, image):
+        self._act(f"run {name}", 0.3)
+        if f"run:{name}" in self.fail:
+            raise OrchestrateError(f"container {name} exited (simulated)")
+        with self.lock:
+            self.pids[name] = 1000 + len(self.pids)
+
+    def pid(self, name):
+        return self.pids[name]
+
+    def delete_link(self, iface):
+        self._act(f"ip link delete {iface}", 0.01)
+
+    def ensure_bridge(self, bridge, gateway, netmask):
+        self._act(f"bridge {bridge}", 0.02)
+        return True
+
+    def wire(self, pid, host_if, br_if, ip, bridge, netmask, gateway):
+        self._act(f"wire {host_if} {ip}", 0.08)
+        with self.lock:
+            self.started[ip] = time.monotonic()
+
+    def probe(self, ip, p):
+        # services come up 0.2-1.5 s after their network is there; RTSP publisher slower
+        delay = 2.5 if p[0] == "rtsp" and p[2] == "DESCRIBE" else 0.2 + 0.1 * (p[1] % 13)
+        with self.lock:
+            t0 = self.started.get(ip)
+        if f"probe:{ip}" in self.fail:
+            return False
+        return t0 is not None and time.monotonic() - t0 >= delay * self.scale
+
+
+# ---------------------------------------------------------------- orchestration
+
+class Orchestrator:
+    def __init__(self, backend, services, jobs=5, force_build=False, ready_timeout=120.0, probe_interval=0.5):
+        self.b = backend
+        self.services = services
+        self.jobs = jobs
+        self.force_build = force_build
+        self.ready_timeout = ready_timeout
+        self.probe_interval = probe_interval
+        self.phases = []                 # (phase, seconds)
+        self.per_service = {s["name"]: {} for s in services}
+
+    def phase(self, name, fn, items):
+        """Run fn over items in parallel; returns results, raises the first error after all finished."""
+        t0 = time.monotonic()
+        log(f"{name}: {len(items)} task(s)")
+        errors = []
+        results = []
+        with ThreadPoolExecutor(max(1, min(self.jobs, len(items) or 1)), thread_name_prefix=name) as ex:
+            futs = [(it, ex.submit(fn, it)) for it in items]
+            for it, fut in futs:
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    errors.append(f"{it.get('name', it) if isinstance(it, dict) else it}: {e}")
+        dt = time.monotonic() - t0
+        self.phases.append((name, dt))
+        log(f"{name}: done in {dt:.2f}s")
+        if errors:
+            raise OrchestrateError(f"{name} failed:\n  " + "\n  ".join(errors))
+        return results
+
+    def _timed(self, svc, key, fn, *a):
+        t0 = time.monotonic()
+        out = fn(*a)
+        self.per_service[svc["name"]][key] = round(time.monotonic() - t0, 3)
+        return out
+
+    def cleanup(self):
+        def one(item):
+            kind, name = item
+            return self.b.remove(name) if kind == "container" else self.b.delete_link(name)
+        items = [("container", s["name"]) for s in self.services]
+        items += [("link", i) for s in self.services for i in s["veth"]]
+        self.phase("cleanup", one, items)
+
+    def bridge(self):
+        t0 = time.monotonic()
+        created = self.b.ensure_bridge(BRIDGE, GATEWAY, NETMASK)
+        dt = time.monotonic() - t0
+        self.phases.append(("bridge", dt))
+        log(f"bridge: {BRIDGE} {'created' if created else 'reused'} ({dt:.2f}s)")
+
+    def build(self):
+        def one(svc):
+            paths = [("", svc["context"])] + sorted(svc.get("build_contexts", {}).items())
+            digest = context_hash(paths)
+            have = self.b.image_hash(svc["image"])
+            if have == digest and not self.force_build:
+                self.per_service[svc["name"]]["build"] = "cached"
+                log(f"build: {svc['image']} unchanged ({digest}), skipped")
+                return False
+            log(f"build: {svc['image']} {have or 'missing'} -> {digest}")
+            self._timed(svc, "build", self.b.build, svc["image"], svc["context"],
+                        svc.get("build_contexts", {}), digest)
+            return True
+        built = self.phase("build", one, self.services)
+        return sum(built)
+
+    def start(self):
+        self.phase("start", lambda svc: self._timed(svc, "start", self.b.run, svc["name"], svc["image"]),
+                   self.services)
+
+    def network(self):
+        def one(svc):
+            pid = self.b.pid(svc["name"])
+            host_if, br_if = svc["veth"]
+            self._timed(svc, "network", self.b.wire, pid, host_if, br_if, svc["ip"], BRIDGE, NETMASK, GATEWAY)
+        self.phase("network", one, self.services)
+
+    def ready(self):
+        t_phase = time.monotonic()
+        deadline = t_phase + self.ready_timeout
+
+        def one(svc):
+            pending = list(svc["probes"])
+            while pending:
+                pending = [p for p in pending if not self.b.probe(svc["ip"], p)]
+                if not pending:
+                    break
+                if time.monotonic() >= deadline:
+                    raise OrchestrateError("not ready: " + ", ".join(describe_probe(p) for p in pending))
+                time.sleep(self.probe_interval)
+            dt = time.monotonic() - t_phase
+            self.per_service[svc["name"]]["ready"] = round(dt, 3)
+            log(f"ready: {svc['name']} ({svc['ip']}) after {dt:.2f}s")
+        self.phase("ready", one, self.services)
+
+    def up(self, skip_build=False, skip_ready=False):
+        t0 = time.monotonic()
+        self.cleanup()
+        # bridge and image builds don't depend on each other
+        with ThreadPoolExecutor(2) as ex:
+            fb = ex.submit(self.bridge)
+            built = 0 if skip_build else self.build()
+            fb.result()
+        self.start()
+        self.network()
+        if not skip_ready:
+            self.ready()
+        total = time.monotonic() - t0
+        self.phases.append(("total", total))
+        return built, total
+
+    def report(self):
+        lines = ["", "phase       seconds"]
+        lines += [f"{name:<10} {dt:8.2f}" for name, dt in self.phases]
+        lines += ["", f"{'service':<18} {'build':>8} {'start':>7} {'network':>8} {'ready':>7}"]
+        for name, st in self.per_service.items():
+            def f(k):
+                v = st.get(k, "-")
+                return v if isinstance(v, str) else f"{v:.2f}"
+            lines.append(f"{name:<18} {f('build'):>8} {f('start'):>7} {f('network'):>8} {f('ready'):>7}")
+        return "\n".join(lines)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Build and start the smart-home testbed in parallel.")
+    ap.add_argument("--backend", choices=("docker", "fake"), default="docker",
+                    help="fake: simulate Docker/ip/probes (no root or Docker needed)")
+    ap.add_argument("--only", default=None, help="Comma-separated container names (default: all)")
+    ap.add_argument("--jobs", type=int, default=5, help="Parallel tasks per phase")
+    ap.add_argument("--force-build", action="store_true", help="Rebuild even if the context hash is unchanged")
+    ap.add_argument("--no-build", action="store_true", help="Use the existing images as they are")
+    ap.add_argument("--no-wait", action="store_true", help="Don't wait for the readiness probes")
+    ap.add_argument("--ready-timeout", type=float, default=120.0, help="Max seconds for all probes to pass")
+    ap.add_argument("--probe-interval", type=float, default=0.5)
+    ap.add_argument("--probe-timeout", type=float, default=1.0, help="Timeout of a single probe")
+    ap.add_argument("--log-dir", default="/tmp/ba_orchestrate", help="docker build logs")
+    ap.add_argument("--fake-scale", type=float, default=1.0, help="fake backend: time scale")
+    ap.add_argument("--fake-fail", action="append", default=[],
+                    help="fake backend: simulate a failure, e.g. build:rtsp-server, run:ip-camera, probe:10.10.0.6")
+    ap.add_argument("--json", default=None, help="Write phase and service timings as JSON")
+    args = ap.parse_args()
+
+    services = SERVICES
+    if args.only:
+        want = {n.strip() for n in args.only.split(",") if n.strip()}
+        unknown = want - {s["name"] for s in SERVICES}
+        if unknown:
+            ap.error(f"unknown container(s): {', '.join(sorted(unknown))}")
+        services = [s for s in SERVICES if s["name"] in want]
+
+    if args.backend == "fake":
+        os.makedirs(args.log_dir, exist_ok=True)
+        backend = FakeBackend(args.fake_scale, fail=args.fake_fail,
+                              state=os.path.join(args.log_dir, "fake-images.json"))
+    else:
+        backend = DockerBackend(args.log_dir, args.probe_timeout)
+    orch = Orchestrator(backend, services, args.jobs, args.force_build, args.ready_timeout, args.probe_interval)
+
+    rc = 0
+    try:
+        built, total = orch.up(skip_build=args.no_build, skip_ready=args.no_wait)
+        log(f"Isolated Smart-Home Testsetup up in {total:.2f}s ({built} image(s) rebuilt)")
+        log("RTSP-Server can be reached by: rtsp://10.10.0.6:554/stream")
+        log(f"Start suricata with command: sudo suricata -i {BRIDGE}")
+    except OrchestrateError as e:
+        log(f"FAILED: {e}")
+        rc = 1
+    except KeyboardInterrupt:
+        rc = 130
+    print(orch.report(), flush=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"backend": args.backend, "ok": rc == 0,
+                       "phases": [{"phase": n, "seconds": round(d, 3)} for n, d in orch.phases],
+                       "services": orch.per_service}, f, indent=2)
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
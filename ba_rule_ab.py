@@ -0,0 +1,396 @@
+"""
+A/B harness for rule files: runs `suricata -r` over a pcap corpus once per rule file (in parallel,
+each run with its own log directory) with rule and keyword profiling switched on, and compares
+engine time, packets/s, per-rule ticks, the most expensive SIDs and alert counts against the first
+rule file (the baseline). Exits with 1 if a candidate is slower than --budget percent.
+
+    python ba_rule_ab.py Rules/ba_custom.rules /tmp/ba_custom_neu.rules --pcap noise.pcap --pcap variants.pcap
+    python ba_rule_ab.py base.rules cand.rules --pcap /data/pcaps/ --repeat 3 --budget 5 --json ab.json
+
+Per-rule ticks need a Suricata built with --enable-profiling-rules (keyword ticks: --enable-profiling);
+without it only timing and alerts are compared. Timing is the engine time from suricata.log
+("time elapsed"), i.e. without rule loading; with --repeat the median run counts.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import monitor_drops as md
+
+ELAPSED_RE = re.compile(r"time elapsed\s+([\d.]+)\s*s")
+PCAP_READ_RE = re.compile(r"read (\d+) files?, (\d+) packets, (\d+) bytes")
+RULES_LOADED_RE = re.compile(r"(\d+) rules successfully loaded, (\d+) rules failed")
+PERF_HEAD_RE = re.compile(r"^\s*Num\s+Rule\s+Gid\s+Rev\s+Ticks", re.I)
+KW_HEAD_RE = re.compile(r"^\s*Keyword\s+Ticks\s+Checks", re.I)
+PCAP_EXT = (".pcap", ".pcapng", ".cap")
+
+# profiling output goes to the run's log dir; RTSP_PORTS is not in the stock suricata.yaml
+DEFAULT_SETS = [
+    "profiling.rules.enabled=yes", "profiling.rules.filename=rule_perf.log", "profiling.rules.append=no",
+    "profiling.rules.json=yes", "profiling.rules.limit=100000", "profiling.rules.sort=ticks",
+    "profiling.keywords.enabled=yes", "profiling.keywords.filename=keyword_perf.log",
+    "profiling.keywords.append=no",
+    "vars.port-groups.RTSP_PORTS=[554,8554]",
+]
+
+
+def pcap_corpus(paths: list[str]) -> list[Path]:
+    out = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            out += sorted(f for f in p.rglob("*") if f.suffix.lower() in PCAP_EXT)
+        elif p.exists():
+            out.append(p)
+        else:
+            raise FileNotFoundError(p)
+    if not out:
+        raise FileNotFoundError("no pcap files in " + ", ".join(paths))
+    return out
+
+
+def variant_names(rules: list[str]) -> list[str]:
+    """Unique short names for the rule files (file stem, numbered on collision)."""
+    names = []
+    for i, r in enumerate(rules):
+        n = re.sub(r"[^\w.-]", "_", Path(r).stem) or f"rules{i}"
+        names.append(n if n not in names else f"{n}_{i}")
+    return names
+
+
+# ---------------- parsing ----------------
+
+def parse_rule_perf(path: Path) -> dict:
+    """sid -> {checks, matches, ticks, max, avg, avg_match, avg_nomatch} from rule_perf.log (JSON or text)."""
+    rules: dict = {}
+    if not path.exists():
+        return rules
+    text = path.read_text(encoding="utf-8", errors="replace")
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            continue
+        if doc.get("sort", "ticks") != "ticks":   # the same rules again, in another order
+            continue
+        for r in doc.get("rules", []):
+            rules[int(r["signature_id"])] = {
+                "checks": int(r.get("checks", 0)), "matches": int(r.get("matches", 0)),
+                "ticks": int(r.get("ticks_total", 0)), "max": int(r.get("ticks_max", 0)),
+                "avg": float(r.get("ticks_avg", 0)), "avg_match": float(r.get("ticks_avg_match", 0)),
+                "avg_nomatch": float(r.get("ticks_avg_nomatch", 0)),
+            }
+        if rules:
+            return rules
+    in_table = False
+    for line in text.splitlines():
+        if PERF_HEAD_RE.match(line):
+            if rules:       # only the first table (sorted by ticks)
+                break
+            in_table = True
+            continue
+        if not in_table or not line.strip() or line.lstrip().startswith("-"):
+            continue
+        f = line.split()
+        try:
+            # Num Rule Gid Rev Ticks % Checks Matches MaxTicks AvgTicks AvgMatch AvgNoMatch
+            rules[int(f[1])] = {"checks": int(f[6]), "matches": int(f[7]), "ticks": int(f[4]), "max": int(f[8]),
+                                "avg": float(f[9]), "avg_match": float(f[10]), "avg_nomatch": float(f[11])}
+        except (IndexError, ValueError):
+            in_table = False
+    return rules
+
+
+def parse_keyword_perf(path: Path) -> dict:
+    """keyword -> {ticks, checks, matches}, summed over all detection engines / lists."""
+    kws: dict = {}
+    if not path.exists():
+        return kws
+    in_table = False
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        if KW_HEAD_RE.match(line):
+            in_table = True
+            continue
+        if not in_table or not line.strip() or line.lstrip().startswith("-"):
+            continue
+        f = line.split()
+        try:
+            ticks, checks, matches = int(f[1]), int(f[2]), int(f[3])
+        except (IndexError, ValueError):
+            in_table = False
+            continue
+        k = kws.setdefault(f[0], {"ticks": 0, "checks": 0, "matches": 0})
+        k["ticks"] += ticks
+        k["checks"] += checks
+        k["matches"] += matches
+    return kws
+
+
+def parse_eve(path: Path) -> tuple[dict, dict]:
+    """Alert counts per SID and the last stats event of the run."""
+    alerts: dict = {}
+    stats: dict = {}
+    if not path.exists():
+        return alerts, stats
+    with open(path, "rb") as f:
+        for raw in f:
+            if b'"alert"' not in raw and b'"stats"' not in raw:
+                continue
+            try:
+                ev = json.loads(raw)
+            except ValueError:
+                continue
+            if ev.get("event_type") == "alert":
+                sid = (ev.get("alert") or {}).get("signature_id")
+                if sid is not None:
+                    alerts[int(sid)] = alerts.get(int(sid), 0) + 1
+            elif ev.get("event_type") == "stats":
+                stats = ev.get("stats") or {}
+    return alerts, stats
+
+
+def parse_run(logdir: Path, wall: float, rc: int) -> dict:
+    log = ""
+    for name in ("suricata.log", "stdout.log"):
+        p = logdir / name
+        if p.exists():
+            log += p.read_text(encoding="utf-8", errors="replace")
+    m = ELAPSED_RE.findall(log)
+    alerts, stats = parse_eve(logdir / "eve.json")
+    pkts = bytes_ = 0
+    pm = PCAP_READ_RE.search(log)
+    if pm:
+        pkts, bytes_ = int(pm.group(2)), int(pm.group(3))
+    elif stats:
+        dec = stats.get("decoder") or {}
+        pkts, bytes_ = int(dec.get("pkts", 0)), int(dec.get("bytes", 0))
+    lm = RULES_LOADED_RE.search(log)
+    return {
+        "rc": rc, "wall_s": round(wall, 4),
+        "engine_s": float(m[-1]) if m else None,
+        "packets": pkts, "bytes": bytes_,
+        "rules_loaded": int(lm.group(1)) if lm else None, "rules_failed": int(lm.group(2)) if lm else None,
+        "kernel_drops": md.extract_stats({"stats": stats})[0] if stats else 0,
+        "alerts": alerts,
+        "rules": parse_rule_perf(logdir / "rule_perf.log"),
+        "keywords": parse_keyword_perf(logdir / "keyword_perf.log"),
+    }
+
+
+# ---------------- running ----------------
+
+def run_one(args, rules: str, pcap: Path, logdir: Path) -> dict:
+    if args.reuse and (logdir / "done.json").exists():
+        return json.loads((logdir / "done.json").read_text(encoding="utf-8"))
+    if logdir.exists():
+        shutil.rmtree(logdir)
+    logdir.mkdir(parents=True)
+    cmd = [args.suricata, "-c", args.config, "-r", str(pcap), "-S", str(Path(rules).resolve()), "-l", str(logdir),
+           "-k", "none", "--runmode", args.runmode]
+    for s in DEFAULT_SETS + args.set:
+        cmd += ["--set", s]
+    t0 = time.perf_counter()
+    with open(logdir / "stdout.log", "w", encoding="utf-8") as out:
+        try:
+            rc = subprocess.run(cmd, stdout=out, stderr=subprocess.STDOUT, timeout=args.timeout).returncode
+        except subprocess.TimeoutExpired:
+            rc = -9
+    res = parse_run(logdir, time.perf_counter() - t0, rc)
+    res["cmd"] = cmd
+    (logdir / "done.json").write_text(json.dumps(res), encoding="utf-8")
+    return res
+
+
+def merge_runs(runs: list[dict]) -> dict:
+    """Sums the per-pcap results of one repetition."""
+    out = {"rc": 0, "wall_s": 0.0, "engine_s": 0.0, "packets": 0, "bytes": 0, "kernel_drops": 0,
+           "alerts": {}, "rules": {}, "keywords": {}, "rules_loaded": None, "rules_failed": None}
+    for r in runs:
+        out["rc"] = out["rc"] or r["rc"]
+        out["wall_s"] += r["wall_s"]
+        out["engine_s"] = None if out["engine_s"] is None or r["engine_s"] is None else out["engine_s"] + r["engine_s"]
+        for k in ("packets", "bytes", "kernel_drops"):
+            out[k] += r[k]
+        out["rules_loaded"] = r["rules_loaded"] if out["rules_loaded"] is None else out["rules_loaded"]
+        out["rules_failed"] = r["rules_failed"] if out["rules_failed"] is None else out["rules_failed"]
+        for sid, n in r["alerts"].items():
+            out["alerts"][int(sid)] = out["alerts"].get(int(sid), 0) + n
+        for sid, st in r["rules"].items():
+            cur = out["rules"].setdefault(int(sid), {"checks": 0, "matches": 0, "ticks": 0, "max": 0})
+            cur["checks"] += st["checks"]
+            cur["matches"] += st["matches"]
+            cur["ticks"] += st["ticks"]
+            cur["max"] = max(cur["max"], st["max"])
+        for kw, st in r["keywords"].items():
+            cur = out["keywords"].setdefault(kw, {"ticks": 0, "checks": 0, "matches": 0})
+            for k in cur:
+                cur[k] += st[k]
+    for st in out["rules"].values():
+        st["avg"] = round(st["ticks"] / st["checks"], 1) if st["checks"] else 0.0
+    return out
+
+
+def summarize(reps: list[dict]) -> dict:
+    """Median repetition by engine time (wall time if the log has none); all timings kept for the spread."""
+    key = "engine_s" if all(r["engine_s"] is not None for r in reps) else "wall_s"
+    ordered = sorted(reps, key=lambda r: r[key])
+    med = dict(ordered[(len(ordered) - 1) // 2])
+    med["time_key"] = key
+    med["times"] = [round(r[key], 4) for r in reps]
+    t = med[key]
+    med["pps"] = round(med["packets"] / t, 1) if t else None
+    med["ns_per_pkt"] = round(t * 1e9 / med["packets"], 1) if med["packets"] else None
+    med["rule_ticks"] = sum(st["ticks"] for st in med["rules"].values())
+    med["profiling"] = bool(med["rules"])
+    return med
+
+
+# ---------------- comparison ----------------
+
+def compare(base: dict, cand: dict, top: int) -> dict:
+    def pct(a, b):
+        return round((b - a) * 100.0 / a, 2) if a else None
+    tk = base["time_key"] if base["time_key"] == cand["time_key"] else "wall_s"
+    slowdown = pct(base[tk], cand[tk])
+    if base["packets"] and cand["packets"] and base["packets"] != cand["packets"]:
+        slowdown = pct(base[tk] / base["packets"], cand[tk] / cand["packets"])
+    sids = set(base["rules"]) | set(cand["rules"])
+    per_rule = []
+    for sid in sids:
+        b = base["rules"].get(sid, {}).get("ticks")
+        c = cand["rules"].get(sid, {}).get("ticks")
+        per_rule.append({"sid": sid, "base_ticks": b, "cand_ticks": c, "delta": (c or 0) - (b or 0),
+                         "cand_avg": cand["rules"].get(sid, {}).get("avg"),
+                         "status": "added" if b is None else "removed" if c is None else "changed"})
+    alerts = []
+    for sid in sorted(set(base["alerts"]) | set(cand["alerts"])):
+        a, b = base["alerts"].get(sid, 0), cand["alerts"].get(sid, 0)
+        if a != b:
+            alerts.append({"sid": sid, "base": a, "cand": b, "delta": b - a})
+    kws = set(base["keywords"]) | set(cand["keywords"])
+    kw_delta = sorted(({"keyword": k, "base_ticks": base["keywords"].get(k, {}).get("ticks", 0),
+                        "cand_ticks": cand["keywords"].get(k, {}).get("ticks", 0)} for k in kws),
+                      key=lambda r: -abs(r["cand_ticks"] - r["base_ticks"]))
+    return {
+        "time_key": tk, "slowdown_pct": slowdown,
+        "pps": [base["pps"], cand["pps"]],
+        "rule_ticks": [base["rule_ticks"], cand["rule_ticks"]], "rule_ticks_pct": pct(base["rule_ticks"], cand["rule_ticks"]),
+        "top_cand": sorted((r for r in per_rule if r["cand_ticks"]), key=lambda r: -r["cand_ticks"])[:top],
+        "top_delta": sorted((r for r in per_rule if r["delta"]), key=lambda r: -abs(r["delta"]))[:top],
+        "rules_added": sorted(r["sid"] for r in per_rule if r["status"] == "added"),
+        "rules_removed": sorted(r["sid"] for r in per_rule if r["status"] == "removed"),
+        "keywords": kw_delta[:top],
+        "alert_diff": alerts,
+        "alerts_total": [sum(base["alerts"].values()), sum(cand["alerts"].values())],
+    }
+
+
+def format_report(doc: dict) -> str:
+    names = list(doc["variants"])
+    lines = [f"corpus: {len(doc['pcaps'])} pcap(s), repeat={doc['repeat']}, budget={doc['budget_pct']:g}%", "",
+             f"{'rules':<24} {'rc':>3} {'loaded':>7} {'packets':>10} {'time_s':>9} {'pkts/s':>11} {'ns/pkt':>8} "
+             f"{'rule_ticks':>14} {'alerts':>7}"]
+    for n in names:
+        v = doc["variants"][n]
+        lines.append(f"{n[:24]:<24} {v['rc']:>3} {str(v['rules_loaded'] or '-'):>7} {v['packets']:>10} "
+                     f"{v[v['time_key']]:>9.3f} {v['pps'] or 0:>11.0f} {v['ns_per_pkt'] or 0:>8.0f} "
+                     f"{v['rule_ticks'] if v['profiling'] else '-':>14} {sum(v['alerts'].values()):>7}")
+    for n, c in doc["comparisons"].items():
+        verdict = "FAIL" if n in doc["over_budget"] else "ok"
+        sd = "n/a" if c["slowdown_pct"] is None else f"{c['slowdown_pct']:+.2f}%"
+        lines += ["", f"== {n} vs {names[0]}: time {sd} ({c['time_key']}) -> {verdict}; rule ticks "
+                      f"{'n/a' if c['rule_ticks_pct'] is None else format(c['rule_ticks_pct'], '+.2f') + '%'}; "
+                      f"alerts {c['alerts_total'][0]} -> {c['alerts_total'][1]}"]
+        if c["rules_added"] or c["rules_removed"]:
+            lines.append(f"   rules added: {len(c['rules_added'])}  removed: {len(c['rules_removed'])}")
+        if c["top_cand"]:
+            lines.append(f"   {'sid':>9} {'ticks':>14} {'base_ticks':>14} {'delta':>14} {'avg/check':>10}")
+            for r in c["top_cand"]:
+                lines.append(f"   {r['sid']:>9} {r['cand_ticks']:>14} {str(r['base_ticks'] or '-'):>14} "
+                             f"{r['delta']:>+14} {r['cand_avg'] or 0:>10.0f}")
+        if c["keywords"]:
+            lines.append("   keywords: " + "  ".join(f"{k['keyword']} {k['base_ticks']}->{k['cand_ticks']}"
+                                                     for k in c["keywords"][:8]))
+        for a in c["alert_diff"][:20]:
+            lines.append(f"   alerts sid {a['sid']}: {a['base']} -> {a['cand']} ({a['delta']:+d})")
+        if len(c["alert_diff"]) > 20:
+            lines.append(f"   ... {len(c['alert_diff']) - 20} more SIDs with different alert counts")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Compare the detection cost of rule files with suricata -r and rule profiling.")
+    ap.add_argument("rules", nargs="+", help="Rule files; the first one is the baseline")
+    ap.add_argument("--pcap", action="append", required=True, help="pcap file or directory (repeatable)")
+    ap.add_argument("--suricata", default="suricata", help="Suricata binary")
+    ap.add_argument("--config", default="/etc/suricata/suricata.yaml", help="suricata.yaml")
+    ap.add_argument("--runmode", default="single", help="Suricata runmode (single keeps ticks comparable)")
+    ap.add_argument("--set", action="append", default=[], help="Extra --set NAME=VALUE for every run (repeatable)")
+    ap.add_argument("--repeat", type=int, default=1, help="Runs per rule file; the median counts")
+    ap.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Parallel Suricata runs")
+    ap.add_argument("--timeout", type=float, default=3600.0, help="Per run, seconds")
+    ap.add_argument("--budget", type=float, default=5.0, help="Allowed slowdown vs. the baseline in percent")
+    ap.add_argument("--top", type=int, default=15, help="Most expensive SIDs / keywords to list")
+    ap.add_argument("--outdir", default=None, help="Log dirs (default: ./attack_runs/rule_ab_<timestamp>)")
+    ap.add_argument("--reuse", action="store_true", help="Reuse finished runs in --outdir")
+    ap.add_argument("--json", default=None, help="Write the report as JSON")
+    args = ap.parse_args()
+
+    if not shutil.which(args.suricata) and not Path(args.suricata).exists():
+        print(f"suricata not found: {args.suricata}", file=sys.stderr)
+        return 2
+    try:
+        pcaps = pcap_corpus(args.pcap)
+    except FileNotFoundError as e:
+        print(f"pcap not found: {e}", file=sys.stderr)
+        return 2
+    names = variant_names(args.rules)
+    outdir = Path(args.outdir) if args.outdir else Path("attack_runs") / f"rule_ab_{datetime.now():%Y%m%d_%H%M%S}"
+    # interleaved (rep, pcap, variant) so concurrent runs load all variants alike
+    jobs = [(rep, pi, vi) for rep in range(args.repeat) for pi in range(len(pcaps)) for vi in range(len(names))]
+    print(f"{len(names)} rule files x {len(pcaps)} pcaps x {args.repeat} -> {len(jobs)} runs, {args.jobs} parallel, "
+          f"logs in {outdir}")
+    t0 = time.time()
+    with ThreadPoolExecutor(max(1, args.jobs)) as ex:
+        futs = {j: ex.submit(run_one, args, args.rules[j[2]], pcaps[j[1]],
+                             outdir / names[j[2]] / f"{j[1]:03d}_{pcaps[j[1]].stem}" / f"run{j[0]}")
+                for j in jobs}
+        results = {j: f.result() for j, f in futs.items()}
+    print(f"done in {time.time() - t0:.1f}s")
+
+    variants = {}
+    for vi, n in enumerate(names):
+        reps = [merge_runs([results[(rep, pi, vi)] for pi in range(len(pcaps))]) for rep in range(args.repeat)]
+        variants[n] = summarize(reps)
+        variants[n]["rules_file"] = args.rules[vi]
+        if variants[n]["rc"]:
+            print(f"{n}: suricata exited with {variants[n]['rc']}, see {outdir / n}/*/run*/stdout.log", file=sys.stderr)
+    base = variants[names[0]]
+    comparisons = {n: compare(base, variants[n], args.top) for n in names[1:]}
+    over = [n for n, c in comparisons.items()
+            if variants[n]["rc"] or (c["slowdown_pct"] is not None and c["slowdown_pct"] > args.budget)]
+    doc = {"pcaps": [str(p) for p in pcaps], "repeat": args.repeat, "budget_pct": args.budget, "outdir": str(outdir),
+           "variants": variants, "comparisons": comparisons, "over_budget": over}
+    print(format_report(doc))
+    if args.json:
+        for v in variants.values():   # JSON object keys must be strings
+            v["alerts"] = {str(k): n for k, n in sorted(v["alerts"].items())}
+            v["rules"] = {str(k): st for k, st in sorted(v["rules"].items())}
+        Path(args.json).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    if over:
+        print(f"over budget ({args.budget:g}%): {', '.join(over)}")
+    return 1 if over or base["rc"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,628 @@
+"""
+Attack variant generator: expands the templates in attack_templates.json along mutation axes
+(value, encoding, case, method, header order, whitespace/line folding, parameter position,
+repetition count, rate), deduplicates the rendered variants by payload hash and sends them
+concurrently, or writes them as a pcap for `suricata -r`. Every flow goes to a ground-truth
+ledger (ba_ledger.py) labelled with its variant, so the alerts can be attributed per variant
+and folded into an evasion/coverage matrix per SID.
+
+    python ba_variants.py run attack_templates.json --only ROUTER-4 --list
+    python ba_variants.py run attack_templates.json --jobs 16
+    python ba_variants.py run attack_templates.json --pcap /tmp/variants.pcap
+    python ba_variants.py matrix attack_runs/variants_<ts>/variants.ledger --eve eve.json
+
+Templates with a "window" (threshold / detection_filter rules) are run one after another, each
+after `window` seconds of quiet (live) or on a fresh stretch of the virtual clock (pcap), so the
+by_src counters of different variants do not add up.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import ba_ledger
+
+# axis -> default options; the first one is the baseline
+AXES = {
+    "value": None,   # template "values"
+    "encoding": ["raw", "pct", "pct-lower", "pct-mixed", "double", "overlong"],
+    "case": ["as-is", "upper", "lower", "mixed"],
+    "method": None,  # template methods
+    "headers": ["original", "reversed", "shuffled"],
+    "whitespace": ["single", "double", "tab", "fold", "trailing"],
+    "position": ["first", "middle", "last"],
+    "repeat": [1],
+    "rate": [0],
+}
+FILLER_PARAMS = [("lang", "en"), ("t", "1700000000")]
+UNRESERVED = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789")
+OVERLONG = {".": "%c0%ae", "/": "%c0%af", "\\": "%c1%9c"}
+MACRO = re.compile(r"\$\{(.+?)\*(\d+)\}")
+DEFAULT_RESPONSE = {
+    "http": "HTTP/1.0 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nOK",
+    "rtsp": "RTSP/1.0 200 OK\r\nCSeq: 1\r\n\r\n",
+}
+
+
+class Variant:
+    __slots__ = ("tid", "sids", "control", "axes", "proto", "host", "port", "segments", "repeat", "rate", "window", "digest",
+                 "response")
+
+    def __init__(self, t, axes, segments):
+        self.tid = t["id"]
+        self.axes = axes
+        self.repeat = int(axes.get("repeat", 1))
+        # below a threshold/detection_filter count the variant is a negative control: no alert expected
+        below = self.repeat < int(t.get("trigger_count", 0))
+        sids = [int(s) for s in t.get("expected_rulesid", [])]
+        self.sids, self.control = ([], sids) if below else (sids, [])
+        self.proto = t["proto"]
+        host, _, port = t["target"].rpartition(":")
+        self.host, self.port = host, int(port)
+        self.segments = segments  # per connection: list of byte strings, a reply is read after each
+        self.rate = float(axes.get("rate", 0))
+        self.window = float(t.get("window", 0))
+        self.response = t.get("response", DEFAULT_RESPONSE.get(self.proto, "")).encode("latin-1")
+        h = hashlib.sha256(f"{self.proto}|{t['target']}|{self.repeat}|{self.rate}|".encode())
+        for conn in segments:
+            for seg in conn:
+                h.update(len(seg).to_bytes(4, "big") + seg)
+        self.digest = h.hexdigest()
+
+    @property
+    def vid(self) -> str:
+        return f"{self.tid}#{self.digest[:10]}"
+
+    def label(self) -> str:
+        meta = {"v": self.vid, "t": self.tid, "sids": self.sids, "axes": self.axes}
+        if self.control:
+            meta["control"] = self.control
+        return json.dumps(meta, separators=(",", ":"), sort_keys=True)
+
+
+def expand(s: str, n: int = 0) -> str:
+    """${A*120} -> 120 x "A"; {n} -> repetition index."""
+    return MACRO.sub(lambda m: m.group(1) * int(m.group(2)), s).replace("{n}", str(n))
+
+
+def encode(s: str, how: str) -> str:
+    if how == "raw":
+        return s
+    if how == "overlong":
+        return "".join(OVERLONG.get(c, c) for c in s)
+    out = []
+    for i, c in enumerate(s):
+        if c in UNRESERVED:
+            out.append(c)
+            continue
+        for b in c.encode("utf-8"):
+            hx = f"{b:02X}"
+            if how == "pct-lower" or (how == "pct-mixed" and i % 2):
+                hx = hx.lower()
+            out.append("%25" + hx if how == "double" else "%" + hx)
+    return "".join(out)
+
+
+def recase(s: str, how: str) -> str:
+    if how == "upper":
+        return s.upper()
+    if how == "lower":
+        return s.lower()
+    if how == "mixed":
+        return "".join(c.upper() if i % 2 == 0 else c.lower() for i, c in enumerate(s))
+    return s
+
+
+def axis_options(t: dict) -> dict:
+    """Axes a template varies, with their options (baseline first)."""
+    spec = t.get("axes", {})
+    if isinstance(spec, list):
+        spec = {a: None for a in spec}
+    out = {}
+    for axis, opts in spec.items():
+        if axis not in AXES:
+            raise ValueError(f"{t['id']}: unknown axis {axis}")
+        opts = opts or AXES[axis]
+        if not opts:
+            raise ValueError(f"{t['id']}: axis {axis} needs explicit options")
+        out[axis] = list(opts)
+    return out
+
+
+def _headers(t: dict, ch: dict, value: str, rng: random.Random) -> list:
+    hdrs = [[k, v.replace("{value}", value)] for k, v in t.get("headers", [])]
+    order = ch.get("headers", "original")
+    if order == "reversed":
+        hdrs.reverse()
+    elif order == "shuffled":
+        rng.shuffle(hdrs)
+    return hdrs
+
+
+def _head(first: str, hdrs: list, ws: str, inject: str) -> str:
+    """Request line + headers with the whitespace mutation applied."""
+    sep = {"double": "  ", "tab": "\t"}.get(ws, " ")
+    colon = {"double": ":  ", "tab": ":\t"}.get(ws, ": ")
+    first = first.replace(" ", sep)
+    lines = []
+    fold_at = None
+    if ws == "fold":
+        # obs-fold: the injected header if it has a space in its value, else the longest one that has
+        cands = [i for i, (_, v) in enumerate(hdrs) if " " in v.strip()]
+        named = [i for i in cands if inject == f"header:{hdrs[i][0]}"]
+        fold_at = (named or sorted(cands, key=lambda i: -len(hdrs[i][1])) or [None])[0]
+    for i, (k, v) in enumerate(hdrs):
+        if i == fold_at:
+            a, _, b = v.partition(" ")
+            v = f"{a}\r\n {b}"
+        if ws == "trailing":
+            v += "  "
+        lines.append(f"{k}{colon}{v}")
+    return first + "\r\n" + "".join(ln + "\r\n" for ln in lines) + "\r\n"
+
+
+def render_request(t: dict, ch: dict, rng: random.Random) -> bytes:
+    """HTTP / RTSP request for one set of axis choices."""
+    inject = t.get("inject", "")
+    value = expand(ch.get("value", ""))
+    enc = ch.get("encoding", "raw")
+    case = ch.get("case", "as-is")
+    method = recase(ch.get("method", t.get("method", "GET")), case)
+    path = t.get("path", "/")
+    path = recase(path.replace("{value}", "\0"), case).replace("\0", encode(value, enc) if inject == "path" else value)
+    params = [[recase(k, case), v] for k, v in t.get("params", [])]
+    for p in params:
+        if inject == f"param:{p[0].lower()}" or inject == f"param:{p[0]}":
+            p[1] = p[1].replace("{value}", encode(value, enc))
+    if params and inject.startswith("param:"):
+        pos = ch.get("position", "first")
+        idx = next((i for i, p in enumerate(params) if p[0].lower() == inject[6:].lower()), 0)
+        hit = params.pop(idx)
+        params += [list(f) for f in FILLER_PARAMS if "position" in ch]
+        params.insert({"first": 0, "last": len(params), "middle": (len(params) + 1) // 2}.get(pos, 0), hit)
+    target = path + ("?" + "&".join(f"{k}={v}" for k, v in params) if params else "")
+    body = t.get("body")
+    if body is not None:
+        form = any(k.lower() == "content-type" and "urlencoded" in v for k, v in t.get("headers", []))
+        body = body.replace("{value}", encode(value, enc) if form and inject == "body" else value).encode("utf-8")
+    hdrs = _headers(t, ch, value, rng)
+    if t["proto"] == "rtsp":
+        first = f"{method} rtsp://{t['target']}{target} RTSP/1.0"
+    else:
+        first = f"{method} {target} HTTP/1.1"
+        if not any(k.lower() == "connection" for k, _ in hdrs):
+            hdrs.append(["Connection", "close"])
+    if body is not None:
+        hdrs.append(["Content-Length", str(len(body))])
+    return _head(first, hdrs, ch.get("whitespace", "single"), inject).encode("utf-8") + (body or b"")
+
+
+def _mvar(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        d, n = n % 128, n // 128
+        out.append(d | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def _mstr(s: bytes) -> bytes:
+    return len(s).to_bytes(2, "big") + s
+
+
+def render_mqtt(t: dict, ch: dict, n: int) -> list:
+    """CONNECT (reply: CONNACK), then PUBLISH + DISCONNECT if the template has a topic."""
+    cid = expand(t.get("client_id", "ba-var"), n).encode()
+    vh = b"\x00\x04MQTT\x04\x02\x00\x3c"
+    segs = [b"\x10" + _mvar(len(vh) + len(cid) + 2) + vh + _mstr(cid)]
+    tail = b""
+    if t.get("topic"):
+        topic = _mstr(recase(t["topic"], ch.get("case", "as-is")).encode())
+        msg = expand(t.get("message", "{value}").replace("{value}", ch.get("value", ""))).encode()
+        tail = b"\x30" + _mvar(len(topic) + len(msg)) + topic + msg
+    segs.append(tail + b"\xe0\x00")
+    return segs
+
+
+def render_coap(t: dict, ch: dict, rng: random.Random) -> bytes:
+    code = {"GET": 1, "POST": 2, "PUT": 3, "DELETE": 4}[ch.get("method", t.get("method", "POST")).upper()]
+    mid = rng.getrandbits(16)
+    out = bytearray((0x40, code, mid >> 8, mid & 0xFF))
+    prev = 0
+    for seg in [s for s in t.get("path", "/").split("/") if s]:
+        raw = seg.encode()
+        out.append(((11 - prev) << 4) | len(raw))
+        out += raw
+        prev = 11
+    payload = expand(t.get("payload", "{value}").replace("{value}", ch.get("value", ""))).encode()
+    return bytes(out) + (b"\xff" + payload if payload else b"")
+
+
+def render(t: dict, ch: dict, seed: int) -> Variant:
+    rng = random.Random(f"{seed}|{t['id']}|{json.dumps(ch, sort_keys=True)}")
+    proto = t["proto"]
+    repeat = int(ch.get("repeat", 1))
+    if proto in ("http", "rtsp"):
+        conns = [[render_request(t, ch, rng)]] * repeat
+    elif proto == "mqtt":
+        conns = [render_mqtt(t, ch, n) for n in range(repeat)]
+    elif proto == "coap":
+        conns = [[render_coap(t, ch, rng)] for _ in range(repeat)]
+    else:
+        raise ValueError(f"{t['id']}: unknown proto {proto}")
+    return Variant(t, ch, conns)
+
+
+def choices(opts: dict, combine: str, limit: int, rng: random.Random) -> list:
+    """single: baseline plus one axis changed at a time; full: the whole product (sampled down to limit)."""
+    base = {a: o[0] for a, o in opts.items()}
+    if combine == "single":
+        out = [dict(base)]
+        for axis, options in opts.items():
+            out += [{**base, axis: o} for o in options[1:]]
+    else:
+        keys = list(opts)
+        total = 1
+        for k in keys:
+            total *= len(opts[k])
+        if limit and total > limit:
+            picks = {0} | set(rng.sample(range(1, total), limit - 1))
+            out = []
+            for i in sorted(picks):
+                ch = {}
+                for k in reversed(keys):
+                    i, r = divmod(i, len(opts[k]))
+                    ch[k] = opts[k][r]
+                out.append(ch)
+        else:
+            out = [dict(zip(keys, combo)) for combo in itertools.product(*(opts[k] for k in keys))]
+    return out[:limit] if limit else out
+
+
+def build(templates: list, combine: str, limit: int, seed: int, rewrite: dict) -> tuple:
+    """Rendered, deduplicated variants and the number of duplicates dropped."""
+    seen = set()
+    out = []
+    dups = 0
+    rng = random.Random(seed)
+    for t in templates:
+        t = dict(t)
+        host, _, port = t["target"].rpartition(":")
+        t["target"] = f"{rewrite.get(host, host)}:{port}"
+        for ch in choices(axis_options(t), combine, limit, rng):
+            v = render(t, ch, seed)
+            if v.digest in seen:
+                dups += 1
+                continue
+            seen.add(v.digest)
+            out.append(v)
+    return out, dups
+
+
+# ---------------- live execution ----------------
+
+def _read(s: socket.socket, until_close: bool) -> int:
+    got = 0
+    try:
+        while True:
+            data = s.recv(65536)
+            if not data:
+                break
+            got += len(data)
+            if not until_close:
+                break
+    except OSError:
+        pass
+    return got
+
+
+def send_conn(v: Variant, segs: list, timeout: float) -> tuple:
+    """One connection (or UDP exchange); returns (5-tuple for the ledger, bytes received, error)."""
+    kind = socket.SOCK_DGRAM if v.proto == "coap" else socket.SOCK_STREAM
+    s = socket.socket(socket.AF_INET, kind)
+    s.settimeout(timeout)
+    tup = None
+    try:
+        s.connect((v.host, v.port))
+        tup = ba_ledger.sock_tuple(s)
+        got = 0
+        for i, seg in enumerate(segs):
+            s.sendall(seg)
+            got += _read(s, until_close=(i == len(segs) - 1 and kind == socket.SOCK_STREAM))
+        return tup, got, None
+    except OSError as e:
+        return tup, 0, type(e).__name__
+    finally:
+        s.close()
+
+
+def run_live(v: Variant, ledger, lid: int, timeout: float, stop: threading.Event) -> dict:
+    res = {"conns": 0, "errors": 0, "bytes_in": 0}
+    for i, segs in enumerate(v.segments):
+        if stop.is_set():
+            break
+        if i and v.rate > 0:
+            stop.wait(1.0 / v.rate)
+        t0 = time.time()
+        tup, got, err = send_conn(v, segs, timeout)
+        if ledger is not None:
+            ledger.flow_tuple(tup, t0, time.time(), lid)
+        res["conns"] += 1
+        res["bytes_in"] += got
+        if err:
+            res["errors"] += 1
+            res["error"] = err
+    return res
+
+
+# ---------------- offline pcap ----------------
+
+class PcapRun:
+    """Writes variants on a virtual clock with ba_noise's pcap writer (handshake, data, reply, FIN)."""
+
+    def __init__(self, path: str, src: str, t0: float, seed: int):
+        import ba_noise
+        self.noise = ba_noise
+        self.w = ba_noise.PcapWriter(path)
+        self.src = socket.inet_aton(src)
+        self.t = t0
+        self.rng = random.Random(seed)
+        self.port = 32768
+
+    def _sport(self) -> int:
+        self.port = self.port + 1 if self.port < 60999 else 32768
+        return self.port
+
+    def variant(self, v: Variant, ledger, lid: int, gap: float = 0.002) -> None:
+        dst = socket.inet_aton(v.host)
+        for i, segs in enumerate(v.segments):
+            if i and v.rate > 0:
+                self.t += 1.0 / v.rate
+            t0 = self.t
+            sport = self._sport()
+            rtt = 0.0002 + self.rng.random() * 0.0006
+            if v.proto == "coap":
+                self.w.udp(t0, self.src, dst, sport, v.port, segs[0])
+                self.w.udp(t0 + rtt, dst, self.src, v.port, sport, bytes((0x60, 0x44)) + segs[0][2:4])
+                t1 = t0 + rtt
+            else:
+                f = self.noise._TcpFlow(self.w, self.rng, self.src, dst, sport, v.port, t0, rtt)
+                t = t0 + rtt
+                for seg in segs:
+                    t = f.send(t, seg)
+                    if v.proto == "mqtt" and seg[:1] == b"\x10":
+                        t = f.send(t + 0.0002, b"\x20\x02\x00\x00", to_server=False)
+                if v.response:
+                    t = f.send(t + 0.0005, v.response, to_server=False)
+                t1 = f.close(t)
+            if ledger is not None:
+                ledger.flow(t0, t1, socket.inet_ntoa(self.src), v.host, sport, v.port,
+                            17 if v.proto == "coap" else 6, lid)
+            self.t = max(self.t, t1) + gap
+        self.w.flush(self.t - 1.0)
+
+    def close(self) -> None:
+        self.w.close()
+
+
+# ---------------- evasion / coverage matrix ----------------
+
+def matrix(ledger_path: str, eve: str, offset: int = 0, skew: float = 1.0, grace: float = 10.0) -> dict:
+    flows = ba_ledger.reorder(ba_ledger.read_ledger(ledger_path), lambda f: f.t0, 30.0)
+    sc = ba_ledger.Scorer(flows, skew, grace, all_labels=True)
+    if eve and os.path.exists(eve):
+        for a in ba_ledger.reorder(ba_ledger.read_alerts(eve, offset), lambda a: a[0], 30.0):
+            sc.alert(*a)
+    sc.finish()
+    rep = sc.report()
+    variants = []
+    mat: dict = {}
+    for name, st in rep["labels"].items():
+        try:
+            meta = json.loads(name)
+        except ValueError:
+            continue
+        if not isinstance(meta, dict) or "v" not in meta:
+            continue
+        row = {"id": meta["v"], "template": meta["t"], "axes": meta["axes"], "flows": st["entries"]}
+        if meta.get("control"):
+            row["control"] = {str(s): st["sids_unexpected"].get(str(s), 0) > 0 for s in meta["control"]}
+            row["detected"] = {}
+            variants.append(row)
+            continue
+        sids = [int(s) for s in meta.get("sids", [])]
+        detected = row["detected"] = {str(s): st["sids_hit"].get(str(s), 0) > 0 for s in sids}
+        variants.append(row)
+        for s in sids:
+            for axis, opt in meta["axes"].items():
+                cell = mat.setdefault(str(s), {}).setdefault(axis, {}).setdefault(str(opt), [0, 0])
+                cell[0] += detected[str(s)]
+                cell[1] += 1
+    summary = {}
+    for v in variants:
+        for s, hit in v["detected"].items():
+            row = summary.setdefault(s, {"variants": 0, "detected": 0, "evaded": 0, "controls": 0, "false_alarms": 0})
+            row["variants"] += 1
+            row["detected" if hit else "evaded"] += 1
+        for s, hit in v.get("control", {}).items():
+            row = summary.setdefault(s, {"variants": 0, "detected": 0, "evaded": 0, "controls": 0, "false_alarms": 0})
+            row["controls"] += 1
+            row["false_alarms"] += hit
+    return {"summary": dict(sorted(summary.items())), "matrix": dict(sorted(mat.items())),
+            "variants": sorted(variants, key=lambda v: v["id"]),
+            "unattributed_alerts": {s: st["unattributed"] for s, st in rep["sids"].items() if st["unattributed"]}}
+
+
+def format_matrix(doc: dict, show_evasions: int = 20) -> str:
+    lines = []
+    for sid, row in doc["summary"].items():
+        ctl = f", {row['false_alarms']}/{row['controls']} below-threshold controls alerted" if row["controls"] else ""
+        lines.append(f"SID {sid}: {row['detected']}/{row['variants']} variants detected, {row['evaded']} evaded{ctl}")
+        for axis, opts in doc["matrix"].get(sid, {}).items():
+            if len(opts) < 2:
+                continue
+            cells = "  ".join(f"{json.dumps(o)[1:-1][:24]}={d}/{n}" for o, (d, n) in opts.items())
+            lines.append(f"    {axis:<10} {cells}")
+    ev = [v for v in doc["variants"] if not all(v["detected"].values()) or any(v.get("control", {}).values())]
+    if ev:
+        lines += ["", f"evasions ({len(ev)}):"]
+        for v in ev[:show_evasions]:
+            missed = [s for s, hit in v["detected"].items() if not hit]
+            missed += [f"{s}(control alerted)" for s, hit in v.get("control", {}).items() if hit]
+            axes = " ".join(f"{k}={json.dumps(x)}" for k, x in sorted(v["axes"].items()))
+            lines.append(f"    {v['id']:<22} missed={','.join(missed)}  {axes[:140]}")
+        if len(ev) > show_evasions:
+            lines.append(f"    ... {len(ev) - show_evasions} more in the JSON")
+    return "\n".join(lines)
+
+
+# ---------------- CLI ----------------
+
+def load_templates(path: str, only: str) -> tuple:
+    cfg = json.loads(Path(path).read_text(encoding="utf-8"))
+    templates = cfg if isinstance(cfg, list) else cfg.get("templates", [])
+    if only:
+        want = {x.strip() for x in only.split(",") if x.strip()}
+        templates = [t for t in templates if t["id"] in want]
+    return templates, (cfg.get("eve") if isinstance(cfg, dict) else None)
+
+
+def cmd_run(args) -> int:
+    templates, cfg_eve = load_templates(args.templates, args.only)
+    rewrite = dict(x.split("=", 1) for x in args.rewrite)
+    variants, dups = build(templates, args.combine, args.max_variants, args.seed, rewrite)
+    print(f"{len(variants)} variants from {len(templates)} templates ({dups} duplicate payloads dropped)")
+    if args.list:
+        for v in variants:
+            first = v.segments[0][0] if v.segments and v.segments[0] else b""
+            print(f"{v.vid:<22} x{v.repeat:<3} {json.dumps(v.axes, sort_keys=True)[:90]:<90} "
+                  f"{first[:70]!r}")
+        return 0
+
+    outdir = Path(args.outdir) if args.outdir else Path("attack_runs") / f"variants_{datetime.now():%Y%m%d_%H%M%S}"
+    outdir.mkdir(parents=True, exist_ok=True)
+    ledger_path = args.ledger or str(outdir / "variants.ledger")
+    ledger = ba_ledger.LedgerWriter(ledger_path, "ba_variants")
+    labels = {}
+    for v in variants:
+        labels[v.vid] = ledger.label(v.label(), v.sids)
+    eve = args.eve or cfg_eve or "/var/log/suricata/eve.json"
+    plain = [v for v in variants if not v.window]
+    windowed = [v for v in variants if v.window]
+    results = {}
+    t_start = time.time()
+
+    if args.pcap:
+        run = PcapRun(args.pcap, args.src, args.pcap_start if args.pcap_start is not None else t_start, args.seed)
+        for v in plain:
+            run.variant(v, ledger, labels[v.vid])
+        for v in windowed:
+            run.t += v.window + 1.0
+            run.variant(v, ledger, labels[v.vid])
+        run.close()
+        ledger.close()
+        print(f"pcap {args.pcap}: packets={run.w.n} bytes={run.w.nbytes}; ledger {ledger_path}")
+        print(f"score after `suricata -r {args.pcap}`:  python ba_variants.py matrix {ledger_path} --eve <eve.json>")
+        return 0
+
+    offset = os.path.getsize(eve) if os.path.exists(eve) else 0
+    stop = threading.Event()
+    try:
+        with ThreadPoolExecutor(max(1, args.jobs)) as ex:
+            futs = {v.vid: ex.submit(run_live, v, ledger, labels[v.vid], args.timeout, stop) for v in plain}
+            for vid, fut in futs.items():
+                results[vid] = fut.result()
+        last = time.time()
+        for n, v in enumerate(windowed, 1):
+            quiet = (v.window if args.cooldown is None else args.cooldown) - (time.time() - last)
+            if quiet > 0:
+                print(f"[{n}/{len(windowed)}] {v.vid}: waiting {quiet:.0f}s for the {v.window:g}s window to clear")
+                if stop.wait(quiet):
+                    break
+            results[v.vid] = run_live(v, ledger, labels[v.vid], args.timeout, stop)
+            last = time.time()
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        ledger.close()
+    errs = sum(r["errors"] for r in results.values())
+    conns = sum(r["conns"] for r in results.values())
+    print(f"sent {len(results)} variants, {conns} connections, {errs} errors in {time.time() - t_start:.1f}s")
+    if args.no_score:
+        return 0
+    if args.post_wait > 0:
+        time.sleep(args.post_wait)
+    doc = matrix(ledger_path, eve, offset, args.skew, args.grace)
+    doc["run"] = {"templates": args.templates, "eve": eve, "ledger": ledger_path, "combine": args.combine,
+                  "seed": args.seed, "duplicates_dropped": dups, "connections": conns, "errors": errs,
+                  "send_errors": {vid: r["error"] for vid, r in results.items() if r.get("error")}}
+    print(format_matrix(doc))
+    out = args.json or str(outdir / "variants_matrix.json")
+    Path(out).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    print(f"matrix: {out}")
+    return 0
+
+
+def cmd_matrix(args) -> int:
+    doc = matrix(args.ledger, args.eve, 0, args.skew, args.grace)
+    print(format_matrix(doc, args.show))
+    if args.json:
+        Path(args.json).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Expand attack templates into variants and map rule evasion per SID.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("run", help="Generate, send (or write as pcap) and score variants")
+    rp.add_argument("templates", help="Template file, e.g. attack_templates.json")
+    rp.add_argument("--only", default=None, help="Comma-separated template ids")
+    rp.add_argument("--combine", choices=("single", "full"), default="single",
+                    help="single: baseline + one axis changed at a time; full: product of all axes")
+    rp.add_argument("--max-variants", type=int, default=500, help="Per template (full mode samples down)")
+    rp.add_argument("--seed", type=int, default=1)
+    rp.add_argument("--list", action="store_true", help="Only print the variants")
+    rp.add_argument("--jobs", type=int, default=16, help="Concurrent variants (templates without a window)")
+    rp.add_argument("--timeout", type=float, default=3.0, help="Per connection timeout")
+    rp.add_argument("--cooldown", type=float, default=None,
+                    help="Quiet seconds before each windowed variant (default: the template's window)")
+    rp.add_argument("--rewrite", action="append", default=[], metavar="OLD_IP=NEW_IP",
+                    help="Send to another address, e.g. 10.10.0.3=127.10.0.3 for ba_emuhost (repeatable)")
+    rp.add_argument("--outdir", default=None, help="Default: ./attack_runs/variants_<timestamp>")
+    rp.add_argument("--ledger", default=None, help="Ledger path (default: <outdir>/variants.ledger)")
+    rp.add_argument("--eve", default=None, help="eve.json (default: from the template file)")
+    rp.add_argument("--post-wait", type=float, default=5.0, help="Seconds for Suricata to flush before scoring")
+    rp.add_argument("--no-score", action="store_true")
+    rp.add_argument("--pcap", default=None, help="Write the variants to this pcap instead of sending them")
+    rp.add_argument("--src", default="10.10.0.100", help="Client IP in the pcap")
+    rp.add_argument("--pcap-start", type=float, default=None, help="Epoch timestamp of the first packet")
+    rp.add_argument("--json", default=None, help="Matrix JSON (default: <outdir>/variants_matrix.json)")
+    rp.set_defaults(fn=cmd_run)
+    mp = sub.add_parser("matrix", help="Evasion/coverage matrix from a variants ledger and eve.json")
+    mp.add_argument("ledger")
+    mp.add_argument("--eve", default="/var/log/suricata/eve.json")
+    mp.add_argument("--json", default=None)
+    mp.add_argument("--show", type=int, default=20, help="Evasions to print")
+    mp.set_defaults(fn=cmd_matrix)
+    for p in (rp, mp):
+        p.add_argument("--skew", type=float, default=1.0)
+        p.add_argument("--grace", type=float, default=10.0)
+    args = ap.parse_args()
+    try:
+        return args.fn(args)
+    except BrokenPipeError:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,20 +2,66 @@
 # -*- coding: utf-8 -*-
 """
 Suricata EVE Drop Monitor (Python, no deps)
-- folgt /var/log/suricata/eve.json (auch nach Logrotate)
+- folgt /var/log/suricata/eve.json (auch nach Logrotate), per inotify mit Polling-Fallback
+- liest große Binär-Blöcke, parst nur Zeilen mit "event_type":"stats"
 - zeigt Delta je Stats-Event + berechnete Drops/s
 - farbige Ausgabe mit Schwellwerten
+- zeigt den eigenen Rückstand (Lag) zur Datei
+- konfigurierbare Zählerpfade (auch pro Thread, z.B. threads.*.capture.kernel_drops) mit Delta und Rate
+- optionaler Prometheus-Text-Endpunkt (/metrics)
+- alternativ Zähler direkt über den Unix-Socket von Suricata (dump-counters) abfragen
+- Replay-Modus: fertige eve.json per mmap auswerten (Event-Zeitstempel, Perzentile, schlechteste Fenster)
 """
 
 import argparse
-import io
+import bisect
+import csv
+import ctypes
+import ctypes.util
+import fnmatch
 import json
+import math
+import mmap
 import os
+import select
+import socket
+import struct
 import sys
+import threading
 import time
-from typing import Tuple
+from array import array
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
 
 DEFAULT_EVE = "/var/log/suricata/eve.json"
+DEFAULT_SOCKET = "/var/run/suricata/suricata-command.socket"
+
+# Standard-Zähler (Punkt-Pfade in stats; '*' usw. matchen Schlüssel, z.B. Thread-Namen)
+DEFAULT_COUNTERS = [
+    "capture.kernel_packets",
+    "capture.kernel_drops",
+    "capture.kernel_ifdrops",
+    "decoder.pkts",
+    "decoder.drop",
+    "threads.*.capture.kernel_packets",
+    "threads.*.capture.kernel_drops",
+    "tcp.memuse",
+    "tcp.reassembly_memuse",
+    "tcp.reassembly_gap",
+    "tcp.segment_memcap_drop",
+    "tcp.ssn_memcap_drop",
+    "flow.memuse",
+    "flow.spare",
+    "flow.emerg_mode_entered",
+    "flow.emerg_mode_over",
+    "flow.memcap",
+    "detect.alert",
+    "app_layer.flow.*",
+]
+
+# Zähler, die Momentanwerte sind (kein monotoner Zähler) -> Prometheus "gauge"
+GAUGE_LEAVES = {"memuse", "reassembly_memuse", "spare", "uptime"}
 
 ANSI_RED = "\033[0;31m"
 ANSI_YEL = "\033[0;33m"
@@ -33,56 +79,456 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--from-start", action="store_true", help="Nicht ans Dateiende springen, sondern ab Anfang lesen")
     p.add_argument("--no-color", action="store_true", help="Farben deaktivieren")
     p.add_argument("--quiet", action="store_true", help="Kopfzeile nicht drucken")
+    p.add_argument("--counter", action="append", default=[], metavar="PFAD",
+                   help="Zusätzlicher Zählerpfad, z.B. threads.*.capture.kernel_drops (mehrfach möglich)")
+    p.add_argument("--no-default-counters", action="store_true", help="Nur die per --counter angegebenen Zähler")
+    p.add_argument("--verbose", "-v", action="store_true",
+                   help="Unter jeder Zeile alle Zähler mit Delta und Rate ausgeben (nur geänderte)")
+    p.add_argument("--prom-port", type=int, default=0, help="Prometheus-Text-Endpunkt auf diesem Port (0 = aus)")
+    p.add_argument("--prom-addr", default="127.0.0.1", help="Bind-Adresse für den Prometheus-Endpunkt")
+    p.add_argument("--prom-dump", action="store_true", help="Am Ende die Prometheus-Ausgabe auf stdout drucken")
+    p.add_argument("--no-follow", action="store_true",
+                   help="Datei nur bis zum Ende lesen (z.B. aufgezeichnete eve.json); mit --prom-port wird "
+                        "danach weiter bedient bis Strg+C")
+    p.add_argument("--socket", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="PFAD",
+                   help=f"Zähler per Unix-Socket (dump-counters) statt aus eve.json lesen (default: {DEFAULT_SOCKET})")
+    p.add_argument("--interval", type=float, default=1.0, help="Abfrageintervall in Sekunden für --socket")
+    p.add_argument("--replay", action="store_true",
+                   help="Offline-Auswertung: Datei per mmap komplett lesen, Raten über Event-Zeitstempel")
+    p.add_argument("--window", type=float, default=60.0, help="Fensterlänge in Sekunden für rollierende Werte (Replay)")
+    p.add_argument("--worst", type=int, default=5, help="Anzahl schlechtester Fenster (Replay)")
+    p.add_argument("--drop-counter", default="capture.kernel_drops", help="Zähler für Drop-Raten (Replay)")
+    p.add_argument("--packet-counter", default="capture.kernel_packets", help="Zähler für Paketanzahl (Replay)")
+    p.add_argument("--csv", metavar="DATEI", help="Replay: Intervall-Deltas und rollierende Raten als CSV ('-' = stdout)")
+    p.add_argument("--json", metavar="DATEI", help="Replay: Zusammenfassung als JSON ('-' = stdout)")
+    p.add_argument("--since", metavar="ZEIT", help="Replay: nur Events ab dieser Zeit (Epoch, ISO oder HH:MM[:SS]); "
+                                                  "springt über den Index von ba_logindex direkt an die Stelle")
+    p.add_argument("--until", metavar="ZEIT", help="Replay: nur Events bis zu dieser Zeit")
     return p.parse_args()
 
-def open_follow(path: str, from_start: bool) -> Tuple[io.TextIOBase, os.stat_result]:
-    f = open(path, "r", encoding="utf-8", errors="replace")
-    st = os.stat(path)
-    if not from_start:
-        f.seek(0, io.SEEK_END)
-    return f, st
+STATS_MARK = b'"event_type":"stats"'
 
-def rotated(old_stat: os.stat_result, path: str, f: io.TextIOBase) -> bool:
-    try:
-        st = os.stat(path)
-    except FileNotFoundError:
-        return True
-    # inode oder device-Wechsel => rotiert/neu
-    if st.st_ino != old_stat.st_ino or st.st_dev != old_stat.st_dev:
-        return True
-    # Datei wurde abgeschnitten
-    try:
-        if f.tell() > st.st_size:
+# inotify-Konstanten (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class Inotify:
+    """
+    Minimaler inotify-Wrapper über ctypes (ohne Abhängigkeiten).
+    Beobachtet das Verzeichnis der Datei, damit auch Rotation (neue Datei, rename) gemeldet wird.
+    """
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        d = os.path.dirname(os.path.abspath(path)) or "."
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self.fd, d.encode(), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch({d}) fehlgeschlagen")
+        self.name = os.path.basename(path).encode()
+
+    def wait(self, timeout: float) -> bool:
+        """Wartet auf Ereignisse zur beobachteten Datei; True wenn eines eingetroffen ist."""
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return False
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            off = 0
+            while off + 16 <= len(buf):
+                _wd, _mask, _cookie, ln = struct.unpack_from("iIII", buf, off)
+                name = buf[off + 16:off + 16 + ln].rstrip(b"\0")
+                if name == self.name:
+                    hit = True
+                off += 16 + ln
+        return hit
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class EveFollower:
+    """
+    Folgt eve.json in großen Binär-Blöcken und liefert nur Zeilen mit "event_type":"stats"
+    (Suche auf Bytes, ohne jede Zeile zu dekodieren). Rotation/Truncation wie bisher über
+    Inode-/Größenvergleich. Wartet per inotify, sonst Polling.
+    """
+
+    def __init__(self, path: str, from_start: bool, chunk_size: int = 1 << 20, poll: float = 0.25,
+                 follow: bool = True):
+        self.path = path
+        self.from_start = from_start
+        self.follow = follow
+        self.chunk_size = chunk_size
+        self.poll = poll
+        self.f = None
+        self.st = None
+        self.pos = 0
+        self.size = 0
+        self.mode = "poll" if follow else "einmalig"
+        self.notify = None
+        if not follow:
+            return
+        try:
+            self.notify = Inotify(path)
+            self.mode = "inotify"
+        except (OSError, AttributeError):
+            self.notify = None
+
+    @property
+    def behind(self) -> int:
+        """Bytes, die die Datei dem Monitor voraus ist."""
+        return max(0, self.size - self.pos)
+
+    def _open(self, from_start: bool) -> None:
+        self.f = open(self.path, "rb", buffering=0)
+        self.st = os.fstat(self.f.fileno())
+        self.pos = 0 if from_start else self.st.st_size
+        self.f.seek(self.pos)
+        self.size = self.st.st_size
+
+    def _rotated(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        # inode oder device-Wechsel => rotiert/neu
+        if st.st_ino != self.st.st_ino or st.st_dev != self.st.st_dev:
             return True
-    except Exception:
-        return True
-    return False
+        # Datei wurde abgeschnitten
+        return self.pos > st.st_size
 
-def iter_lines(path: str, from_start: bool):
-    f, st = open_follow(path, from_start)
-    buffer_sleep = 0.25
-    while True:
-        line = f.readline()
-        if line:
-            yield line
-            continue
-        # kein neuer Inhalt
-        time.sleep(buffer_sleep)
-        if rotated(st, path, f):
+    def _wait(self) -> None:
+        if self.notify is not None:
+            self.notify.wait(1.0)
+        else:
+            time.sleep(self.poll)
+
+    def __iter__(self):
+        self._open(self.from_start)
+        carry = b""
+        while True:
+            data = self.f.read(self.chunk_size)
+            if data:
+                self.pos += len(data)
+                if self.pos > self.size:
+                    self.size = self.pos
+                if carry:
+                    data = carry + data
+                cut = data.rfind(b"\n") + 1
+                carry = data[cut:]
+                i = data.find(STATS_MARK, 0, cut)
+                while i >= 0:
+                    a = data.rfind(b"\n", 0, i) + 1
+                    b = data.find(b"\n", i)
+                    yield data[a:b]
+                    i = data.find(STATS_MARK, b, cut)
+                if len(data) - cut > (64 << 20):
+                    carry = b""  # keine Zeilenenden in 64 MiB: verwerfen statt unbegrenzt puffern
+                continue
+            # kein neuer Inhalt
+            if not self.follow:
+                return
             try:
-                f.close()
-            except Exception:
+                self.size = os.fstat(self.f.fileno()).st_size
+            except OSError:
                 pass
-            # warten bis neue Datei erscheint
-            for _ in range(40):  # bis ~10s
+            self._wait()
+            if self._rotated():
                 try:
-                    f, st = open_follow(path, True)
-                    break
-                except FileNotFoundError:
-                    time.sleep(0.25)
+                    self.f.close()
+                except Exception:
+                    pass
+                self.f = None
+                carry = b""
+                # warten bis neue Datei erscheint (auch länger, z.B. Suricata-Neustart)
+                while self.f is None:
+                    try:
+                        self._open(True)
+                    except FileNotFoundError:
+                        time.sleep(0.25)
+
+
+def resolve(stats: dict, pattern: str) -> Iterator[Tuple[Tuple[str, ...], float]]:
+    """
+    Löst einen Zählerpfad in stats auf. Segmente mit Glob-Zeichen (*, ?, [..]) matchen alle
+    passenden Schlüssel; die gematchten Schlüssel werden als Label-Werte zurückgegeben.
+    """
+    def walk(node, segs: List[str], labels: Tuple[str, ...]):
+        if not segs:
+            if isinstance(node, (int, float)) and not isinstance(node, bool):
+                yield labels, node
+            return
+        if not isinstance(node, dict):
+            return
+        seg, rest = segs[0], segs[1:]
+        if any(c in seg for c in "*?["):
+            for k in sorted(node):
+                if fnmatch.fnmatchcase(k, seg):
+                    yield from walk(node[k], rest, labels + (k,))
+        elif seg in node:
+            yield from walk(node[seg], rest, labels)
+
+    yield from walk(stats, pattern.split("."), ())
+
+
+def _label_name(seg: str) -> str:
+    # "threads" -> "thread", "flow" -> "flow"
+    name = seg[:-1] if seg.endswith("s") and len(seg) > 1 else seg
+    return "".join(c if c.isalnum() else "_" for c in name) or "key"
+
+
+class CounterSpec:
+    """Ein konfigurierter Zählerpfad inkl. Prometheus-Metrikname und Label-Namen."""
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        segs = pattern.split(".")
+        self.labels: List[str] = []
+        plain: List[str] = []
+        for i, seg in enumerate(segs):
+            if any(c in seg for c in "*?["):
+                lbl = _label_name(segs[i - 1]) if i else "key"
+                while lbl in self.labels:
+                    lbl += "_"
+                self.labels.append(lbl)
             else:
-                # weiterhin nicht vorhanden -> nochmal probieren
+                plain.append(seg)
+        self.metric = "suricata_" + "_".join("".join(c if c.isalnum() else "_" for c in p) for p in plain)
+        self.gauge = segs[-1] in GAUGE_LEAVES
+
+
+class CounterSet:
+    """
+    Extrahiert alle konfigurierten Zähler aus einem stats-Objekt und berechnet Delta und Rate
+    gegenüber dem vorherigen Stats-Event. Schlüssel: (Pattern, Label-Werte).
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.specs = [CounterSpec(p) for p in dict.fromkeys(patterns)]
+        self.prev: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+        self.cur: Dict[Tuple[str, Tuple[str, ...]], Tuple[float, float, float]] = {}
+
+    def update(self, stats: dict, elapsed: Optional[float]) -> Dict[Tuple[str, Tuple[str, ...]], Tuple[float, float, float]]:
+        """Liefert {(pattern, labels): (wert, delta, rate)}; ohne Vorgänger sind Delta/Rate 0."""
+        cur = {}
+        for spec in self.specs:
+            for labels, val in resolve(stats, spec.pattern):
+                key = (spec.pattern, labels)
+                old = self.prev.get(key)
+                if old is None or elapsed is None:
+                    delta = 0
+                elif spec.gauge:
+                    delta = val - old
+                else:
+                    # Zähler-Reset (Suricata-Neustart) -> Delta ab 0
+                    delta = val - old if val >= old else val
+                rate = delta / elapsed if elapsed else 0.0
+                cur[key] = (val, delta, rate)
+                self.prev[key] = val
+        self.cur = cur
+        return cur
+
+    @staticmethod
+    def name(key: Tuple[str, Tuple[str, ...]]) -> str:
+        pattern, labels = key
+        it = iter(labels)
+        return ".".join(next(it) if any(c in seg for c in "*?[") else seg for seg in pattern.split("."))
+
+
+def _prom_num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _prom_labels(names: List[str], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    esc = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+
+class PromState:
+    """Zuletzt berechnete Werte als Prometheus-Textformat (thread-sicher für den HTTP-Server)."""
+
+    def __init__(self, counters: CounterSet):
+        self.counters = counters
+        self.lock = threading.Lock()
+        self.text = "# keine Stats-Events bisher\n"
+
+    def update(self, cur: dict, extra: Dict[str, float]) -> None:
+        out: List[str] = []
+        for spec in self.counters.specs:
+            rows = [(k[1], v) for k, v in cur.items() if k[0] == spec.pattern]
+            if not rows:
                 continue
+            kind = "gauge" if spec.gauge else "counter"
+            for suffix, idx, typ in (("", 0, kind), ("_delta", 1, "gauge"), ("_per_second", 2, "gauge")):
+                m = spec.metric + ("_total" if kind == "counter" and not suffix else suffix)
+                out.append(f"# TYPE {m} {typ}")
+                for labels, vals in rows:
+                    out.append(f"{m}{_prom_labels(spec.labels, labels)} {_prom_num(vals[idx])}")
+        for m, v in extra.items():
+            out.append(f"# TYPE {m} gauge")
+            out.append(f"{m} {_prom_num(v)}")
+        with self.lock:
+            self.text = "\n".join(out) + "\n"
+
+    def render(self) -> str:
+        with self.lock:
+            return self.text
+
+
+def serve_prom(state: PromState, addr: str, port: int) -> ThreadingHTTPServer:
+    """Startet den /metrics-Endpunkt in einem Hintergrund-Thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = state.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer((addr, port), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+class SuricataSocket:
+    """
+    Client für den Unix-Command-Socket von Suricata (JSON-Protokoll wie suricatasc):
+    Versions-Handshake, danach {"command": ...} -> {"return": "OK"|"NOK", "message": ...}.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self.sock: Optional[socket.socket] = None
+        self.buf = b""
+
+    def connect(self) -> None:
+        self.close()
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        s.connect(self.path)
+        self.sock = s
+        self.buf = b""
+        res = self._roundtrip({"version": "0.2"})
+        if res.get("return") != "OK":
+            raise ConnectionError(f"Handshake abgelehnt: {res}")
+
+    def _roundtrip(self, msg: dict) -> dict:
+        self.sock.sendall(json.dumps(msg).encode())
+        # Antworten enden mit "\n"; ältere Versionen ohne -> so lange lesen, bis JSON vollständig ist
+        while True:
+            chunk = self.sock.recv(1 << 16)
+            if not chunk:
+                raise ConnectionError("Socket geschlossen")
+            self.buf += chunk
+            if self.buf.endswith(b"\n") or self.buf.endswith(b"}"):
+                try:
+                    res = json.loads(self.buf)
+                except json.JSONDecodeError:
+                    continue
+                self.buf = b""
+                return res
+
+    def command(self, name: str) -> dict:
+        if self.sock is None:
+            self.connect()
+        res = self._roundtrip({"command": name})
+        if res.get("return") != "OK":
+            raise RuntimeError(f"{name}: {res.get('message')}")
+        return res.get("message") or {}
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+
+def eve_source(follower: EveFollower, replay: bool) -> Iterator[Tuple[dict, float, float, int]]:
+    """Stats-Events aus eve.json als (stats, zeit, lag_s, rückstand_bytes)."""
+    for line in follower:
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        # nur Stats-Events verarbeiten
+        if "stats" not in obj:
+            continue
+
+        now = time.time()
+        ets = event_time(obj)
+        if replay and ets:
+            # aufgezeichnete Datei: Raten über die Zeitstempel der Events
+            yield obj["stats"] or {}, ets, 0.0, follower.behind
+        else:
+            yield obj["stats"] or {}, now, max(0.0, now - ets) if ets else 0.0, follower.behind
+
+
+def socket_source(client: SuricataSocket, interval: float, use_color: bool) -> Iterator[Tuple[dict, float, float, int]]:
+    """Fragt dump-counters im festen Takt ab; bei Fehlern Reconnect mit Backoff."""
+    nxt = time.monotonic()
+    backoff = 0.5
+    while True:
+        t = time.monotonic()
+        if nxt > t:
+            time.sleep(nxt - t)
+        nxt = max(nxt + interval, time.monotonic())
+        try:
+            t0 = time.time()
+            stats = client.command("dump-counters")
+        except (OSError, ConnectionError, RuntimeError, json.JSONDecodeError) as e:
+            client.close()
+            print(colorize(f"Socket-Fehler ({client.path}): {e} — neuer Versuch in {backoff:.1f}s", ANSI_YEL, use_color),
+                  file=sys.stderr)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+            nxt = time.monotonic()
+            continue
+        backoff = 0.5
+        yield stats, t0, time.time() - t0, 0
+
+
+def event_time(obj: dict) -> Optional[float]:
+    """Zeitstempel eines EVE-Events als Unix-Zeit (None wenn nicht parsebar)."""
+    ts = obj.get("timestamp")
+    if not ts:
+        return None
+    try:
+        return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+    except ValueError:
+        return None
 
 def extract_stats(obj: dict) -> Tuple[int, int, int]:
     """
@@ -97,74 +543,370 @@ def extract_stats(obj: dict) -> Tuple[int, int, int]:
     dd = int(decoder.get("drop") or 0)
     return kd, kp, dd
 
+class Series:
+    """
+    Kompakte Zeitreihe aller Zähler über die Stats-Events (array-basiert, 8 Byte je Wert).
+    Neue Schlüssel (z.B. später gestartete Threads) werden rückwirkend mit NaN aufgefüllt.
+    """
+
+    def __init__(self, counters: CounterSet):
+        self.specs = {sp.pattern: sp for sp in counters.specs}
+        self.ts = array("d")
+        self.cols: Dict[Tuple[str, Tuple[str, ...]], array] = {}
+        self.skipped = 0
+
+    def add(self, stats: dict, ts: float) -> None:
+        n = len(self.ts)
+        self.ts.append(ts)
+        for sp in self.specs.values():
+            for labels, val in resolve(stats, sp.pattern):
+                col = self.cols.get((sp.pattern, labels))
+                if col is None:
+                    col = self.cols[(sp.pattern, labels)] = array("d", [math.nan]) * n
+                if len(col) == n:
+                    col.append(val)
+        for col in self.cols.values():
+            if len(col) == n:
+                col.append(math.nan)
+
+    def deltas(self, key: Tuple[str, Tuple[str, ...]]) -> array:
+        """Delta je Intervall (Index i = Event i-1 -> i); Zähler-Reset wie im Live-Modus."""
+        col = self.cols.get(key)
+        out = array("d", [0.0]) * len(self.ts)
+        if col is None:
+            return out
+        gauge = self.specs[key[0]].gauge
+        prev = math.nan
+        for i, v in enumerate(col):
+            if not math.isnan(v) and not math.isnan(prev):
+                out[i] = v - prev if (gauge or v >= prev) else v
+            if not math.isnan(v):
+                prev = v
+        return out
+
+
+def replay_series(path: str, counters: CounterSet, start: int = 0, end: Optional[int] = None,
+                  t_from: Optional[float] = None, t_until: Optional[float] = None) -> Series:
+    """
+    Liest eine fertige eve.json per mmap und übernimmt nur Stats-Events (Bytes-Suche wie im
+    Follower). Speicherbedarf wächst mit der Anzahl Stats-Events, nicht mit der Dateigröße.
+    start/end begrenzen den gelesenen Bereich (Bytes), t_from/t_until die Event-Zeit.
+    """
+    ser = Series(counters)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ser
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            except (AttributeError, OSError):
+                pass
+            # bereits gelesene Seiten regelmäßig freigeben, damit der RSS nicht mit der Datei wächst
+            step = win = 64 << 20
+            freed = start - start % mmap.ALLOCATIONGRANULARITY
+            limit = len(mm) if end is None else min(end, len(mm))
+
+            def release(upto: int) -> None:
+                nonlocal freed, step
+                while step and upto - freed >= 2 * step:
+                    try:
+                        mm.madvise(mmap.MADV_DONTNEED, freed, step)
+                    except (AttributeError, OSError):
+                        step = 0  # kein madvise: nicht weiter versuchen
+                        return
+                    freed += step
+
+            def seek(pos: int) -> int:
+                # in Fenstern suchen, damit auch lange Strecken ohne Stats-Event freigegeben werden
+                while pos < limit:
+                    hi = min(limit, pos + win)
+                    j = mm.find(STATS_MARK, pos, min(limit, hi + len(STATS_MARK) - 1))
+                    if j >= 0:
+                        return j
+                    pos = hi
+                    release(pos)
+                return -1
+
+            i = seek(start)
+            while i >= 0:
+                release(i)
+                a = mm.rfind(b"\n", 0, i) + 1
+                b = mm.find(b"\n", i)
+                if b < 0:
+                    b = len(mm)
+                try:
+                    obj = json.loads(mm[a:b])
+                    ts = event_time(obj)
+                except json.JSONDecodeError:
+                    obj, ts = None, None
+                if obj is None or ts is None or "stats" not in obj:
+                    ser.skipped += 1
+                elif (t_from is None or ts >= t_from) and (t_until is None or ts <= t_until):
+                    ser.add(obj["stats"] or {}, ts)
+                i = seek(b)
+    return ser
+
+
+def percentile(vals: List[float], q: float) -> float:
+    """Nearest-Rank-Perzentil (vals sortiert)."""
+    if not vals:
+        return 0.0
+    return vals[min(len(vals) - 1, max(0, math.ceil(q / 100.0 * len(vals)) - 1))]
+
+
+def _jnum(v: float):
+    return int(v) if float(v).is_integer() else v
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+
+def analyze(ser: Series, window: float, worst: int, drop_key: str, pkt_key: str):
+    """
+    Liefert (rows, summary): rows je Intervall mit Deltas und rollierenden Drop-Raten,
+    summary mit Gesamtwerten, Perzentilen und den schlechtesten (nicht überlappenden) Fenstern.
+    """
+    ts = ser.ts
+    n = len(ts)
+    keys = list(ser.cols)
+    deltas = {k: ser.deltas(k) for k in keys}
+    zero = array("d", [0.0]) * n
+    drops = deltas.get((drop_key, ()), zero)
+    pkts = deltas.get((pkt_key, ()), zero)
+    rates = [0.0] + [drops[i] / (ts[i] - ts[i - 1]) if ts[i] > ts[i - 1] else 0.0 for i in range(1, n)]
+    cum_d = [0.0]
+    cum_p = [0.0]
+    for i in range(n):
+        cum_d.append(cum_d[-1] + drops[i])
+        cum_p.append(cum_p[-1] + pkts[i])
+
+    rows = []
+    win_sums = []
+    for i in range(1, n):
+        # Fenster (ts[i]-window, ts[i]]: Intervalle j mit ts[j] in diesem Bereich
+        j = max(1, bisect.bisect_right(ts, ts[i] - window, 0, i + 1))
+        w = sorted(rates[j:i + 1])
+        rows.append((i, rates[i], percentile(w, 50), percentile(w, 95), w[-1] if w else 0.0))
+        win_sums.append((cum_d[i + 1] - cum_d[j], j, i))
+
+    picked = []
+    for d, j, i in sorted(win_sums, key=lambda x: -x[0]):
+        if len(picked) >= worst or d <= 0:
+            break
+        if all(i < pj or j > pi for _, pj, pi in picked):
+            picked.append((d, j, i))
+
+    all_rates = sorted(rates[1:])
+    span = ts[-1] - ts[0] if n > 1 else 0.0
+    summary = {
+        "events": n,
+        "skipped": ser.skipped,
+        "start": _iso(ts[0]) if n else None,
+        "end": _iso(ts[-1]) if n else None,
+        "span_s": round(span, 3),
+        "window_s": window,
+        "drop_counter": drop_key,
+        "totals": {CounterSet.name(k): _jnum(sum(deltas[k])) for k in keys if not ser.specs[k[0]].gauge},
+        "drops_per_s": {
+            "mean": round(cum_d[-1] / span, 3) if span else 0.0,
+            "p50": round(percentile(all_rates, 50), 3),
+            "p95": round(percentile(all_rates, 95), 3),
+            "max": round(all_rates[-1], 3) if all_rates else 0.0,
+        },
+        "worst_windows": [{
+            "start": _iso(ts[j - 1]),
+            "end": _iso(ts[i]),
+            "drops": _jnum(d),
+            "packets": _jnum(cum_p[i + 1] - cum_p[j]),
+            "drop_ratio": round(d / (cum_p[i + 1] - cum_p[j]), 6) if cum_p[i + 1] > cum_p[j] else None,
+        } for d, j, i in picked],
+    }
+    return rows, summary, deltas
+
+
+def _open_out(path: str):
+    return sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+
+
+def run_replay(args: argparse.Namespace, counters: CounterSet, use_color: bool) -> None:
+    t0 = time.perf_counter()
+    specs = dict.fromkeys([args.drop_counter, args.packet_counter] + [sp.pattern for sp in counters.specs])
+    counters = CounterSet(list(specs))
+    start, end, t_from, t_until = 0, None, None, None
+    if args.since or args.until:
+        import ba_logindex
+        idx = ba_logindex.LogIndex(args.path)
+        idx.update()
+        ref = idx.times[-1] if idx.times else None
+        t_from = ba_logindex.parse_when(args.since, ref) if args.since else float("-inf")
+        t_until = ba_logindex.parse_when(args.until, ref) if args.until else float("inf")
+        start, end = idx.span(t_from, t_until)
+    ser = replay_series(args.path, counters, start, end, t_from, t_until)
+    rows, summary, deltas = analyze(ser, args.window, args.worst, args.drop_counter, args.packet_counter)
+    took = time.perf_counter() - t0
+
+    if args.csv:
+        keys = list(ser.cols)
+        out = _open_out(args.csv)
+        w = csv.writer(out)
+        w.writerow(["timestamp", "interval_s", "drops_per_s", "roll_p50", "roll_p95", "roll_max"] +
+                   [CounterSet.name(k) for k in keys])
+        for i, rate, p50, p95, mx in rows:
+            w.writerow([_iso(ser.ts[i]), round(ser.ts[i] - ser.ts[i - 1], 3), round(rate, 3), round(p50, 3),
+                        round(p95, 3), round(mx, 3)] + [_prom_num(deltas[k][i]) for k in keys])
+        if out is not sys.stdout:
+            out.close()
+    if args.json:
+        out = _open_out(args.json)
+        json.dump(summary, out, indent=2, ensure_ascii=False)
+        out.write("\n")
+        if out is not sys.stdout:
+            out.close()
+
+    if args.quiet or "-" in (args.csv, args.json):
+        return
+    print(colorize(f"Replay: {args.path} — {summary['events']} Stats-Events in {took:.2f}s "
+                   f"({summary['skipped']} übersprungen)", ANSI_GRN, use_color))
+    if summary["events"] < 2:
+        return
+    r = summary["drops_per_s"]
+    print(f"Zeitraum: {summary['start']} – {summary['end']} ({summary['span_s']:.0f}s)")
+    print(f"Drops/s ({args.drop_counter}): Mittel {r['mean']}  p50 {r['p50']}  p95 {r['p95']}  max {r['max']}")
+    print(f"\nSchlechteste {args.window:g}s-Fenster:")
+    print("{:<27} {:<27} {:>12} {:>14} {:>10}".format("Start", "Ende", "Drops", "Pakete", "Quote"))
+    for wdw in summary["worst_windows"]:
+        col = ANSI_RED if wdw["drops"] >= args.crit else ANSI_YEL if wdw["drops"] >= args.warn else ANSI_GRN
+        quote = f"{wdw['drop_ratio'] * 100:.3f}%" if wdw["drop_ratio"] is not None else "-"
+        print("{:<27} {:<27} {} {:>14} {:>10}".format(
+            wdw["start"], wdw["end"], colorize(f"{_prom_num(wdw['drops']):>12}", col, use_color),
+            _prom_num(wdw["packets"]), quote))
+
+
+class Monitor:
+    """
+    Gemeinsame Delta-/Schwellwert-Pipeline: bekommt stats-Objekte (egal aus welcher Quelle),
+    druckt die Tabelle und aktualisiert Zähler/Prometheus.
+    """
+
+    def __init__(self, args: argparse.Namespace, use_color: bool, counters: CounterSet,
+                 prom: Optional[PromState] = None):
+        self.args = args
+        self.use_color = use_color
+        self.counters = counters
+        self.prom = prom
+        self.prev: Optional[Tuple[int, int, int]] = None
+        self.prev_ts = time.time()
+        self.events = 0
+
+    def header(self) -> None:
+        print("\n{:<19} {:<10} {:<10} {:<10} {:<14} {:<12}".format("Zeit", "ΔDrops", "Drops/s", "ΔPackets", "decoder_drop", "Lag"))
+
+    def feed(self, stats: dict, now: float, lag_s: float = 0.0, behind: int = 0) -> None:
+        args = self.args
+        self.events += 1
+        kd, kp, dd = extract_stats({"stats": stats})
+        first = self.prev is None
+        elapsed = None if first else max(1e-6, now - self.prev_ts)
+        cur = self.counters.update(stats, elapsed)
+        if self.prom is not None:
+            self.prom.update(cur, {
+                "suricata_monitor_stats_events": self.events,
+                "suricata_monitor_lag_seconds": round(lag_s, 3),
+                "suricata_monitor_behind_bytes": behind,
+            })
+
+        if first:
+            self.prev, self.prev_ts = (kd, kp, dd), now
+            return
+
+        pkd, pkp, pdd = self.prev
+        kd_delta = max(0, kd - pkd)
+        kp_delta = max(0, kp - pkp)
+        dd_delta = max(0, dd - pdd)
+        kd_rate = kd_delta / elapsed
+
+        # Farbe nach Schwellwert
+        if kd_delta >= args.crit:
+            col = ANSI_RED
+        elif kd_delta >= args.warn:
+            col = ANSI_YEL
+        else:
+            col = ANSI_GRN
+
+        print("{:<19} {}{:<10}{} {:<10.1f} {:<10} {:<14} {:<12}".format(
+            time.strftime("%H:%M:%S", time.localtime(now)),
+            col if self.use_color else "",
+            kd_delta,
+            ANSI_CLR if self.use_color else "",
+            kd_rate,
+            kp_delta,
+            dd_delta,
+            "{:.1f}s/{:.1f}M".format(lag_s, behind / 1e6)
+        ))
+        if args.verbose:
+            for key, (val, delta, rate) in cur.items():
+                if delta:
+                    print("    {:<48} {:>14} {:>12} {:>12.1f}/s".format(CounterSet.name(key), _prom_num(val), ("+" if delta > 0 else "") + _prom_num(delta), rate))
+        sys.stdout.flush()
+
+        self.prev, self.prev_ts = (kd, kp, dd), now
+
+
 def main():
     args = parse_args()
     use_color = (not args.no_color) and sys.stdout.isatty()
 
-    # Vorab prüfen
-    if not os.path.exists(args.path) or not os.access(args.path, os.R_OK):
-        print(colorize(f"Kann Datei nicht lesen: {args.path}", ANSI_RED, use_color), file=sys.stderr)
-        sys.exit(1)
+    if args.replay:
+        if not os.path.exists(args.path) or not os.access(args.path, os.R_OK):
+            print(colorize(f"Kann Datei nicht lesen: {args.path}", ANSI_RED, use_color), file=sys.stderr)
+            sys.exit(1)
+        run_replay(args, CounterSet(([] if args.no_default_counters else DEFAULT_COUNTERS) + args.counter), use_color)
+        return
+
+    if args.socket:
+        client = SuricataSocket(args.socket)
+        try:
+            client.connect()
+        except OSError as e:
+            print(colorize(f"Kann Socket nicht öffnen: {args.socket} ({e})", ANSI_RED, use_color), file=sys.stderr)
+            sys.exit(1)
+        source = socket_source(client, args.interval, use_color)
+        desc = f"Socket: {args.socket} (dump-counters alle {args.interval:g}s)"
+    else:
+        # Vorab prüfen
+        if not os.path.exists(args.path) or not os.access(args.path, os.R_OK):
+            print(colorize(f"Kann Datei nicht lesen: {args.path}", ANSI_RED, use_color), file=sys.stderr)
+            sys.exit(1)
+        follower = EveFollower(args.path, from_start=args.from_start or args.no_follow, follow=not args.no_follow)
+        source = eve_source(follower, args.no_follow)
+        desc = f"Datei: {args.path} ({follower.mode})"
+
+    counters = CounterSet(([] if args.no_default_counters else DEFAULT_COUNTERS) + args.counter)
+    prom = PromState(counters) if (args.prom_port or args.prom_dump) else None
+    if args.prom_port:
+        serve_prom(prom, args.prom_addr, args.prom_port)
+    mon = Monitor(args, use_color, counters, prom)
 
     if not args.quiet:
-        print(colorize(f"Suricata Drop-Monitor — Datei: {args.path}", ANSI_GRN, use_color))
+        print(colorize(f"Suricata Drop-Monitor — {desc}", ANSI_GRN, use_color))
         print(f"Warn: {colorize(str(args.warn), ANSI_YEL, use_color)}   "
               f"Kritisch: {colorize(str(args.crit), ANSI_RED, use_color)}")
+        if args.prom_port:
+            print(f"Prometheus: http://{args.prom_addr}:{args.prom_port}/metrics")
         print("Strg+C zum Beenden.")
-        print("\n{:<19} {:<10} {:<10} {:<10} {:<14}".format("Zeit", "ΔDrops", "Drops/s", "ΔPackets", "decoder_drop"))
-
-    prev_kd = prev_kp = prev_dd = 0
-    have_prev = False
-    prev_ts = time.time()
+        mon.header()
 
     try:
-        for line in iter_lines(args.path, from_start=args.from_start):
-            # schneller Filter: nur Zeilen mit "stats"
-            if '"stats"' not in line:
-                continue
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            # nur Stats-Events verarbeiten
-            if "stats" not in obj:
-                continue
+        for stats, now, lag_s, behind in source:
+            mon.feed(stats, now, lag_s, behind)
 
-            kd, kp, dd = extract_stats(obj)
-            now = time.time()
-
-            if not have_prev:
-                prev_kd, prev_kp, prev_dd, prev_ts = kd, kp, dd, now
-                have_prev = True
-                continue
-
-            elapsed = max(1e-6, now - prev_ts)
-            kd_delta = max(0, kd - prev_kd)
-            kp_delta = max(0, kp - prev_kp)
-            dd_delta = max(0, dd - prev_dd)
-            kd_rate = kd_delta / elapsed
-
-            # Farbe nach Schwellwert
-            if kd_delta >= args.crit:
-                col = ANSI_RED
-            elif kd_delta >= args.warn:
-                col = ANSI_YEL
-            else:
-                col = ANSI_GRN
-
-            print("{:<19} {}{:<10}{} {:<10.1f} {:<10} {:<14}".format(
-                time.strftime("%H:%M:%S"),
-                col if use_color else "",
-                kd_delta,
-                ANSI_CLR if use_color else "",
-                kd_rate,
-                kp_delta,
-                dd_delta
-            ))
-            sys.stdout.flush()
-
-            prev_kd, prev_kp, prev_dd, prev_ts = kd, kp, dd, now
+        if args.prom_dump:
+            sys.stdout.write(prom.render())
+        if args.prom_port:
+            print(f"Dateiende erreicht ({mon.events} Stats-Events); Endpunkt bleibt aktiv, Strg+C zum Beenden.")
+            while True:
+                time.sleep(3600)
 
     except KeyboardInterrupt:
         print("\nBeendet.")
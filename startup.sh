@@ -1,5 +1,11 @@
 set -e
 
+# Parallel build/start with build cache and readiness probes (ba_orchestrate.py).
+# STARTUP_LEGACY=1 runs the old sequential steps below.
+if [ "${STARTUP_LEGACY:-0}" != "1" ] && command -v python3 >/dev/null 2>&1; then
+    exec python3 "$(dirname "$0")/ba_orchestrate.py" "$@"
+fi
+
 BRIDGE=br-smarthome
 NETMASK=24  
 GATEWAY=10.10.0.100 
@@ -29,10 +35,10 @@ sudo ip link set $BRIDGE up
 sudo ip addr add ${GATEWAY}/$NETMASK dev $BRIDGE
 
 echo "[STARTUP] Building docker containers"
-docker build -t ip-camera ./IP_Camera
-docker build -t mqtt-broker ./MQTT_Broker
-docker build -t telnet-device ./Telnet_Device
-docker build -t vulnerable-router ./Vulnerable_Router
+docker build --build-context common=./Emulator_Common -t ip-camera ./IP_Camera
+docker build --build-context common=./Emulator_Common -t mqtt-broker ./MQTT_Broker
+docker build --build-context common=./Emulator_Common -t telnet-device ./Telnet_Device
+docker build --build-context common=./Emulator_Common -t vulnerable-router ./Vulnerable_Router
 docker build -t rtsp-server ./RTSP_Server
 
 echo "[STARTUP] Starting containers without network"
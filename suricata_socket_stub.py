@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suricata Unix-Socket Stub (Python, no deps)
+- Ersatz für den Suricata-Command-Socket zum Testen von monitor_drops.py --socket
+- beantwortet Versions-Handshake, dump-counters, uptime, command-list
+- spielt Stats-Events aus einer aufgezeichneten eve.json (--from-eve) der Reihe nach ab
+  oder erzeugt synthetische, monoton steigende Zähler mit gelegentlichen Drops
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Iterator, List
+
+DEFAULT_SOCKET = "/tmp/suricata-command.socket"
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Stand-in for the Suricata unix command socket (dump-counters replay).")
+    p.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Socket-Pfad (default: {DEFAULT_SOCKET})")
+    p.add_argument("--from-eve", metavar="DATEI", help="Stats-Events aus dieser eve.json abspielen (in Schleife)")
+    p.add_argument("--no-loop", action="store_true", help="Nach dem letzten aufgezeichneten Event dieses wiederholen")
+    p.add_argument("--threads", type=int, default=2, help="Anzahl synthetischer Worker-Threads")
+    p.add_argument("--pps", type=int, default=20000, help="Synthetische Pakete pro Abfrage und Thread")
+    p.add_argument("--drop-chance", type=float, default=0.2, help="Wahrscheinlichkeit für Drops je Abfrage")
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args()
+
+
+def load_recorded(path: str) -> List[dict]:
+    """Stats-Objekte aus einer eve.json (nur event_type stats)."""
+    events: List[dict] = []
+    with open(path, "rb") as f:
+        for line in f:
+            if b'"event_type":"stats"' not in line:
+                continue
+            try:
+                events.append(json.loads(line)["stats"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return events
+
+
+def recorded(events: List[dict], loop: bool) -> Iterator[dict]:
+    """Spielt die geladenen Stats-Objekte der Reihe nach ab."""
+    while True:
+        yield from events
+        if not loop:
+            while True:
+                yield events[-1]
+
+
+def synthetic(threads: int, pps: int, drop_chance: float, rng: random.Random) -> Iterator[dict]:
+    """Synthetische dump-counters-Antworten mit Gesamt- und Thread-Zählern."""
+    t0 = time.time()
+    per = [{"kernel_packets": 0, "kernel_drops": 0} for _ in range(threads)]
+    dec = {"pkts": 0, "drop": 0}
+    alerts = 0
+    while True:
+        for c in per:
+            n = int(pps * rng.uniform(0.8, 1.2))
+            c["kernel_packets"] += n
+            if rng.random() < drop_chance:
+                c["kernel_drops"] += rng.randint(1, max(1, n // 50))
+            dec["pkts"] += n
+        alerts += rng.randint(0, 3)
+        cap = {k: sum(c[k] for c in per) for k in ("kernel_packets", "kernel_drops")}
+        yield {
+            "uptime": int(time.time() - t0),
+            "capture": cap,
+            "decoder": dict(dec),
+            "tcp": {"memuse": 4718592 + rng.randint(0, 1 << 16), "reassembly_memuse": rng.randint(1 << 20, 1 << 22)},
+            "flow": {"memuse": 7474304 + rng.randint(0, 1 << 16), "spare": 10000 - rng.randint(0, 500),
+                     "emerg_mode_entered": 0, "emerg_mode_over": 0},
+            "detect": {"alert": alerts},
+            "threads": {f"W#{i + 1:02d}-br-smarthome": {"capture": dict(c)} for i, c in enumerate(per)},
+        }
+
+
+def handle(conn: socket.socket, counters: Iterator[dict], lock: threading.Lock) -> None:
+    buf = b""
+    dec = json.JSONDecoder()
+    try:
+        while True:
+            chunk = conn.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+            # Mehrere/zusammenhängende JSON-Objekte nacheinander abarbeiten
+            while buf.strip():
+                text = buf.decode("utf-8", "replace").lstrip()
+                try:
+                    msg, end = dec.raw_decode(text)
+                except json.JSONDecodeError:
+                    break
+                buf = text[end:].encode()
+                if "version" in msg:
+                    res = {"return": "OK"}
+                elif msg.get("command") == "dump-counters":
+                    with lock:
+                        res = {"return": "OK", "message": next(counters)}
+                elif msg.get("command") == "uptime":
+                    res = {"return": "OK", "message": int(time.monotonic())}
+                elif msg.get("command") == "command-list":
+                    res = {"return": "OK", "message": {"count": 3, "commands": ["command-list", "dump-counters", "uptime"]}}
+                else:
+                    res = {"return": "NOK", "message": "Unknown command"}
+                conn.sendall(json.dumps(res, separators=(",", ":")).encode() + b"\n")
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def main():
+    args = parse_args()
+    if args.from_eve:
+        # vor dem Binden laden: ein Fehler im Generator würde nur den handle-Thread beenden
+        try:
+            events = load_recorded(args.from_eve)
+        except OSError as e:
+            sys.exit(f"Kann {args.from_eve} nicht lesen: {e}")
+        if not events:
+            sys.exit(f"Keine Stats-Events in {args.from_eve}")
+        counters = recorded(events, not args.no_loop)
+    else:
+        counters = synthetic(args.threads, args.pps, args.drop_chance, random.Random(args.seed))
+    lock = threading.Lock()
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(args.socket)
+    srv.listen(8)
+    print(f"Stub lauscht auf {args.socket} ({'eve: ' + args.from_eve if args.from_eve else 'synthetisch'})")
+    try:
+        while True:
+            conn, _ = srv.accept()
+            threading.Thread(target=handle, args=(conn, counters, lock), daemon=True).start()
+    except KeyboardInterrupt:
+        print("\nBeendet.")
+    finally:
+        srv.close()
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()